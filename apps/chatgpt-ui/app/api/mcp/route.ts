@@ -166,11 +166,13 @@ export async function POST(req: NextRequest) {
       case 'search_associative':
         log('INFO', 'Searching', {
           query: args.query,
-          limit: args.limit || 10
+          limit: args.limit || 10,
+          quality: args.quality || 'balanced'
         });
         result = await call(
           `/v1/search/associative?q=${encodeURIComponent(args.query)}` +
-          (args.limit ? `&limit=${args.limit}` : '')
+          (args.limit ? `&limit=${args.limit}` : '') +
+          (args.quality ? `&quality=${encodeURIComponent(args.quality)}` : '')
         );
         log('INFO', 'Search complete', {
           resultCount: result.results?.length || 0
@@ -22,8 +22,8 @@ export default function CanvasView() {
       const ns: Node[] = data.nodes.map((n: any) => ({
         id: n.id,
         title: n.title || 'Untitled',
-        x: rand(-300, 300),
-        y: rand(-300, 300),
+        x: n.x ?? rand(-300, 300),
+        y: n.y ?? rand(-300, 300),
         vx: 0,
         vy: 0,
         people: n.people || [],
@@ -28,21 +28,24 @@ export default function CanvasPage() {
     let cancelled = false;
     async function load() {
       setLoading(true);
-      const res = await fetch(`/api/proxy/v1/graph`, { cache: 'no-store' });
+      // With ?focus=<id>, load only that memory's neighbourhood
+      const focus = new URLSearchParams(window.location.search).get('focus');
+      const graphUrl = focus ? `/api/proxy/v1/graph?center=${encodeURIComponent(focus)}&hops=2` : `/api/proxy/v1/graph`;
+      const res = await fetch(graphUrl, { cache: 'no-store' });
       const data: GraphResponse = await res.json();
       if (cancelled) return;
       const cs: Card[] = data.nodes.map((n) => ({
         id: n.id,
         title: n.title || 'Untitled',
-        x: rand(-300, 300),
-        y: rand(-300, 300),
+        x: n.x ?? rand(-300, 300),
+        y: n.y ?? rand(-300, 300),
         width: 160,
         height: 80,
         emotion: ['joy','sadness','wonder','calm','fear','love','grief','anger'][Math.floor(Math.random()*8)],
         peopleCount: Math.floor(rand(0, 4)),
         connectionCount: 0,
       }));
-      const es: Conn[] = data.edges.map((e) => ({ aId: e.a, bId: e.b, relation: e.relation, strength: 0.6 }));
+      const es: Conn[] = data.edges.map((e) => ({ aId: e.a, bId: e.b, relation: e.relation, strength: e.strength ?? 0.6 }));
       cs.forEach((c) => { c.connectionCount = es.filter((e) => e.aId === c.id || e.bId === c.id).length; });
       setCards(cs); setCons(es); setLoading(false);
     }
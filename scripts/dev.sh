@@ -96,6 +96,19 @@ migrate() {
     "services/api/app/db/migrations/0002_idempotency.sql"
     "services/api/app/db/migrations/0003_core_locked_at.sql"
     "services/api/app/db/migrations/0004_memory_event.sql"
+    "services/api/app/db/migrations/0005_memory_keyset.sql"
+    "services/api/app/db/migrations/0006_query_embedding_cache.sql"
+    "services/api/app/db/migrations/0007_memory_event_notify.sql"
+    "services/api/app/db/migrations/0008_memory_doc_hash.sql"
+    "services/api/app/db/migrations/0009_memory_edge_b_idx.sql"
+    "services/api/app/db/migrations/0010_memory_embed_hnsw.sql"
+    "services/api/app/db/migrations/0011_memory_layout.sql"
+    "services/api/app/db/migrations/0012_export_job.sql"
+    "services/api/app/db/migrations/0013_artifact_storage_key_idx.sql"
+    "services/api/app/db/migrations/0014_artifact_upload.sql"
+    "services/api/app/db/migrations/0015_rate_limit_bucket.sql"
+    "services/api/app/db/migrations/0016_artifact_upload_verify.sql"
+    "services/api/app/db/migrations/0017_memory_event_failed.sql"
     "services/api/app/db/rls.sql"
   )
 
@@ -1,55 +1,232 @@
+"""Bearer-token verification against the identity provider's JWKS.
+
+Signing keys are fetched by a background thread: once at startup (``warm``
+from the app lifespan), every JWT_JWKS_REFRESH_SECONDS, and soon after a
+token names a ``kid`` we don't have. ``verify_bearer`` never blocks on that
+fetch by default; request auth (``deps.get_user_id``) passes ``key_wait`` so a
+token signed with a just-rotated key waits, off the event loop, for the one
+fetch the thread makes on behalf of every such request.
+
+Verified tokens are cached by SHA-256 of the token until their ``exp``, so
+repeat requests with the same token skip signature checks entirely.
+"""
+
+import hashlib
+import logging
 import os
+import threading
 import time
-from typing import Optional
+from collections import OrderedDict
+from typing import Callable, Optional
 from uuid import UUID
 
 import requests
 import jwt
-from jwt import PyJWKClient
 
+logger = logging.getLogger(__name__)
+
+
+ALGORITHMS = ["RS256", "RS512", "ES256", "ES384"]
+JWKS_REFRESH_SECONDS = float(os.getenv("JWT_JWKS_REFRESH_SECONDS", "600"))
+# Floor between fetches triggered by unknown kids, so junk tokens can't hammer the IdP
+JWKS_MIN_REFRESH_SECONDS = float(os.getenv("JWT_JWKS_MIN_REFRESH_SECONDS", "30"))
+JWKS_TIMEOUT_SECONDS = 5.0
+# How long request auth waits for the refresher when a token names an unknown kid
+JWKS_MISS_WAIT_SECONDS = float(os.getenv("JWT_JWKS_MISS_WAIT_SECONDS", "2"))
+CLAIMS_CACHE_SIZE = int(os.getenv("JWT_CLAIMS_CACHE_SIZE", "10000"))
+
+
+def _fetch_jwks(url: str) -> dict:
+    resp = requests.get(url, timeout=JWKS_TIMEOUT_SECONDS)
+    resp.raise_for_status()
+    return resp.json()
+
+
+class JwksRefresher:
+    """Signing keys by kid, kept current by a daemon thread."""
+
+    def __init__(self, url: str, fetch: Callable[[str], dict] = _fetch_jwks):
+        self.url = url
+        self.fetch = fetch
+        self._keys: dict[str, jwt.PyJWK] = {}
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        # Notified after every fetch attempt, for wait_for
+        self._fetched = threading.Condition()
+        self._thread: threading.Thread | None = None
+        self.fetched_at = 0.0
+        self.fetches = 0
+        self.errors = 0
+
+    def get(self, kid: str | None) -> jwt.PyJWK | None:
+        """Key for ``kid`` from memory; on a miss, asks the thread to refetch and returns None."""
+        key = self._keys.get(kid)
+        if key is None:
+            self.start()
+            self._wake.set()
+        return key
+
+    def refresh(self) -> None:
+        """Fetch the key set now (blocking)."""
+        try:
+            keyset = jwt.PyJWKSet.from_dict(self.fetch(self.url))
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"JWKS fetch from {self.url} failed: {e}")
+            return
+        finally:
+            with self._fetched:
+                self.fetched_at = time.monotonic()
+                self.fetches += 1
+                self._fetched.notify_all()
+        # Replace wholesale so rotated-out keys stop verifying
+        with self._fetched:
+            self._keys = {k.key_id: k for k in keyset.keys}
+            self._fetched.notify_all()
+
+    def wait_for(self, kid: str | None, timeout: float) -> jwt.PyJWK | None:
+        """Key for ``kid``, blocking up to ``timeout`` for the refresher to fetch it.
+
+        Waiters share the background thread's fetches (still subject to
+        JWT_JWKS_MIN_REFRESH_SECONDS), so a burst of misses costs the IdP one request.
+        """
+        deadline = time.monotonic() + timeout
+        with self._fetched:
+            key = self.get(kid)
+            while key is None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self._fetched.wait(remaining)
+                key = self.get(kid)
+            return key
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="jwks-refresh", daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            self.refresh()
+            # Woken early by kid misses, but never sooner than the floor
+            self._wake.wait(JWKS_REFRESH_SECONDS)
+            time.sleep(max(0.0, self.fetched_at + JWKS_MIN_REFRESH_SECONDS - time.monotonic()))
+            self._wake.clear()
+
+    def stats(self) -> dict:
+        return {"keys": len(self._keys), "fetches": self.fetches, "errors": self.errors}
+
+
+class VerifiedTokenCache:
+    """LRU of token hash -> (subject, exp) for tokens that passed verification."""
 
-_JWKS_CACHE = {
-    "url": None,
-    "fetched_at": 0.0,
-    "client": None,
-}
+    def __init__(self, max_entries: int = CLAIMS_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[bytes, tuple[UUID | None, float]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
 
+    @staticmethod
+    def key(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
 
-def _get_jwks_client(jwks_url: str) -> PyJWKClient:
-    # Cache the JWKS client for 10 minutes
-    now = time.time()
-    if _JWKS_CACHE["client"] and _JWKS_CACHE["url"] == jwks_url and (now - _JWKS_CACHE["fetched_at"]) < 600:
-        return _JWKS_CACHE["client"]
-    client = PyJWKClient(jwks_url)
-    _JWKS_CACHE.update({"url": jwks_url, "fetched_at": now, "client": client})
-    return client
+    def get(self, key: bytes) -> tuple[bool, UUID | None]:
+        """(hit, subject); an entry past its ``exp`` is dropped and counts as a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > time.time():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True, entry[0]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return False, None
 
+    def put(self, key: bytes, sub: UUID | None, exp: float) -> None:
+        with self._lock:
+            self._entries[key] = (sub, exp)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
 
-def verify_bearer(authorization: Optional[str]) -> Optional[UUID]:
+    def stats(self) -> dict:
+        return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+claims_cache = VerifiedTokenCache()
+_refresher: JwksRefresher | None = None
+_refresher_lock = threading.Lock()
+
+
+def get_jwks_refresher(jwks_url: str) -> JwksRefresher:
+    global _refresher
+    if _refresher is None or _refresher.url != jwks_url:
+        with _refresher_lock:
+            if _refresher is None or _refresher.url != jwks_url:
+                _refresher = JwksRefresher(jwks_url)
+    return _refresher
+
+
+def warm() -> None:
+    """Load signing keys and start the refresher; called once at startup when auth is configured."""
+    jwks_url = os.getenv("JWT_JWKS_URL")
+    if jwks_url:
+        refresher = get_jwks_refresher(jwks_url)
+        refresher.refresh()
+        refresher.start()
+
+
+def is_configured() -> bool:
+    return bool(os.getenv("JWT_AUDIENCE") and os.getenv("JWT_ISSUER") and os.getenv("JWT_JWKS_URL"))
+
+
+def verify_bearer(authorization: Optional[str], key_wait: float = 0.0) -> Optional[UUID]:
+    """Subject of a valid bearer token, else None.
+
+    An unknown ``kid`` asks the refresher for fresh keys; with ``key_wait`` the
+    call blocks up to that long for them instead of rejecting the token at once.
+    """
     if not authorization or not authorization.lower().startswith("bearer "):
         return None
 
     token = authorization.split(" ", 1)[1]
+    if not is_configured():
+        # Misconfigured; treat as absent
+        return None
     audience = os.getenv("JWT_AUDIENCE")
     issuer = os.getenv("JWT_ISSUER")
     jwks_url = os.getenv("JWT_JWKS_URL")
-    if not (audience and issuer and jwks_url):
-        # Misconfigured; treat as absent
-        return None
+
+    cache_key = claims_cache.key(token)
+    hit, sub = claims_cache.get(cache_key)
+    if hit:
+        return sub
 
     try:
-        jwk_client = _get_jwks_client(jwks_url)
-        signing_key = jwk_client.get_signing_key_from_jwt(token)
+        refresher = get_jwks_refresher(jwks_url)
+        kid = jwt.get_unverified_header(token).get("kid")
+        signing_key = refresher.get(kid)
+        if signing_key is None and key_wait > 0:
+            signing_key = refresher.wait_for(kid, key_wait)
+        if signing_key is None:
+            return None
         data = jwt.decode(
             token,
             signing_key.key,
-            algorithms=["RS256", "RS512", "ES256", "ES384"],
+            algorithms=ALGORITHMS,
             audience=audience,
             issuer=issuer,
             options={"require": ["exp", "iat", "iss", "aud"]},
         )
         sub = data.get("sub")
-        return UUID(sub) if sub else None
+        uid = UUID(sub) if sub else None
     except Exception:
         return None
-
+    claims_cache.put(cache_key, uid, float(data["exp"]))
+    return uid
@@ -0,0 +1,173 @@
+"""Query instrumentation: per-request query count and DB time, slow-query log, N+1 warnings.
+
+Engine events time every statement and add it to the ``QueryStats`` of the
+request being served (a contextvar set by the request middleware; SQLAlchemy
+runs the sync events inside the caller's context, so it carries through).
+
+- DB_SLOW_QUERY_MS: statements slower than this are logged with normalized SQL
+- DB_N_PLUS_ONE_THRESHOLD: one statement run this many times in a request is
+  logged as a likely N+1
+- DB_QUERY_HEADERS=1: responses carry X-DB-Queries / X-DB-Time-Ms (debugging)
+"""
+
+import logging
+import os
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator
+
+from sqlalchemy import event
+
+from .. import metrics
+
+logger = logging.getLogger(__name__)
+
+
+SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", "200"))
+N_PLUS_ONE_THRESHOLD = int(os.getenv("DB_N_PLUS_ONE_THRESHOLD", "10"))
+QUERY_HEADERS = os.getenv("DB_QUERY_HEADERS", "0") == "1"
+
+db_queries = metrics.registry.counter("weave_db_queries_total", "SQL statements executed")
+db_slow_queries = metrics.registry.counter("weave_db_slow_queries_total", "Statements slower than DB_SLOW_QUERY_MS")
+request_queries = metrics.registry.histogram(
+    "weave_http_request_db_queries",
+    "SQL statements per request, by route template",
+    ("route",),
+    buckets=(1, 2, 3, 5, 10, 20, 50, 100),
+)
+request_db_seconds = metrics.registry.histogram(
+    "weave_http_request_db_seconds", "Time spent in SQL per request, by route template", ("route",)
+)
+pool_wait = metrics.registry.histogram(
+    "weave_db_pool_wait_seconds", "Time for a request session to get a pooled connection (incl. connect/ping)"
+)
+pool_connects = metrics.registry.counter("weave_db_pool_connects_total", "New database connections opened")
+pool_checkouts = metrics.registry.counter("weave_db_pool_checkouts_total", "Connections checked out of the pool")
+n_plus_one = metrics.registry.counter(
+    "weave_http_request_n_plus_one_total", "Requests that repeated one statement N+1 style", ("route",)
+)
+
+
+_QUOTED = re.compile(r"'(?:[^']|'')*'")
+_PLACEHOLDER = re.compile(r"\$\d+|%\(\w+\)s|(?<![:\w]):\w+")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SPACE = re.compile(r"\s+")
+
+
+def normalize_sql(statement: str) -> str:
+    """Statement with literals and bind placeholders as ``?``, IN lists collapsed, on one line."""
+    sql = _QUOTED.sub("?", statement)
+    sql = _PLACEHOLDER.sub("?", sql)
+    sql = _NUMBER.sub("?", sql)
+    sql = _LIST.sub("(...)", sql)
+    return _SPACE.sub(" ", sql).strip()
+
+
+class QueryStats:
+    """Statements run on behalf of one request (or one ``count_queries`` block)."""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.statements: Counter[str] = Counter()
+
+    def add(self, statement: str, seconds: float):
+        self.count += 1
+        self.seconds += seconds
+        self.statements[statement] += 1
+
+    def repeated(self, threshold: int = N_PLUS_ONE_THRESHOLD) -> list[tuple[str, int]]:
+        return [(s, n) for s, n in self.statements.most_common() if n >= threshold]
+
+
+_current: ContextVar[QueryStats | None] = ContextVar("query_stats", default=None)
+# count_queries blocks; these see every statement, whichever thread or request runs it
+_collectors: list[QueryStats] = []
+_collectors_lock = threading.Lock()
+
+
+def _before(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start"].pop()
+    db_queries.inc()
+    stats = _current.get()
+    if stats is not None:
+        stats.add(statement, elapsed)
+    if _collectors:
+        with _collectors_lock:
+            for c in _collectors:
+                c.add(statement, elapsed)
+    if elapsed * 1000 >= SLOW_QUERY_MS:
+        db_slow_queries.inc()
+        logger.warning("slow_query dur_ms=%s sql=%s", int(elapsed * 1000), normalize_sql(statement)[:2000])
+
+
+def _error(exception_context):
+    starts = exception_context.connection.info.get("query_start") if exception_context.connection else None
+    if starts:
+        starts.pop()
+
+
+def instrument(engine) -> None:
+    """Attach the timing hooks to an (async) engine."""
+    sync_engine = getattr(engine, "sync_engine", engine)
+    event.listen(sync_engine, "before_cursor_execute", _before)
+    event.listen(sync_engine, "after_cursor_execute", _after)
+    event.listen(sync_engine, "handle_error", _error)
+
+
+def instrument_pool(engine) -> None:
+    """Pool gauges read at scrape time, plus connect/checkout counters."""
+    sync_engine = getattr(engine, "sync_engine", engine)
+    pool = sync_engine.pool
+    metrics.registry.gauge("weave_db_pool_size", "Configured pool size", func=pool.size)
+    metrics.registry.gauge("weave_db_pool_checked_out", "Connections in use", func=pool.checkedout)
+    metrics.registry.gauge("weave_db_pool_checked_in", "Idle connections in the pool", func=pool.checkedin)
+    # Negative while the pool is below pool_size; positive is connections past it
+    metrics.registry.gauge("weave_db_pool_overflow", "Connections opened beyond pool_size", func=pool.overflow)
+    event.listen(sync_engine, "connect", lambda dbapi_connection, record: pool_connects.inc())
+    event.listen(sync_engine, "checkout", lambda dbapi_connection, record, proxy: pool_checkouts.inc())
+
+
+def begin_request() -> QueryStats:
+    stats = QueryStats()
+    _current.set(stats)
+    return stats
+
+
+def finish_request(stats: QueryStats, route: str, method: str) -> None:
+    """Record the request's totals and warn about statements repeated N+1 style."""
+    request_queries.observe(route, value=stats.count)
+    request_db_seconds.observe(route, value=stats.seconds)
+    repeated = stats.repeated()
+    if repeated:
+        n_plus_one.inc(route)
+        statement, times = repeated[0]
+        logger.warning(
+            "n_plus_one method=%s route=%s times=%s sql=%s", method, route, times, normalize_sql(statement)[:2000]
+        )
+
+
+def headers(stats: QueryStats) -> dict[str, str]:
+    return {"X-DB-Queries": str(stats.count), "X-DB-Time-Ms": f"{stats.seconds * 1000:.1f}"}
+
+
+@contextmanager
+def count_queries() -> Iterator[QueryStats]:
+    """Collect every statement the engine runs inside the block (for tests and scripts)."""
+    stats = QueryStats()
+    with _collectors_lock:
+        _collectors.append(stats)
+    try:
+        yield stats
+    finally:
+        with _collectors_lock:
+            _collectors.remove(stats)
@@ -0,0 +1,2 @@
+-- Keyset pagination for memory listings: (created_at, id) descending
+create index if not exists idx_memory_created_id on memory(created_at desc, id desc);
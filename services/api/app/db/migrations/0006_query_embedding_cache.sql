@@ -0,0 +1,9 @@
+-- Shared tier of the search query-embedding cache (see app/embeddings/cache.py)
+create table if not exists query_embedding_cache (
+  key text primary key,
+  model text not null,
+  dim int not null,
+  embedding real[] not null,
+  created_at timestamptz not null default now()
+);
+create index if not exists idx_query_embedding_cache_created on query_embedding_cache(created_at);
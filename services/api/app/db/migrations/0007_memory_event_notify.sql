@@ -0,0 +1,12 @@
+-- Wake the indexing worker as soon as events are enqueued (LISTEN memory_event)
+create or replace function notify_memory_event() returns trigger as $$
+begin
+  perform pg_notify('memory_event', '');
+  return null;
+end;
+$$ language plpgsql;
+
+drop trigger if exists trg_memory_event_notify on memory_event;
+create trigger trg_memory_event_notify
+  after insert on memory_event
+  for each statement execute function notify_memory_event();
@@ -0,0 +1,3 @@
+-- Indexing skips re-embedding when the built document and embedding model are unchanged
+alter table memory add column if not exists doc_hash text;
+alter table memory add column if not exists embedding_model text;
@@ -0,0 +1,3 @@
+-- Edge lookups by either endpoint (search edge boost, memory detail). a_memory_id
+-- is already the leading column of ux_edge_pair_rel.
+create index if not exists idx_memory_edge_b on memory_edge(b_memory_id);
@@ -0,0 +1,22 @@
+-- Vector index type for memory.embedding: 'ivfflat' (0001_init, the default) or 'hnsw'.
+-- Choose HNSW by running this file with the setting below, and set VECTOR_INDEX=hnsw
+-- for the API so search tunes hnsw.ef_search instead of ivfflat.probes:
+--   PGOPTIONS='-c weave.vector_index=hnsw' psql "$DATABASE_URL" -f 0010_memory_embed_hnsw.sql
+-- Re-running with the other value switches back. On a large table, build the new
+-- index first with CREATE INDEX CONCURRENTLY (not allowed inside DO) and then run this.
+do $$
+declare
+  kind text := coalesce(nullif(current_setting('weave.vector_index', true), ''), 'ivfflat');
+begin
+  if kind = 'hnsw' then
+    create index if not exists idx_memory_embed_hnsw on memory
+      using hnsw (embedding vector_cosine_ops) with (m = 16, ef_construction = 64);
+    drop index if exists idx_memory_embed;
+  elsif kind = 'ivfflat' then
+    create index if not exists idx_memory_embed on memory
+      using ivfflat (embedding vector_cosine_ops) with (lists = 100);
+    drop index if exists idx_memory_embed_hnsw;
+  else
+    raise exception 'weave.vector_index must be ivfflat or hnsw, got %', kind;
+  end if;
+end $$;
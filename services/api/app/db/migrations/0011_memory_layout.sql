@@ -0,0 +1,31 @@
+-- Server-side canvas layout: per-user node positions, maintained by app.workers.layout
+create table if not exists memory_layout (
+  user_id uuid not null references app_user(id) on delete cascade,
+  memory_id uuid not null references memory(id) on delete cascade,
+  x real not null,
+  y real not null,
+  updated_at timestamptz default now(),
+  primary key (user_id, memory_id)
+);
+
+-- Relayout requests: the region around memory_id in user_id's graph changed
+create table if not exists layout_event (
+  id bigserial primary key,
+  user_id uuid not null references app_user(id) on delete cascade,
+  memory_id uuid not null references memory(id) on delete cascade,
+  created_at timestamptz default now()
+);
+create index if not exists idx_layout_event_user on layout_event(user_id);
+
+-- Wake the layout worker as soon as events are enqueued (LISTEN layout_event)
+create or replace function notify_layout_event() returns trigger as $$
+begin
+  perform pg_notify('layout_event', '');
+  return null;
+end;
+$$ language plpgsql;
+
+drop trigger if exists trg_layout_event_notify on layout_event;
+create trigger trg_layout_event_notify
+  after insert on layout_event
+  for each statement execute function notify_layout_event();
@@ -0,0 +1,34 @@
+-- Background exports for large accounts, built by app.workers.export
+create table if not exists export_job (
+  id uuid primary key,
+  user_id uuid not null references app_user(id) on delete cascade,
+  format text not null check (format in ('ndjson','zip')),
+  status text not null default 'PENDING' check (status in ('PENDING','RUNNING','DONE','FAILED')),
+  storage_key text,
+  bytes bigint,
+  error text,
+  created_at timestamptz default now(),
+  started_at timestamptz,
+  finished_at timestamptz
+);
+create index if not exists idx_export_job_user on export_job(user_id, created_at desc);
+create index if not exists idx_export_job_open on export_job(created_at) where status in ('PENDING','RUNNING');
+
+-- The export query walks a user's memories in order and looks up each one's
+-- layers and artifacts; without these every lookup is a sequential scan
+create index if not exists idx_memory_owner_created on memory(owner_id, created_at, id);
+create index if not exists idx_memory_layer_memory on memory_layer(memory_id, created_at);
+create index if not exists idx_artifact_memory on artifact(memory_id);
+
+-- Wake the export worker as soon as a job is queued (LISTEN export_job)
+create or replace function notify_export_job() returns trigger as $$
+begin
+  perform pg_notify('export_job', '');
+  return null;
+end;
+$$ language plpgsql;
+
+drop trigger if exists trg_export_job_notify on export_job;
+create trigger trg_export_job_notify
+  after insert on export_job
+  for each statement execute function notify_export_job();
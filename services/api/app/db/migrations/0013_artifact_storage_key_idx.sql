@@ -0,0 +1,2 @@
+-- Artifact GC (app.workers.artifact_gc) looks up bucket listings 1000 keys at a time
+create index if not exists idx_artifact_storage_key on artifact(storage_key);
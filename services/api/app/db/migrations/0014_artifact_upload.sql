@@ -0,0 +1,15 @@
+-- Direct-to-storage uploads in progress: the client PUTs parts to presigned
+-- URLs, then /v1/artifacts/uploads/{id}/complete verifies and creates the artifact
+create table if not exists artifact_upload (
+  id uuid primary key,
+  user_id uuid not null references app_user(id) on delete cascade,
+  memory_id uuid not null references memory(id) on delete cascade,
+  storage_key text not null,
+  s3_upload_id text not null,
+  mime text not null,
+  bytes bigint not null check (bytes > 0),
+  sha256 text not null,
+  part_bytes bigint not null,
+  created_at timestamptz default now()
+);
+create index if not exists idx_artifact_upload_created on artifact_upload(created_at);
@@ -0,0 +1,9 @@
+-- Shared token buckets for RATE_LIMIT_BACKEND=postgres, so limits hold across
+-- API workers. Unlogged: losing buckets on a crash only resets the limits.
+create unlogged table if not exists rate_limit_bucket (
+  key text primary key,
+  tokens double precision not null,
+  allowed boolean not null,
+  updated_at timestamptz not null default now()
+);
+create index if not exists idx_rate_limit_bucket_updated on rate_limit_bucket(updated_at);
@@ -0,0 +1,24 @@
+-- Direct uploads are verified (size + sha256) by app.workers.artifact_verify
+-- rather than inside the complete request; the session row carries the state
+alter table artifact_upload
+  add column if not exists status text not null default 'UPLOADING'
+    check (status in ('UPLOADING','VERIFYING','DONE','FAILED')),
+  add column if not exists artifact_id uuid references artifact(id) on delete set null,
+  add column if not exists error text,
+  add column if not exists started_at timestamptz,
+  add column if not exists finished_at timestamptz;
+create index if not exists idx_artifact_upload_verifying on artifact_upload(created_at) where status = 'VERIFYING';
+
+-- Wake the verify worker as soon as an upload is completed (LISTEN artifact_upload)
+create or replace function notify_artifact_upload() returns trigger as $$
+begin
+  perform pg_notify('artifact_upload', '');
+  return null;
+end;
+$$ language plpgsql;
+
+drop trigger if exists trg_artifact_upload_notify on artifact_upload;
+create trigger trg_artifact_upload_notify
+  after update of status on artifact_upload
+  for each row when (new.status = 'VERIFYING' and old.status is distinct from 'VERIFYING')
+  execute function notify_artifact_upload();
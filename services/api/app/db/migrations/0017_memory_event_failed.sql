@@ -0,0 +1,7 @@
+-- Dead letters: a memory whose document the embedding provider rejects keeps
+-- one failed event (with the error) instead of blocking its queue partition.
+-- Workers skip failed events; the next edit enqueues a fresh one and retries.
+alter table memory_event
+  add column if not exists failed_at timestamptz,
+  add column if not exists last_error text;
+create index if not exists idx_memory_event_failed on memory_event(failed_at) where failed_at is not null;
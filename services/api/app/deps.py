@@ -1,15 +1,17 @@
 import os
 from uuid import UUID, uuid4
-from typing import Generator
+from typing import AsyncGenerator
 from fastapi import Header, HTTPException, Depends
+from fastapi.concurrency import run_in_threadpool
 from .db.session import get_db_with_rls
-from .auth.jwt import verify_bearer
+from .auth.jwt import JWKS_MISS_WAIT_SECONDS, is_configured, verify_bearer
 
 
 async def get_user_id(authorization: str | None = Header(default=None), x_debug_user: str | None = Header(default=None)) -> UUID:
     """Temporary auth dependency.
     - If X-Debug-User header is present, trust it as a UUID (dev only).
-    - Otherwise, require Authorization and TODO: verify JWT, then return subject UUID.
+    - Otherwise verify the bearer JWT and return its subject; a token that doesn't
+      verify is a 401 when JWT auth is configured.
     Also used by DB layer to SET LOCAL app.user_id for RLS (not implemented in scaffold).
     """
     if x_debug_user:
@@ -22,11 +24,20 @@ async def get_user_id(authorization: str | None = Header(default=None), x_debug_
     uid = verify_bearer(authorization)
     if uid:
         return uid
+    if authorization and is_configured():
+        # Maybe signed with a key rotated in since the last JWKS fetch: wait for
+        # the refresher (off the event loop) before rejecting
+        uid = await run_in_threadpool(verify_bearer, authorization, JWKS_MISS_WAIT_SECONDS)
+        if uid:
+            return uid
+        # Never let a presented but unverifiable token act as some other identity
+        raise HTTPException(status_code=401, detail="Invalid or expired token")
 
-    # Dev fallback if no Authorization or verification failed: ephemeral UUID
+    # Dev fallback if no Authorization (or JWT auth not configured): ephemeral UUID
     return uuid4()
 
 
-def db_session(user_id: UUID = Depends(get_user_id)) -> Generator:
-    """FastAPI dependency yielding a SQLAlchemy session with RLS user set."""
-    yield from get_db_with_rls(str(user_id))
+async def db_session(user_id: UUID = Depends(get_user_id)) -> AsyncGenerator:
+    """FastAPI dependency yielding an async SQLAlchemy session with RLS user set."""
+    async for db in get_db_with_rls(str(user_id)):
+        yield db
@@ -0,0 +1 @@
+# embeddings package
@@ -0,0 +1,120 @@
+"""Two-tier cache for search query embeddings.
+
+Tier 1 is an in-process LRU with TTL; tier 2 is the ``query_embedding_cache``
+table so that all API workers share hits. Keys cover the normalized query,
+model and dimension, so changing EMBEDDING_MODEL never serves stale vectors.
+"""
+
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from hashlib import sha256
+from typing import Optional
+
+import numpy as np
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+CACHE_SIZE = int(os.getenv("EMBED_CACHE_SIZE", "2048"))
+CACHE_TTL_SECONDS = int(os.getenv("EMBED_CACHE_TTL_SECONDS", "3600"))
+SHARED_ENABLED = os.getenv("EMBED_CACHE_SHARED", "1") == "1"
+SHARED_TTL_SECONDS = int(os.getenv("EMBED_CACHE_SHARED_TTL_SECONDS", "86400"))
+# Fraction of shared writes that also purge expired rows
+SHARED_PURGE_RATE = 0.01
+
+
+def normalize_query(q: str) -> str:
+    return " ".join(q.casefold().split())
+
+
+def cache_key(normalized: str, model: str, dim: int) -> str:
+    return sha256(f"{model}\x00{dim}\x00{normalized}".encode()).hexdigest()
+
+
+class QueryEmbeddingCache:
+    """In-process LRU with per-entry TTL and hit/miss counters."""
+
+    def __init__(self, maxsize: int = CACHE_SIZE, ttl_seconds: int = CACHE_TTL_SECONDS):
+        self.maxsize = maxsize
+        self.ttl = ttl_seconds
+        self._data: OrderedDict[str, tuple[float, np.ndarray]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.local_hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, vec = item
+            if expires_at <= now:
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            self.local_hits += 1
+            return vec
+
+    def put(self, key: str, vec: np.ndarray) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, vec)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self) -> dict:
+        lookups = self.local_hits + self.shared_hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "local_hits": self.local_hits,
+            "shared_hits": self.shared_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round((self.local_hits + self.shared_hits) / lookups, 4) if lookups else 0.0,
+        }
+
+
+query_cache = QueryEmbeddingCache()
+
+
+async def shared_get(db: AsyncSession, key: str) -> Optional[np.ndarray]:
+    if not SHARED_ENABLED:
+        return None
+    row = (await db.execute(
+        text(
+            """
+            select embedding from query_embedding_cache
+            where key = :key and created_at > now() - make_interval(secs => :ttl)
+            """
+        ),
+        {"key": key, "ttl": SHARED_TTL_SECONDS},
+    )).one_or_none()
+    return np.asarray(row[0], dtype=np.float32) if row else None
+
+
+async def shared_put(db: AsyncSession, key: str, model: str, dim: int, vec: np.ndarray) -> None:
+    if not SHARED_ENABLED:
+        return
+    await db.execute(
+        text(
+            """
+            insert into query_embedding_cache (key, model, dim, embedding)
+            values (:key, :model, :dim, :emb)
+            on conflict (key) do update set embedding = excluded.embedding, created_at = now()
+            """
+        ),
+        {"key": key, "model": model, "dim": dim, "emb": vec.tolist()},
+    )
+    if random.random() < SHARED_PURGE_RATE:
+        await db.execute(
+            text("delete from query_embedding_cache where created_at < now() - make_interval(secs => :ttl)"),
+            {"ttl": SHARED_TTL_SECONDS},
+        )
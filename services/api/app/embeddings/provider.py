@@ -0,0 +1,242 @@
+"""Embedding provider shared by search and the indexing worker.
+
+One long-lived OpenAI client per process (pooled HTTP connections), list-input
+batching, explicit timeouts, retries with exponential backoff and a circuit
+breaker. Without OPENAI_API_KEY every text embeds to a zero vector (dev mode).
+
+Search embeds queries through ``get_query_provider``: same model, but a short
+timeout, no retries by default and its own breaker, so a slow provider costs
+a search at most EMBEDDING_QUERY_TIMEOUT_SECONDS before it ranks lexically.
+"""
+
+import logging
+import os
+import random
+import threading
+import time
+from typing import Optional, Sequence
+
+import httpx
+import openai
+
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_DIM = int(os.getenv("EMBEDDING_DIM", "1536"))
+MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+TIMEOUT_SECONDS = float(os.getenv("EMBEDDING_TIMEOUT_SECONDS", "10"))
+MAX_RETRIES = int(os.getenv("EMBEDDING_MAX_RETRIES", "3"))
+QUERY_TIMEOUT_SECONDS = float(os.getenv("EMBEDDING_QUERY_TIMEOUT_SECONDS", "2"))
+QUERY_MAX_RETRIES = int(os.getenv("EMBEDDING_QUERY_MAX_RETRIES", "0"))
+# Inputs are cut to this many characters; the model takes 8191 tokens, and ~2
+# characters per token leaves room for text that tokenizes worse than English
+MAX_INPUT_CHARS = int(os.getenv("EMBEDDING_MAX_INPUT_CHARS", "16000"))
+POOL_SIZE = int(os.getenv("EMBEDDING_POOL_SIZE", "10"))
+BREAKER_THRESHOLD = int(os.getenv("EMBEDDING_BREAKER_THRESHOLD", "5"))
+BREAKER_COOLDOWN_SECONDS = float(os.getenv("EMBEDDING_BREAKER_COOLDOWN_SECONDS", "30"))
+
+_RETRYABLE = (
+    openai.APIConnectionError,  # includes APITimeoutError
+    openai.RateLimitError,
+    openai.InternalServerError,
+)
+# The provider refused these inputs (too long, malformed); retrying or tripping
+# the breaker would not help, and other inputs are unaffected
+_REJECTED_STATUS = (400, 413, 422)
+
+
+class EmbeddingError(RuntimeError):
+    """Embeddings could not be produced (provider failing or circuit open)."""
+
+
+class EmbeddingRejected(EmbeddingError):
+    """The provider rejected the inputs themselves; other inputs can still be embedded."""
+
+
+class CircuitBreaker:
+    """Opens after ``threshold`` consecutive failures; lets one probe through after ``cooldown``."""
+
+    def __init__(self, threshold: int = BREAKER_THRESHOLD, cooldown: float = BREAKER_COOLDOWN_SECONDS):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.cooldown:
+            return "half-open"
+        return "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self.state
+            if state == "half-open":
+                # Re-arm the cooldown so only one caller probes at a time
+                self.opened_at = time.monotonic()
+                return True
+            return state == "closed"
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+
+
+class EmbeddingProvider:
+    def __init__(
+        self,
+        api_key: Optional[str],
+        model: str = MODEL,
+        dim: int = EMBEDDING_DIM,
+        batch_size: int = BATCH_SIZE,
+        max_retries: int = MAX_RETRIES,
+        timeout: float = TIMEOUT_SECONDS,
+        breaker: Optional[CircuitBreaker] = None,
+        client=None,
+    ):
+        self.api_key = api_key
+        self.model = model
+        self.dim = dim
+        self.batch_size = max(1, batch_size)
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.breaker = breaker or CircuitBreaker()
+        self._client = client
+
+    @property
+    def signature(self) -> str:
+        """Identifies the vectors this provider produces; zero vectors never match a real model."""
+        return f"{self.model if self.api_key else 'zero'}:{self.dim}"
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = openai.OpenAI(
+                api_key=self.api_key,
+                timeout=httpx.Timeout(self.timeout, connect=min(self.timeout, 5.0)),
+                max_retries=0,  # retries are handled here so the breaker sees them
+                http_client=httpx.Client(
+                    limits=httpx.Limits(max_connections=POOL_SIZE, max_keepalive_connections=POOL_SIZE),
+                ),
+            )
+        return self._client
+
+    def embed(self, text: str) -> list[float]:
+        return self.embed_many([text])[0]
+
+    def embed_many(self, texts: Sequence[str], rejected: Optional[dict[int, str]] = None) -> list[list[float]]:
+        """Embed ``texts`` in order, sending up to ``batch_size`` inputs per request.
+
+        With ``rejected`` given, a batch the provider refuses is retried one input
+        at a time; inputs still refused keep the zero vector and are recorded there
+        (index -> error) instead of raising EmbeddingRejected.
+        """
+        out: list[list[float]] = [[0.0] * self.dim for _ in texts]
+        if not self.api_key:
+            return out
+        # The API rejects empty input; blank documents keep the zero vector
+        pending = [i for i, t in enumerate(texts) if t and t.strip()]
+        for start in range(0, len(pending), self.batch_size):
+            idx = pending[start:start + self.batch_size]
+            inputs = [texts[i][:MAX_INPUT_CHARS] for i in idx]
+            try:
+                vecs = self._request(inputs)
+            except EmbeddingRejected as e:
+                if rejected is None:
+                    raise
+                if len(idx) == 1:
+                    rejected[idx[0]] = str(e)
+                    continue
+                # One bad input fails the whole request; find it so the others still embed
+                vecs = self._request_each(idx, inputs, rejected)
+            for i, vec in zip(idx, vecs):
+                if vec is not None:
+                    out[i] = self._fit(vec)
+        return out
+
+    def _request_each(self, idx: list[int], inputs: list[str], rejected: dict[int, str]) -> list:
+        vecs = []
+        for i, text_in in zip(idx, inputs):
+            try:
+                vecs.append(self._request([text_in])[0])
+            except EmbeddingRejected as e:
+                logger.warning("Embedding input %s rejected: %s", i, e)
+                rejected[i] = str(e)
+                vecs.append(None)
+        return vecs
+
+    def _request(self, inputs: list[str]) -> list[list[float]]:
+        if not self.breaker.allow():
+            raise EmbeddingError("embedding circuit open")
+        attempt = 0
+        while True:
+            try:
+                resp = self.client.embeddings.create(model=self.model, input=inputs)
+            except _RETRYABLE as e:
+                if attempt >= self.max_retries:
+                    self.breaker.record_failure()
+                    raise EmbeddingError(f"embedding request failed after {attempt + 1} attempts: {e}") from e
+                delay = min(8.0, 0.5 * 2 ** attempt) * random.uniform(0.5, 1.0)
+                logger.warning("Embedding request failed (%s); retrying in %.2fs", e, delay)
+                time.sleep(delay)
+                attempt += 1
+                continue
+            except openai.APIStatusError as e:
+                if e.status_code in _REJECTED_STATUS:
+                    raise EmbeddingRejected(f"embedding request rejected: {e}") from e
+                # Auth, permissions, unknown model: every request will fail the same way
+                self.breaker.record_failure()
+                raise EmbeddingError(f"embedding request rejected: {e}") from e
+            except openai.OpenAIError as e:
+                self.breaker.record_failure()
+                raise EmbeddingError(f"embedding request rejected: {e}") from e
+            self.breaker.record_success()
+            return [d.embedding for d in sorted(resp.data, key=lambda d: d.index)]
+
+    def _fit(self, vec: list[float]) -> list[float]:
+        if len(vec) == self.dim:
+            return vec
+        logger.warning("Embedding dimension mismatch: got %s, expected %s", len(vec), self.dim)
+        if len(vec) < self.dim:
+            return vec + [0.0] * (self.dim - len(vec))
+        return vec[:self.dim]
+
+
+_provider: Optional[EmbeddingProvider] = None
+_query_provider: Optional[EmbeddingProvider] = None
+_provider_lock = threading.Lock()
+
+
+def get_provider() -> EmbeddingProvider:
+    """Process-wide provider; the underlying HTTP pool is reused across calls."""
+    global _provider
+    if _provider is None:
+        with _provider_lock:
+            if _provider is None:
+                _provider = EmbeddingProvider(api_key=os.getenv("OPENAI_API_KEY"))
+    return _provider
+
+
+def get_query_provider() -> EmbeddingProvider:
+    """Process-wide provider for interactive query embeddings (short timeout, own breaker)."""
+    global _query_provider
+    if _query_provider is None:
+        with _provider_lock:
+            if _query_provider is None:
+                _query_provider = EmbeddingProvider(
+                    api_key=os.getenv("OPENAI_API_KEY"),
+                    max_retries=QUERY_MAX_RETRIES,
+                    timeout=QUERY_TIMEOUT_SECONDS,
+                )
+    return _query_provider
@@ -1,9 +1,17 @@
-from fastapi import FastAPI
-from fastapi.responses import ORJSONResponse
+import asyncio
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import ORJSONResponse, PlainTextResponse
 import os
 from fastapi.middleware.cors import CORSMiddleware
 import time
 import logging
+from contextlib import asynccontextmanager
+from . import metrics
+from .auth import jwt as jwt_auth
+from .db import instrument
+from .db.session import engine
+from .embeddings.cache import query_cache
+from .storage.s3 import url_cache
 from .middleware.rate_limit import rate_limit_middleware
 from .routers import memories as memories_router
 from .routers import search as search_router
@@ -15,10 +23,20 @@ from .routers import follows as follows_router
 from .routers import graph as graph_router
 from .routers import export as export_router
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Signing keys are in memory before the first request; the refresher keeps them current
+    await asyncio.to_thread(jwt_auth.warm)
+    yield
+    # Pooled asyncpg connections are bound to this event loop; close them with it
+    await engine.dispose()
+
+
 app = FastAPI(
     title="Weave API",
     version="1.0",
     default_response_class=ORJSONResponse,
+    lifespan=lifespan,
 )
 
 # CORS
@@ -38,24 +56,64 @@ logger = logging.getLogger("weave.api")
 logging.basicConfig(level=logging.INFO)
 
 
+def route_template(request: Request) -> str:
+    """The matched route's path template, so /v1/memories/{id} is one series, not one per id."""
+    route = request.scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
 @app.middleware("http")
-async def log_requests(request, call_next):
-    start = time.time()
-    resp = await call_next(request)
-    dur_ms = int((time.time() - start) * 1000)
-    logger.info(
-        "method=%s path=%s status=%s dur_ms=%s",
-        request.method,
-        request.url.path,
-        resp.status_code,
-        dur_ms,
-    )
+async def log_requests(request: Request, call_next):
+    method = request.method
+    metrics.http_in_flight.inc(method)
+    start = time.perf_counter()
+    status = 500
+    queries = instrument.begin_request()
+    try:
+        resp = await call_next(request)
+        status = resp.status_code
+        if instrument.QUERY_HEADERS:
+            resp.headers.update(instrument.headers(queries))
+    finally:
+        # Streaming bodies (exports) are timed to their first byte
+        dur = time.perf_counter() - start
+        metrics.http_in_flight.dec(method)
+        route = route_template(request)
+        metrics.http_requests.inc(method, route, status)
+        metrics.http_latency.observe(method, route, value=dur)
+        instrument.finish_request(queries, route, method)
+        logger.info(
+            "method=%s route=%s path=%s status=%s dur_ms=%s db_queries=%s db_ms=%s",
+            method,
+            route,
+            request.url.path,
+            status,
+            int(dur * 1000),
+            queries.count,
+            int(queries.seconds * 1000),
+        )
     return resp
 
 
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics(request: Request):
+    if METRICS_TOKEN and request.headers.get("authorization") != f"Bearer {METRICS_TOKEN}":
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    return PlainTextResponse(metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
+
+
 @app.get("/v1/health")
 async def health():
-    return {"ok": True, "version": app.version}
+    return {
+        "ok": True,
+        "version": app.version,
+        "embedding_cache": query_cache.stats(),
+        "presign_cache": url_cache.stats(),
+        "jwt_cache": jwt_auth.claims_cache.stats(),
+    }
 
 
 app.include_router(memories_router.router)
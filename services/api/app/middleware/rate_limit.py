@@ -1,29 +1,212 @@
+"""Token-bucket rate limiting per caller.
+
+Each caller (JWT subject, else client IP) has a bucket of RATE_LIMIT_BURST
+tokens that refills at RATE_LIMIT_PER_MINUTE per minute; a request spends
+its route's cost (RATE_LIMIT_COSTS, longest path prefix wins, default 1).
+Buckets live in a pluggable backend:
+
+- memory:   per process, LRU-bounded; idle buckets are evicted once full again
+- postgres: one shared unlogged table, so limits hold across API workers
+
+Another store (e.g. Redis) only needs an async ``take``.
+"""
+
+import logging
+import math
+import os
+import random
+import threading
 import time
-from typing import Callable
-from fastapi import Request, HTTPException
+from collections import OrderedDict
+from typing import Callable, Protocol
+from uuid import UUID
+
+from fastapi import Request
+from fastapi.responses import JSONResponse
+from sqlalchemy import text
+
+from ..auth.jwt import verify_bearer
+from ..db.session import engine
+
+logger = logging.getLogger(__name__)
+
+
+# 0 turns the limiter off (benchmarks, load tests)
+ENABLED = os.getenv("RATE_LIMIT_ENABLED", "1") == "1"
+RATE_PER_MINUTE = float(os.getenv("RATE_LIMIT_PER_MINUTE", "120"))
+BURST = float(os.getenv("RATE_LIMIT_BURST", str(RATE_PER_MINUTE)))
+BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")
+MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+# Dev only: give each X-Debug-User its own bucket. The header is client-controlled,
+# so otherwise it is ignored here and unverified callers share their IP's bucket
+TRUST_DEBUG_USER = os.getenv("RATE_LIMIT_TRUST_DEBUG_USER", "0") == "1"
+# "prefix=cost,..."; cost 0 exempts a route
+COSTS = os.getenv(
+    "RATE_LIMIT_COSTS",
+    "/v1/health=0,/metrics=0,/v1/search=5,/v1/export=20,/v1/artifacts/upload=10,/v1/graph=3",
+)
+# Fraction of shared-backend calls that also purge idle buckets
+PURGE_RATE = 0.01
+
+
+class Backend(Protocol):
+    async def take(self, key: str, cost: float, capacity: float, rate: float) -> tuple[bool, float]:
+        """Spend ``cost`` tokens if available; returns (allowed, tokens left or seconds until allowed)."""
+
+
+def _retry_after(tokens: float, cost: float, rate: float) -> float:
+    return (cost - tokens) / rate if rate > 0 else math.inf
+
+
+class MemoryBackend:
+    """In-process buckets, most recently used last; bounded by ``max_keys``."""
+
+    def __init__(self, max_keys: int = MAX_KEYS, clock: Callable[[], float] = time.monotonic):
+        self.max_keys = max_keys
+        self.clock = clock
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
 
+    def __len__(self) -> int:
+        return len(self._buckets)
 
-class SimpleRateLimiter:
-    def __init__(self, rate_per_minute: int = 120):
-        self.rate = rate_per_minute
-        self.allowance = {}
+    async def take(self, key: str, cost: float, capacity: float, rate: float) -> tuple[bool, float]:
+        now = self.clock()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            self._buckets[key] = (tokens, now)
+            self._evict(now, capacity, rate)
+        return allowed, tokens if allowed else _retry_after(tokens, cost, rate)
 
-    def __call__(self, key: str) -> None:
-        now = int(time.time() // 60)  # minute window
-        count = self.allowance.get((key, now), 0)
-        if count >= self.rate:
-            raise HTTPException(status_code=429, detail="Rate limit exceeded")
-        self.allowance[(key, now)] = count + 1
+    def _evict(self, now: float, capacity: float, rate: float):
+        # A bucket idle long enough to be full again is the same as no bucket
+        idle_after = capacity / rate if rate > 0 else math.inf
+        for _ in range(2):
+            oldest = next(iter(self._buckets.items()), None)
+            if oldest is None or now - oldest[1][1] < idle_after:
+                break
+            del self._buckets[oldest[0]]
+            self.evictions += 1
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+            self.evictions += 1
 
 
-limiter = SimpleRateLimiter()
+class PostgresBackend:
+    """Buckets in ``rate_limit_bucket``: one atomic upsert per request, shared by all workers."""
+
+    # Typed binds: asyncpg can't infer a type for bare arithmetic on parameters
+    _CAP, _COST, _RATE = "cast(:capacity as float8)", "cast(:cost as float8)", "cast(:rate as float8)"
+    _REFILL = f"least({_CAP}, b.tokens + extract(epoch from now() - b.updated_at) * {_RATE})"
+    _TAKE_SQL = text(
+        f"""
+        insert into rate_limit_bucket as b (key, tokens, allowed, updated_at)
+        values (
+          :key,
+          case when {_CAP} >= {_COST} then {_CAP} - {_COST} else {_CAP} end,
+          {_CAP} >= {_COST},
+          now()
+        )
+        on conflict (key) do update set
+          allowed = {_REFILL} >= {_COST},
+          tokens = {_REFILL} - case when {_REFILL} >= {_COST} then {_COST} else 0 end,
+          updated_at = now()
+        returning allowed, tokens
+        """
+    )
+
+    def __init__(self, engine=engine):
+        self.engine = engine
+
+    async def take(self, key: str, cost: float, capacity: float, rate: float) -> tuple[bool, float]:
+        params = {"key": key, "cost": cost, "capacity": capacity, "rate": rate}
+        async with self.engine.begin() as conn:
+            allowed, tokens = (await conn.execute(self._TAKE_SQL, params)).one()
+            if random.random() < PURGE_RATE:
+                await conn.execute(
+                    text("delete from rate_limit_bucket where updated_at < now() - make_interval(secs => :idle)"),
+                    {"idle": capacity / rate if rate > 0 else 86400},
+                )
+        return allowed, tokens if allowed else _retry_after(tokens, cost, rate)
+
+
+def parse_costs(spec: str) -> list[tuple[str, float]]:
+    costs = []
+    for item in spec.split(","):
+        prefix, _, cost = item.strip().partition("=")
+        if prefix and cost:
+            costs.append((prefix, float(cost)))
+    # Longest prefix first so /v1/search/x can override /v1/search
+    return sorted(costs, key=lambda c: len(c[0]), reverse=True)
+
+
+class TokenBucketLimiter:
+    def __init__(
+        self,
+        backend: Backend,
+        per_minute: float = RATE_PER_MINUTE,
+        burst: float = BURST,
+        costs: list[tuple[str, float]] | None = None,
+    ):
+        self.backend = backend
+        self.rate = per_minute / 60.0
+        self.capacity = burst
+        self.costs = parse_costs(COSTS) if costs is None else costs
+
+    def cost(self, path: str) -> float:
+        for prefix, cost in self.costs:
+            if path.startswith(prefix):
+                return cost
+        return 1.0
+
+    async def check(self, key: str, path: str) -> tuple[bool, float]:
+        cost = self.cost(path)
+        if cost <= 0:
+            return True, self.capacity
+        return await self.backend.take(key, cost, self.capacity, self.rate)
+
+
+def _backend_from_env() -> Backend:
+    if BACKEND == "postgres":
+        return PostgresBackend()
+    return MemoryBackend()
+
+
+limiter: TokenBucketLimiter | None = TokenBucketLimiter(_backend_from_env()) if ENABLED else None
+
+
+def client_key(request: Request) -> str:
+    """Bucket key: the verified JWT subject when there is one, else the client address."""
+    uid = verify_bearer(request.headers.get("authorization"))
+    if uid:
+        return f"user:{uid}"
+    debug_user = request.headers.get("x-debug-user")
+    if TRUST_DEBUG_USER and debug_user:
+        try:
+            return f"user:{UUID(debug_user)}"
+        except ValueError:
+            pass
+    return f"ip:{request.client.host if request.client else 'unknown'}"
 
 
 async def rate_limit_middleware(request: Request, call_next: Callable):
-    key = request.client.host if request.client else "unknown"
+    if limiter is None:
+        return await call_next(request)
     try:
-        limiter(key)
-    except HTTPException as e:
-        raise e
+        allowed, remaining = await limiter.check(client_key(request), request.url.path)
+    except Exception as e:
+        # A broken shared store must not take the API down with it
+        logger.warning(f"Rate limiter unavailable, allowing request: {e}")
+        return await call_next(request)
+    if not allowed:
+        return JSONResponse(
+            status_code=429,
+            content={"detail": "Rate limit exceeded"},
+            headers={"Retry-After": str(max(1, math.ceil(remaining)))},
+        )
     return await call_next(request)
-
@@ -87,6 +87,26 @@ class ArtifactMeta(BaseModel):
     id: UUID
     mime: str
     bytes: int
+    # Presigned GET URL (valid for at least a day); None when storage isn't configured
+    url: Optional[str] = None
+
+
+class UploadInitReq(BaseModel):
+    memory_id: UUID
+    filename: str
+    content_type: Optional[str] = None
+    bytes: int = Field(gt=0)
+    sha256: str
+
+
+class UploadPart(BaseModel):
+    part_number: int = Field(ge=1, le=10000)
+    etag: str
+
+
+class UploadCompleteReq(BaseModel):
+    # Optional: without it the parts are listed from storage, so browsers needn't read ETag headers
+    parts: Optional[List[UploadPart]] = None
 
 
 class LayerOut(BaseModel):
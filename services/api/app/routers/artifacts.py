@@ -1,88 +1,305 @@
+import asyncio
+import os
+import re
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
 from uuid import UUID, uuid4
-from hashlib import sha256
+from hashlib import sha256 as sha256_hash
 
-from sqlalchemy import select, insert
-from sqlalchemy.orm import Session
+from botocore.exceptions import ClientError
+from sqlalchemy import select, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from ..deps import get_user_id, db_session
 from ..db.models_orm import Memory, Participant, Artifact
-from ..storage.s3 import put_fileobj, presign_get_url
+from ..models import UploadCompleteReq, UploadInitReq
+from ..storage.s3 import (
+    S3_PART_BYTES,
+    abort_multipart,
+    complete_multipart,
+    create_multipart,
+    delete_object,
+    list_parts,
+    object_size,
+    presign_get,
+    presign_get_url,
+    presign_upload_part,
+    upload_stream,
+)
 
 router = APIRouter(prefix="/v1", tags=["artifacts"])
 
+READ_BYTES = 1024 * 1024
+MAX_PARTS = 10000
+# Direct uploads: largest declared size accepted, and how long part URLs stay valid
+MAX_UPLOAD_BYTES = int(os.getenv("ARTIFACT_MAX_UPLOAD_BYTES", str(5 * 1024 ** 3)))
+UPLOAD_URL_TTL_SECONDS = int(os.getenv("ARTIFACT_UPLOAD_URL_TTL_SECONDS", "3600"))
+_SHA256_HEX = re.compile(r"[0-9a-f]{64}")
 
-@router.post("/artifacts/upload")
-async def upload_artifact(
-    memory_id: UUID,
-    file: UploadFile = File(...),
-    user_id: UUID = Depends(get_user_id),
-    db: Session = Depends(db_session),
-):
+
+def _check_digest(value: str) -> str:
+    digest = value.lower()
+    if not _SHA256_HEX.fullmatch(digest):
+        raise HTTPException(status_code=400, detail="sha256 must be 64 hex characters")
+    return digest
+
+
+async def _existing(db: AsyncSession, user_id: UUID, memory_id: UUID, digest: str) -> Artifact | None:
+    """The owner's artifact with ``digest``; 409 if it is attached to another memory."""
+    art = (await db.execute(
+        select(Artifact).where(Artifact.owner_id == user_id, Artifact.sha256 == digest)
+    )).scalar_one_or_none()
+    if art and art.memory_id != memory_id:
+        raise HTTPException(status_code=409, detail="Artifact already exists under a different memory for this owner")
+    return art
+
+
+async def _require_uploader(db: AsyncSession, user_id: UUID, memory_id: UUID):
     # Ensure memory exists and user is owner or contributor
-    mem = db.execute(select(Memory).where(Memory.id == memory_id)).scalar_one_or_none()
+    mem = (await db.execute(select(Memory).where(Memory.id == memory_id))).scalar_one_or_none()
     if not mem:
         raise HTTPException(status_code=404, detail="Memory not found")
 
     is_owner = mem.owner_id == user_id
-    is_contrib = db.execute(
+    is_contrib = (await db.execute(
         select(Participant).where(
             Participant.memory_id == memory_id,
             Participant.user_id == user_id,
             Participant.role.in_(["OWNER", "CONTRIBUTOR"]),
         )
-    ).first() is not None
+    )).first() is not None
     if not (is_owner or is_contrib):
         raise HTTPException(status_code=403, detail="Not allowed to upload artifacts")
 
-    # Compute sha256 and size; then rewind and upload to S3
-    hasher = sha256()
-    total = 0
-    # Read chunks to compute hash
-    while True:
-        chunk = await file.read(1024 * 1024)
-        if not chunk:
-            break
-        hasher.update(chunk)
-        total += len(chunk)
 
+def _storage_key(memory_id: UUID, filename: str | None) -> str:
+    return f"mem/{memory_id}/{uuid4()}_{filename or 'upload.bin'}"
+
+
+async def _insert_artifact(db: AsyncSession, **values) -> Artifact:
+    """Insert unless the owner already has this content; a losing duplicate's object is deleted."""
+    # (owner_id, sha256) is unique; on conflict the first copy wins and ours is removed
+    art_id = (await db.execute(
+        pg_insert(Artifact)
+        .values(id=uuid4(), **values)
+        .on_conflict_do_nothing(index_elements=["owner_id", "sha256"])
+        .returning(Artifact.id)
+    )).scalar_one_or_none()
+    if art_id is None:
+        await asyncio.to_thread(delete_object, values["storage_key"])
+        return await _existing(db, values["owner_id"], values["memory_id"], values["sha256"])
+    return (await db.execute(select(Artifact).where(Artifact.id == art_id))).scalar_one()
+
+
+def _artifact_out(art: Artifact) -> dict:
+    url = presign_get_url(art.storage_key)
+    return {"artifact_id": str(art.id), "url": url, "bytes": art.bytes, "mime": art.mime}
+
+
+@router.post("/artifacts/upload")
+async def upload_artifact(
+    memory_id: UUID,
+    file: UploadFile = File(...),
+    sha256: str | None = None,
+    user_id: UUID = Depends(get_user_id),
+    db: AsyncSession = Depends(db_session),
+):
+    await _require_uploader(db, user_id, memory_id)
+
+    if sha256 is not None:
+        claimed = _check_digest(sha256)
+        # Known content: answer from the existing row without sending anything to S3
+        existing = await _existing(db, user_id, memory_id, claimed)
+        if existing:
+            return _artifact_out(existing)
+
+    key = _storage_key(memory_id, file.filename)
+
+    # One pass: hash each chunk as it streams to S3 (multipart, off the event loop)
+    hasher = sha256_hash()
+
+    async def chunks():
+        while chunk := await file.read(READ_BYTES):
+            hasher.update(chunk)
+            yield chunk
+
+    total = await upload_stream(key, chunks(), content_type=file.content_type)
     digest = hasher.hexdigest()
-    # Rewind the file for upload
-    await file.seek(0)
+    if sha256 is not None and digest != claimed:
+        await asyncio.to_thread(delete_object, key)
+        raise HTTPException(status_code=400, detail="sha256 does not match the uploaded content")
 
-    # Choose storage key
-    filename = file.filename or "upload.bin"
-    key = f"mem/{memory_id}/{uuid4()}_{filename}"
+    art = await _insert_artifact(
+        db,
+        memory_id=memory_id,
+        owner_id=user_id,
+        mime=file.content_type or "application/octet-stream",
+        storage_key=key,
+        sha256=digest,
+        bytes=total,
+    )
+    return _artifact_out(art)
 
-    # Upload streaming to S3
-    # FastAPI's UploadFile exposes a SpooledTemporaryFile that is file-like for boto3
-    put_fileobj(key, file.file, content_type=file.content_type)
 
-    # Insert artifact row; handle owner-level dedupe on sha256
-    existing = db.execute(
-        select(Artifact).where(Artifact.owner_id == user_id, Artifact.sha256 == digest)
-    ).scalar_one_or_none()
+@router.get("/artifacts/lookup")
+async def lookup_artifact(
+    memory_id: UUID,
+    sha256: str,
+    user_id: UUID = Depends(get_user_id),
+    db: AsyncSession = Depends(db_session),
+):
+    """Pre-upload check: the caller's artifact with this content hash, so the file needn't be sent."""
+    art = await _existing(db, user_id, memory_id, _check_digest(sha256))
+    if not art:
+        raise HTTPException(status_code=404, detail="Artifact not found")
+    return _artifact_out(art)
+
+
+@router.post("/artifacts/uploads")
+async def initiate_upload(
+    req: UploadInitReq,
+    user_id: UUID = Depends(get_user_id),
+    db: AsyncSession = Depends(db_session),
+):
+    """Start a direct-to-storage upload: the client PUTs each part to its presigned URL.
+
+    Part ``n`` covers bytes ``[(n-1) * part_bytes, n * part_bytes)``. Known
+    content short-circuits with ``artifact`` set and no upload to do.
+    """
+    await _require_uploader(db, user_id, req.memory_id)
+    digest = _check_digest(req.sha256)
+    existing = await _existing(db, user_id, req.memory_id, digest)
     if existing:
-        if str(existing.memory_id) != str(memory_id):
-            raise HTTPException(status_code=409, detail="Artifact already exists under a different memory for this owner")
-        art = existing
+        return {"upload_id": None, "artifact": _artifact_out(existing), "parts": []}
+    if req.bytes > MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail=f"Uploads are limited to {MAX_UPLOAD_BYTES} bytes")
+
+    # S3 allows at most 10000 parts; grow the part size for very large files
+    part_bytes = max(S3_PART_BYTES, -(-req.bytes // MAX_PARTS))
+    count = -(-req.bytes // part_bytes)
+    key = _storage_key(req.memory_id, req.filename)
+    mime = req.content_type or "application/octet-stream"
+    s3_upload_id = await asyncio.to_thread(create_multipart, key, mime)
+    upload_id = uuid4()
+    await db.execute(
+        text(
+            """
+            insert into artifact_upload (id, user_id, memory_id, storage_key, s3_upload_id, mime, bytes, sha256, part_bytes)
+            values (:id, :uid, :mid, :key, :s3_upload_id, :mime, :bytes, :sha256, :part_bytes)
+            """
+        ),
+        {
+            "id": upload_id, "uid": user_id, "mid": req.memory_id, "key": key, "s3_upload_id": s3_upload_id,
+            "mime": mime, "bytes": req.bytes, "sha256": digest, "part_bytes": part_bytes,
+        },
+    )
+    urls = await asyncio.to_thread(
+        lambda: [presign_upload_part(key, s3_upload_id, n, UPLOAD_URL_TTL_SECONDS) for n in range(1, count + 1)]
+    )
+    return {
+        "upload_id": upload_id,
+        "artifact": None,
+        "part_bytes": part_bytes,
+        "parts": [{"part_number": n, "url": url} for n, url in enumerate(urls, start=1)],
+        "expires_in": UPLOAD_URL_TTL_SECONDS,
+    }
+
+
+async def _get_upload(db: AsyncSession, user_id: UUID, upload_id: UUID, lock: bool = True):
+    row = (await db.execute(
+        text(
+            f"""
+            select id, memory_id, storage_key, s3_upload_id, mime, bytes, sha256, status, artifact_id, error
+            from artifact_upload
+            where id = :id and user_id = :uid
+            {"for update" if lock else ""}
+            """
+        ),
+        {"id": upload_id, "uid": user_id},
+    )).first()
+    if not row:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    return row
+
+
+async def _upload_out(db: AsyncSession, up) -> dict:
+    art = None
+    if up.status == "DONE" and up.artifact_id:
+        art = (await db.execute(select(Artifact).where(Artifact.id == up.artifact_id))).scalar_one_or_none()
+    return {
+        "upload_id": up.id,
+        "status": up.status,
+        "error": up.error,
+        "artifact": _artifact_out(art) if art else None,
+    }
+
+
+@router.post("/artifacts/uploads/{upload_id}/complete", status_code=202)
+async def complete_upload(
+    upload_id: UUID,
+    req: UploadCompleteReq | None = None,
+    user_id: UUID = Depends(get_user_id),
+    db: AsyncSession = Depends(db_session),
+):
+    """Assemble the parts and queue the upload for verification.
+
+    app.workers.artifact_verify checks the sha256 against the declared value
+    and creates the artifact; poll GET /v1/artifacts/uploads/{id} until it is
+    DONE (with ``artifact``) or FAILED. Calling complete again is harmless.
+    """
+    up = await _get_upload(db, user_id, upload_id)
+    if up.status != "UPLOADING":
+        return await _upload_out(db, up)
+    if req and req.parts:
+        parts = [{"PartNumber": p.part_number, "ETag": p.etag} for p in req.parts]
     else:
-        art_id = uuid4()
-        db.execute(
-            insert(Artifact).values(
-                id=art_id,
-                memory_id=memory_id,
-                owner_id=user_id,
-                mime=file.content_type or "application/octet-stream",
-                storage_key=key,
-                sha256=digest,
-                bytes=total,
-            )
+        parts = await asyncio.to_thread(list_parts, up.storage_key, up.s3_upload_id)
+    if not parts:
+        raise HTTPException(status_code=400, detail="No parts have been uploaded")
+    try:
+        await asyncio.to_thread(complete_multipart, up.storage_key, up.s3_upload_id, parts)
+    except ClientError as e:
+        # Missing/invalid parts: the upload stays open so the client can retry them
+        raise HTTPException(status_code=400, detail=f"Could not complete upload: {e.response['Error']['Code']}")
+
+    # The size is one HEAD away; hashing means reading the whole object back, which the worker does
+    size = await asyncio.to_thread(object_size, up.storage_key)
+    if size != up.bytes:
+        await asyncio.to_thread(delete_object, up.storage_key)
+        await db.execute(
+            text("update artifact_upload set status = 'FAILED', error = :error, finished_at = now() where id = :id"),
+            {"id": upload_id, "error": "Uploaded content size does not match the declared file"},
         )
-        art = db.execute(select(Artifact).where(Artifact.id == art_id)).scalar_one()
+        # Keep the FAILED state: the object is gone, so the upload can't be retried
+        await db.commit()
+        raise HTTPException(status_code=400, detail="Uploaded content size does not match the declared file")
 
-    url = presign_get_url(art.storage_key)
-    return {"artifact_id": str(art.id), "url": url, "bytes": art.bytes, "mime": art.mime}
+    await db.execute(text("update artifact_upload set status = 'VERIFYING' where id = :id"), {"id": upload_id})
+    return {"upload_id": upload_id, "status": "VERIFYING", "error": None, "artifact": None}
+
+
+@router.get("/artifacts/uploads/{upload_id}")
+async def get_upload(
+    upload_id: UUID,
+    user_id: UUID = Depends(get_user_id),
+    db: AsyncSession = Depends(db_session),
+):
+    return await _upload_out(db, await _get_upload(db, user_id, upload_id, lock=False))
+
+
+@router.delete("/artifacts/uploads/{upload_id}")
+async def abort_upload(
+    upload_id: UUID,
+    user_id: UUID = Depends(get_user_id),
+    db: AsyncSession = Depends(db_session),
+):
+    up = await _get_upload(db, user_id, upload_id)
+    if up.status in ("VERIFYING", "DONE"):
+        raise HTTPException(status_code=409, detail="Upload already completed")
+    if up.status == "UPLOADING":
+        await asyncio.to_thread(abort_multipart, up.storage_key, up.s3_upload_id)
+    await db.execute(text("delete from artifact_upload where id = :id"), {"id": upload_id})
+    return {"ok": True}
 
 
 @router.get("/artifacts/{artifact_id}/download")
@@ -90,14 +307,15 @@ async def download_artifact(
     artifact_id: UUID,
     ttl: int = 86400,
     user_id: UUID = Depends(get_user_id),
-    db: Session = Depends(db_session),
+    db: AsyncSession = Depends(db_session),
 ):
     # Clamp TTL for safety (5 minutes to 7 days)
     ttl = max(300, min(ttl, 7 * 24 * 3600))
 
-    art = db.execute(select(Artifact).where(Artifact.id == artifact_id)).scalar_one_or_none()
+    art = (await db.execute(select(Artifact).where(Artifact.id == artifact_id))).scalar_one_or_none()
     if not art:
         raise HTTPException(status_code=404, detail="Artifact not found")
 
-    url = presign_get_url(art.storage_key, ttl_seconds=ttl)
-    return {"url": url, "mime": art.mime, "bytes": art.bytes, "expires_in": ttl}
+    # Served from the URL cache while a cached link is still valid for at least ``ttl``
+    url, expires_in = presign_get(art.storage_key, ttl_seconds=ttl)
+    return {"url": url, "mime": art.mime, "bytes": art.bytes, "expires_in": expires_in}
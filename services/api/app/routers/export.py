@@ -1,68 +1,283 @@
-from fastapi import APIRouter, Depends
+import asyncio
+import logging
+import os
+import zipfile
+from datetime import datetime, timezone
+from typing import AsyncIterator, Literal
+from uuid import UUID, uuid4
+
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
 from sqlalchemy import text
-from sqlalchemy.orm import Session
-from uuid import UUID
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from ..deps import get_user_id, db_session
+from ..db.session import get_db_with_rls
+from ..storage.s3 import open_object, presign_get_url
+
+router = APIRouter(prefix="/v1", tags=["export"])
+logger = logging.getLogger(__name__)
+
+# Rows fetched per round trip from the server-side cursor
+FETCH_ROWS = int(os.getenv("EXPORT_FETCH_ROWS", "200"))
+# Bytes buffered before a chunk is handed to the client / file
+CHUNK_BYTES = 256 * 1024
+# Above this much artifact data a ZIP is only built as a job (POST /v1/export/jobs)
+STREAM_MAX_BYTES = int(os.getenv("EXPORT_STREAM_MAX_BYTES", str(512 * 1024 * 1024)))
+# Finished job files (and their rows) are deleted by app.workers.export after this long
+TTL_SECONDS = int(os.getenv("EXPORT_TTL_SECONDS", str(7 * 24 * 3600)))
+
+CONTENT_TYPES = {"json": "application/json", "ndjson": "application/x-ndjson", "zip": "application/zip"}
+
+# One line per memory, built by Postgres so the API only forwards text
+_EXPORT_SQL = text(
+    """
+    select json_build_object(
+      'id', m.id,
+      'title', m.title,
+      'visibility', m.visibility,
+      'created_at', m.created_at,
+      'cores', coalesce((
+        select json_agg(json_build_object(
+          'version', c.version, 'narrative', c.narrative, 'anchors', c.anchors, 'people', c.people,
+          'when', c."when"::text, 'where', c."where", 'locked', c.locked, 'locked_at', c.locked_at
+        ) order by c.version)
+        from memory_core_version c where c.memory_id = m.id
+      ), '[]'),
+      'layers', coalesce((
+        select json_agg(json_build_object(
+          'id', l.id, 'kind', l.kind, 'text_content', l.text_content, 'meta', l.meta,
+          'artifact_id', l.artifact_id, 'author_id', l.author_id, 'created_at', l.created_at
+        ) order by l.created_at)
+        from memory_layer l where l.memory_id = m.id
+      ), '[]'),
+      'artifacts', coalesce((
+        select json_agg(json_build_object(
+          'id', a.id, 'mime', a.mime, 'bytes', a.bytes, 'sha256', a.sha256,
+          'path', 'artifacts/' || a.id || '/' || regexp_replace(a.storage_key, '^.*/', ''),
+          'created_at', a.created_at
+        ) order by a.created_at)
+        from artifact a where a.memory_id = m.id
+      ), '[]')
+    )::text
+    from memory m
+    where m.owner_id = :uid and coalesce(m.status, 'ACTIVE') <> 'DELETED'
+    order by m.created_at, m.id
+    """
+).execution_options(yield_per=FETCH_ROWS)
+
+_ARTIFACTS_SQL = text(
+    """
+    select a.id, a.storage_key, a.created_at
+    from artifact a join memory m on m.id = a.memory_id
+    where m.owner_id = :uid and coalesce(m.status, 'ACTIVE') <> 'DELETED'
+    order by m.created_at, m.id, a.created_at
+    """
+).execution_options(yield_per=FETCH_ROWS)
+
+
+async def export_lines(db: AsyncSession, user_id: UUID) -> AsyncIterator[bytes]:
+    """NDJSON export of ``user_id``'s memories, in chunks of about CHUNK_BYTES."""
+    buf = bytearray()
+    async for (line,) in await db.stream(_EXPORT_SQL, {"uid": user_id}):
+        buf += line.encode()
+        buf += b"\n"
+        if len(buf) >= CHUNK_BYTES:
+            yield bytes(buf)
+            buf.clear()
+    if buf:
+        yield bytes(buf)
+
+
+async def export_json(db: AsyncSession, user_id: UUID) -> AsyncIterator[bytes]:
+    """The original ``{"memories": [...]}`` export body, streamed like the NDJSON."""
+    buf = bytearray(b'{"memories":[')
+    sep = b""
+    async for (line,) in await db.stream(_EXPORT_SQL, {"uid": user_id}):
+        buf += sep
+        buf += line.encode()
+        sep = b","
+        if len(buf) >= CHUNK_BYTES:
+            yield bytes(buf)
+            buf.clear()
+    buf += b"]}"
+    yield bytes(buf)
+
+
+class _Sink:
+    """Write-only file for ZipFile; chunks are collected until drained.
+
+    Having no ``tell``/``seek`` makes ZipFile write data descriptors instead
+    of seeking back, so the archive can be sent as it is produced.
+    """
+
+    def __init__(self):
+        self.chunks: list[bytes] = []
+        self.size = 0
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        self.size += len(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        out = b"".join(self.chunks)
+        self.chunks.clear()
+        self.size = 0
+        return out
+
+
+def _zip_info(path: str, when: datetime, compress_type: int) -> zipfile.ZipInfo:
+    info = zipfile.ZipInfo(path, date_time=when.timetuple()[:6])
+    info.compress_type = compress_type
+    return info
 
-router = APIRouter(prefix="/v1", tags=["export"]) 
+
+async def export_zip(db: AsyncSession, user_id: UUID) -> AsyncIterator[bytes]:
+    """ZIP export: memories.ndjson plus every artifact file, streamed from S3."""
+    sink = _Sink()
+    with zipfile.ZipFile(sink, "w") as zf:
+        now = datetime.now(timezone.utc)
+        with zf.open(_zip_info("memories.ndjson", now, zipfile.ZIP_DEFLATED), "w", force_zip64=True) as f:
+            async for chunk in export_lines(db, user_id):
+                f.write(chunk)
+                if sink.size >= CHUNK_BYTES:
+                    yield sink.drain()
+
+        async for art_id, key, created_at in await db.stream(_ARTIFACTS_SQL, {"uid": user_id}):
+            try:
+                body = await asyncio.to_thread(open_object, key)
+            except Exception as e:
+                # The memory line still lists it; one missing object shouldn't sink the export
+                logger.warning(f"Export for {user_id}: skipping artifact {art_id}: {e}")
+                continue
+            path = f"artifacts/{art_id}/{key.rsplit('/', 1)[-1]}"
+            # Images/video are already compressed
+            with zf.open(_zip_info(path, created_at, zipfile.ZIP_STORED), "w", force_zip64=True) as f:
+                while chunk := await asyncio.to_thread(body.read, CHUNK_BYTES):
+                    f.write(chunk)
+                    if sink.size >= CHUNK_BYTES:
+                        yield sink.drain()
+            body.close()
+    yield sink.drain()
+
+
+def export_stream(db: AsyncSession, user_id: UUID, format: str) -> AsyncIterator[bytes]:
+    if format == "zip":
+        return export_zip(db, user_id)
+    return export_json(db, user_id) if format == "json" else export_lines(db, user_id)
+
+
+def _filename(format: str) -> str:
+    return f"weave-export-{datetime.now(timezone.utc):%Y%m%d}.{format}"
 
 
 @router.get("/export")
-async def export_all(user_id: UUID = Depends(get_user_id), db: Session = Depends(db_session)):
-    # Minimal export: list memories owned by user with core and layers
-    rows = db.execute(
-        text(
-            "select id from memory where owner_id = :uid and coalesce(status,'ACTIVE') <> 'DELETED' order by created_at"
-        ),
-        {"uid": str(user_id)},
-    ).all()
+async def export_all(
+    format: Literal["json", "ndjson", "zip"] = "json",
+    user_id: UUID = Depends(get_user_id),
+    db: AsyncSession = Depends(db_session),
+):
+    """Stream every memory the caller owns: ``{"memories": [...]}`` (the default,
+    as before), one JSON object per line, or a ZIP with artifacts.
 
-    def get_mem(mid):
-        m = db.execute(text("select id, title, visibility, created_at from memory where id = :mid"), {"mid": str(mid)}).one()
-        core = db.execute(
+    Rows come from a server-side cursor and are sent as they arrive, so memory
+    use does not grow with the account. ZIPs with more than
+    EXPORT_STREAM_MAX_BYTES of artifacts must go through /v1/export/jobs.
+    """
+    if format == "zip":
+        artifact_bytes = (await db.execute(
             text(
-                "select version, narrative, anchors, people, \"when\", \"where\", locked, locked_at from memory_core_version where memory_id = :mid order by version"
+                """
+                select coalesce(sum(a.bytes), 0) from artifact a join memory m on m.id = a.memory_id
+                where m.owner_id = :uid and coalesce(m.status, 'ACTIVE') <> 'DELETED'
+                """
             ),
-            {"mid": str(mid)},
-        ).all()
-        layers = db.execute(
+            {"uid": user_id},
+        )).scalar_one()
+        if artifact_bytes > STREAM_MAX_BYTES:
+            raise HTTPException(status_code=413, detail="Export too large to stream; use POST /v1/export/jobs")
+
+    async def body():
+        # The request's session is closed before the response is sent; stream from our own
+        async for stream_db in get_db_with_rls(str(user_id)):
+            async for chunk in export_stream(stream_db, user_id, format):
+                yield chunk
+
+    return StreamingResponse(
+        body(),
+        media_type=CONTENT_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{_filename(format)}"'},
+    )
+
+
+def _job(row, url: str | None = None) -> dict:
+    return {
+        "id": row.id,
+        "format": row.format,
+        "status": row.status,
+        "bytes": row.bytes,
+        "error": row.error,
+        "created_at": row.created_at,
+        "finished_at": row.finished_at,
+        "url": url,
+    }
+
+
+_JOB_COLUMNS = "id, format, status, storage_key, bytes, error, created_at, finished_at"
+
+
+@router.post("/export/jobs", status_code=202)
+async def create_export_job(
+    format: Literal["ndjson", "zip"] = "zip",
+    user_id: UUID = Depends(get_user_id),
+    db: AsyncSession = Depends(db_session),
+):
+    """Queue an export for app.workers.export; poll GET /v1/export/jobs/{id} for the link."""
+    # One open job per user and format: a second click returns the first job
+    row = (await db.execute(
+        text(
+            f"""
+            select {_JOB_COLUMNS} from export_job
+            where user_id = :uid and format = :format and status in ('PENDING', 'RUNNING')
+            order by created_at desc limit 1
+            """
+        ),
+        {"uid": user_id, "format": format},
+    )).first()
+    if not row:
+        row = (await db.execute(
             text(
-                "select id, kind, text_content, meta, artifact_id, author_id, created_at from memory_layer where memory_id = :mid order by created_at"
+                f"""
+                insert into export_job (id, user_id, format) values (:id, :uid, :format)
+                returning {_JOB_COLUMNS}
+                """
             ),
-            {"mid": str(mid)},
-        ).all()
-        return {
-            "id": m[0],
-            "title": m[1],
-            "visibility": m[2],
-            "created_at": m[3],
-            "cores": [
-                {
-                    "version": c[0],
-                    "narrative": c[1],
-                    "anchors": c[2],
-                    "people": c[3],
-                    "when": c[4],
-                    "where": c[5],
-                    "locked": c[6],
-                    "locked_at": c[7],
-                }
-                for c in core
-            ],
-            "layers": [
-                {
-                    "id": l[0],
-                    "kind": l[1],
-                    "text_content": l[2],
-                    "meta": l[3],
-                    "artifact_id": l[4],
-                    "author_id": l[5],
-                    "created_at": l[6],
-                }
-                for l in layers
-            ],
-        }
-
-    return {"memories": [get_mem(r[0]) for r in rows]}
+            {"id": uuid4(), "uid": user_id, "format": format},
+        )).one()
+    return _job(row)
+
 
+@router.get("/export/jobs/{job_id}")
+async def get_export_job(
+    job_id: UUID,
+    ttl: int = 3600,
+    user_id: UUID = Depends(get_user_id),
+    db: AsyncSession = Depends(db_session),
+):
+    ttl = max(300, min(ttl, 7 * 24 * 3600))
+    row = (await db.execute(
+        text(f"select {_JOB_COLUMNS} from export_job where id = :id and user_id = :uid"),
+        {"id": job_id, "uid": user_id},
+    )).first()
+    if not row:
+        raise HTTPException(status_code=404, detail="Export job not found")
+    url = None
+    if row.status == "DONE":
+        # The link shouldn't outlive the file
+        expires_in = (row.finished_at - datetime.now(timezone.utc)).total_seconds() + TTL_SECONDS
+        url = presign_get_url(row.storage_key, ttl_seconds=max(60, min(ttl, int(expires_in))))
+    return _job(row, url)
@@ -1,29 +1,114 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy import text
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from uuid import UUID
 
 from ..deps import get_user_id, db_session
 
-router = APIRouter(prefix="/v1", tags=["graph"]) 
+router = APIRouter(prefix="/v1", tags=["graph"])
+
+MAX_HOPS = 3
+MAX_EDGES = 5000
+
+# Unvisited neighbours of the frontier, strongest connection first
+_NEIGHBOURS_SQL = text(
+    """
+    select nb.other_id, max(nb.strength) as strength
+    from (
+      select e.b_memory_id as other_id, e.strength from memory_edge e where e.a_memory_id = any(:frontier)
+      union all
+      select e.a_memory_id as other_id, e.strength from memory_edge e where e.b_memory_id = any(:frontier)
+    ) nb
+    join memory m on m.id = nb.other_id
+    where coalesce(m.status, 'ACTIVE') <> 'DELETED' and nb.other_id <> all(:visited)
+    group by nb.other_id
+    order by strength desc, nb.other_id
+    limit :remaining
+    """
+)
+
+# Only edges with both endpoints in the payload; the canvas can't draw the rest
+_EDGES_SQL = text(
+    """
+    select a_memory_id, b_memory_id, relation, strength from memory_edge
+    where a_memory_id = any(:ids) and b_memory_id = any(:ids)
+    order by strength desc, created_at desc
+    limit :edge_limit
+    """
+)
+
+
+async def _neighbourhood(db: AsyncSession, seeds: list[UUID], hops: int, limit: int) -> list[UUID]:
+    """Breadth-first walk from ``seeds``, at most ``hops`` deep and ``limit`` nodes in total."""
+    found = set((await db.execute(
+        text("select id from memory where id = any(:ids) and coalesce(status, 'ACTIVE') <> 'DELETED'"),
+        {"ids": seeds},
+    )).scalars().all())
+    # Keep the caller's seed order so the cap drops later seeds first
+    visited = [s for s in dict.fromkeys(seeds) if s in found][:limit]
+    frontier = visited
+    for _ in range(hops):
+        remaining = limit - len(visited)
+        if not frontier or remaining <= 0:
+            break
+        frontier = (await db.execute(
+            _NEIGHBOURS_SQL, {"frontier": frontier, "visited": visited, "remaining": remaining}
+        )).scalars().all()
+        visited = visited + list(frontier)
+    return visited
 
 
 @router.get("/graph")
-async def get_graph(limit: int = 200, user_id: UUID = Depends(get_user_id), db: Session = Depends(db_session)):
+async def get_graph(
+    limit: int = 200,
+    center: list[UUID] = Query(default=[]),
+    hops: int = 2,
+    edge_limit: int = 2000,
+    user_id: UUID = Depends(get_user_id),
+    db: AsyncSession = Depends(db_session),
+):
+    """Graph for the canvas.
+
+    Without ``center`` this is the ``limit`` newest memories. With one or more
+    ``center`` ids it is their ``hops``-hop neighbourhood, capped at ``limit``
+    nodes. Either way edges are restricted to the returned nodes, and nodes
+    carry the caller's cached canvas position (see app.workers.layout).
+    """
     limit = max(10, min(limit, 500))
-    nodes = db.execute(
-        text(
-            "select id, title, visibility, created_at from memory where coalesce(status,'ACTIVE') <> 'DELETED' order by created_at desc limit :limit"
-        ),
-        {"limit": limit},
-    ).all()
-    edges = db.execute(
-        text(
-            "select a_memory_id, b_memory_id, relation from memory_edge order by created_at desc limit 2000"
-        )
-    ).all()
+    hops = max(1, min(hops, MAX_HOPS))
+    edge_limit = max(1, min(edge_limit, MAX_EDGES))
+    if center:
+        ids = await _neighbourhood(db, center, hops, limit)
+        if not ids:
+            raise HTTPException(status_code=404, detail="Memory not found")
+        nodes = (await db.execute(
+            text(
+                """
+                select m.id, m.title, m.visibility, m.created_at, l.x, l.y from memory m
+                left join memory_layout l on l.memory_id = m.id and l.user_id = :uid
+                where m.id = any(:ids)
+                """
+            ),
+            {"ids": ids, "uid": user_id},
+        )).all()
+        order = {mid: i for i, mid in enumerate(ids)}
+        nodes = sorted(nodes, key=lambda r: order[r[0]])
+    else:
+        nodes = (await db.execute(
+            text(
+                """
+                select m.id, m.title, m.visibility, m.created_at, l.x, l.y from memory m
+                left join memory_layout l on l.memory_id = m.id and l.user_id = :uid
+                where coalesce(m.status,'ACTIVE') <> 'DELETED' order by m.created_at desc limit :limit
+                """
+            ),
+            {"limit": limit, "uid": user_id},
+        )).all()
+    edges = (await db.execute(_EDGES_SQL, {"ids": [r[0] for r in nodes], "edge_limit": edge_limit})).all()
     return {
-        "nodes": [{"id": r[0], "title": r[1], "visibility": r[2], "created_at": r[3]} for r in nodes],
-        "edges": [{"a": r[0], "b": r[1], "relation": r[2]} for r in edges],
+        # x/y come from the layout worker; null until the node has been placed
+        "nodes": [
+            {"id": r[0], "title": r[1], "visibility": r[2], "created_at": r[3], "x": r[4], "y": r[5]} for r in nodes
+        ],
+        "edges": [{"a": r[0], "b": r[1], "relation": r[2], "strength": r[3]} for r in edges],
     }
-
@@ -1,10 +1,12 @@
 from fastapi import APIRouter, Depends, Header, HTTPException
 from uuid import UUID, uuid4
+import base64
+import json
 from typing import Optional
 from datetime import datetime
 
-from sqlalchemy import select, insert, update, func, text
-from sqlalchemy.orm import Session
+from sqlalchemy import JSON, select, insert, update, func, text, true, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from ..models import (
     CreateMemoryReq,
@@ -14,13 +16,10 @@ from ..models import (
     AppendLayerReq,
     SetPermissionsReq,
     MemoryDetailResp,
-    CoreOut,
-    LayerOut,
-    ParticipantOut,
-    ArtifactMeta,
 )
 from ..deps import get_user_id, db_session
 from ..db.models_orm import AppUser, Memory, Participant, MemoryLayer, IdempotencyKey, MemoryCoreVersion, Artifact
+from ..storage import s3
 
 router = APIRouter(prefix="/v1/memories", tags=["memories"])
 
@@ -28,49 +27,66 @@ router = APIRouter(prefix="/v1/memories", tags=["memories"])
 @router.get("")
 async def list_memories(
     limit: int = 20,
+    cursor: Optional[str] = None,
     user_id: UUID = Depends(get_user_id),
-    db: Session = Depends(db_session),
+    db: AsyncSession = Depends(db_session),
 ):
-    """List recent memories for the current user"""
+    """List recent memories for the current user, newest first.
+
+    Pages are keyed on (created_at, id); pass the returned ``next_cursor`` back
+    as ``cursor`` to fetch the following page.
+    """
     limit = max(1, min(limit, 100))
 
-    # Get memories where user is a participant
-    memories = db.execute(
-        select(Memory)
+    # Latest core version per memory, resolved in the same statement
+    core = (
+        select(MemoryCoreVersion.narrative, MemoryCoreVersion.locked)
+        .where(MemoryCoreVersion.memory_id == Memory.id)
+        .order_by(MemoryCoreVersion.version.desc())
+        .limit(1)
+        .lateral("core")
+    )
+
+    # Memories where user is a participant
+    stmt = (
+        select(Memory.id, Memory.title, Memory.created_at, core.c.narrative, core.c.locked)
         .join(Participant, Memory.id == Participant.memory_id)
+        .outerjoin(core, true())
         .where(
             Participant.user_id == user_id,
             Memory.status != "DELETED"
         )
-        .order_by(Memory.created_at.desc())
-        .limit(limit)
-    ).scalars().all()
+        .order_by(Memory.created_at.desc(), Memory.id.desc())
+        .limit(limit + 1)
+    )
+    if cursor:
+        after_created_at, after_id = _decode_cursor(cursor)
+        stmt = stmt.where(tuple_(Memory.created_at, Memory.id) < tuple_(after_created_at, after_id))
 
-    result = []
-    for mem in memories:
-        # Get the core if it exists
-        core_version = db.execute(
-            select(MemoryCoreVersion)
-            .where(MemoryCoreVersion.memory_id == mem.id)
-            .order_by(MemoryCoreVersion.version.desc())
-            .limit(1)
-        ).scalar_one_or_none()
+    rows = (await db.execute(stmt)).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = _encode_cursor(rows[-1].created_at, rows[-1].id)
 
+    result = []
+    for r in rows:
         core_data = None
-        if core_version:
+        if r.narrative is not None:
             core_data = {
-                "narrative": core_version.narrative,
-                "locked": core_version.locked,
+                "narrative": r.narrative,
+                "locked": r.locked,
             }
 
         result.append({
-            "id": str(mem.id),
-            "title": mem.title,
-            "created_at": mem.created_at.isoformat() if mem.created_at else None,
+            "id": str(r.id),
+            "title": r.title,
+            "created_at": r.created_at.isoformat() if r.created_at else None,
             "core": core_data,
         })
 
-    return {"memories": result}
+    return {"memories": result, "next_cursor": next_cursor}
 
 
 @router.post("", response_model=MemoryRef)
@@ -78,25 +94,25 @@ async def create_memory(
     req: CreateMemoryReq,
     user_id: UUID = Depends(get_user_id),
     idem_key: Optional[str] = Header(default=None, alias="Idempotency-Key"),
-    db: Session = Depends(db_session),
+    db: AsyncSession = Depends(db_session),
 ):
     # If idempotency key provided, try to short-circuit
     if idem_key:
-        row = db.execute(
+        row = (await db.execute(
             select(IdempotencyKey.resource_id).where(
                 IdempotencyKey.user_id == user_id,
                 IdempotencyKey.endpoint == "/v1/memories",
                 IdempotencyKey.key == idem_key,
             )
-        ).one_or_none()
+        )).one_or_none()
         if row and row[0] is not None:
-            mem = db.execute(select(Memory).where(Memory.id == row[0])).scalar_one_or_none()
+            mem = (await db.execute(select(Memory).where(Memory.id == row[0]))).scalar_one_or_none()
             if mem:
                 return MemoryRef(id=mem.id, title=mem.title, visibility=req.visibility, created_at=mem.created_at)
 
         # Reserve the key (no resource yet)
         try:
-            db.execute(
+            await db.execute(
                 insert(IdempotencyKey).values(
                     user_id=user_id,
                     endpoint="/v1/memories",
@@ -108,13 +124,13 @@ async def create_memory(
             pass
 
     # Ensure user exists (dev convenience)
-    user = db.execute(select(AppUser).where(AppUser.id == user_id)).scalar_one_or_none()
+    user = (await db.execute(select(AppUser).where(AppUser.id == user_id))).scalar_one_or_none()
     if not user:
         handle = f"user-{str(user_id)[:8]}"
-        db.execute(insert(AppUser).values(id=user_id, handle=handle))
+        await db.execute(insert(AppUser).values(id=user_id, handle=handle))
 
     mem_id = uuid4()
-    db.execute(
+    await db.execute(
         insert(Memory).values(
             id=mem_id,
             owner_id=user_id,
@@ -123,13 +139,18 @@ async def create_memory(
         )
     )
     # Add owner as participant for unified permission checks
-    db.execute(
+    await db.execute(
         insert(Participant).values(memory_id=mem_id, user_id=user_id, role="OWNER")
     )
+    # Place the new card on the owner's canvas
+    await db.execute(
+        text("insert into layout_event (user_id, memory_id) values (:uid, :mid)"),
+        {"uid": str(user_id), "mid": str(mem_id)},
+    )
 
     # Optional seed layer
     if req.seed_text:
-        db.execute(
+        await db.execute(
             insert(MemoryLayer).values(
                 id=uuid4(),
                 memory_id=mem_id,
@@ -139,12 +160,12 @@ async def create_memory(
             )
         )
         # Enqueue indexing for seed text
-        db.execute(text("insert into memory_event(memory_id, kind) values (:mid, 'INDEX_MEMORY')"), {"mid": str(mem_id)})
+        await db.execute(text("insert into memory_event(memory_id, kind) values (:mid, 'INDEX_MEMORY')"), {"mid": str(mem_id)})
 
     # If we reserved an idempotency key, attach resource_id
     if idem_key:
         try:
-            db.execute(
+            await db.execute(
                 update(IdempotencyKey)
                 .where(
                     IdempotencyKey.user_id == user_id,
@@ -157,153 +178,128 @@ async def create_memory(
             pass
 
     # Fetch created_at for response
-    mem = db.execute(select(Memory).where(Memory.id == mem_id)).scalar_one()
+    mem = (await db.execute(select(Memory).where(Memory.id == mem_id))).scalar_one()
     return MemoryRef(id=mem.id, title=mem.title, visibility=req.visibility, created_at=mem.created_at)
 
 
+_MEMORY_DETAIL_SQL = text(
+    """
+    select m.id, m.title, m.visibility, m.created_at, m.status,
+           -- Core: locked at current_core_version if set; else the draft
+           (
+             select json_build_object(
+                      'version', c.version,
+                      'narrative', c.narrative,
+                      'anchors', c.anchors,
+                      'people', c.people,
+                      'when_start', lower(c."when"),
+                      'when_end', upper(c."when"),
+                      'where', c."where",
+                      'locked', c.locked,
+                      'locked_at', c.locked_at
+                    )
+             from memory_core_version c
+             where c.memory_id = m.id
+               and case when m.current_core_version is not null
+                        then c.version = m.current_core_version and c.locked
+                        else not c.locked
+                   end
+             limit 1
+           ) as core,
+           coalesce((
+             select json_agg(
+                      json_build_object(
+                        'id', l.id,
+                        'kind', l.kind,
+                        'text_content', l.text_content,
+                        'artifact_id', l.artifact_id,
+                        'artifact', case when a.id is null then null
+                                         else json_build_object('id', a.id, 'mime', a.mime, 'bytes', a.bytes, 'storage_key', a.storage_key)
+                                    end,
+                        'meta', l.meta,
+                        'author_id', l.author_id,
+                        'created_at', l.created_at
+                      )
+                      order by l.created_at
+                    )
+             from memory_layer l
+             left join artifact a on a.id = l.artifact_id
+             where l.memory_id = m.id
+           ), '[]'::json) as layers,
+           coalesce((
+             select json_agg(
+                      json_build_object(
+                        'user_id', p.user_id,
+                        'role', p.role,
+                        'handle', u.handle,
+                        'display_name', u.display_name
+                      )
+                      order by p.joined_at
+                    )
+             from participant p
+             join app_user u on u.id = p.user_id
+             where p.memory_id = m.id
+           ), '[]'::json) as participants,
+           coalesce((
+             select json_object_agg(ec.relation, ec.c)
+             from (
+               select relation, count(*) as c
+               from memory_edge
+               where a_memory_id = m.id or b_memory_id = m.id
+               group by relation
+             ) ec
+           ), '{}'::json) as edge_counts,
+           coalesce((
+             select json_agg(json_build_object('memory_id', cx.other_id, 'relation', cx.relation))
+             from (
+               select case when e.a_memory_id = m.id then e.b_memory_id else e.a_memory_id end as other_id,
+                      e.relation
+               from memory_edge e
+               where e.a_memory_id = m.id or e.b_memory_id = m.id
+               order by e.created_at desc
+               limit 12
+             ) cx
+           ), '[]'::json) as connections
+    from memory m
+    where m.id = :mid
+    """
+).columns(core=JSON, layers=JSON, participants=JSON, edge_counts=JSON, connections=JSON)
+
+
+def _with_artifact_urls(layers: list[dict]) -> list[dict]:
+    # Signed URLs come from the presign cache, so re-rendering a media-heavy memory signs nothing
+    for layer in layers:
+        art = layer.get("artifact")
+        if art:
+            key = art.pop("storage_key")
+            art["url"] = s3.presign_get_url(key) if s3.AWS_S3_BUCKET else None
+    return layers
+
+
 @router.get("/{mid}", response_model=MemoryDetailResp)
 async def get_memory(
     mid: UUID,
     user_id: UUID = Depends(get_user_id),
-    db: Session = Depends(db_session),
+    db: AsyncSession = Depends(db_session),
 ):
-    mem = db.execute(select(Memory).where(Memory.id == mid)).scalar_one_or_none()
-    if not mem:
+    # Memory, core, layers, participants and edge summary in one round trip
+    row = (await db.execute(_MEMORY_DETAIL_SQL, {"mid": mid})).one_or_none()
+    if not row:
         raise HTTPException(status_code=404, detail="Memory not found")
-    if getattr(mem, 'status', 'ACTIVE') == 'DELETED':
+    if row.status == 'DELETED':
         raise HTTPException(status_code=410, detail="Memory deleted")
 
-    # Resolve core: prefer locked at current_core_version; else draft
-    core = None
-    if mem.current_core_version is not None:
-        core_row = db.execute(
-            select(MemoryCoreVersion).where(
-                MemoryCoreVersion.memory_id == mid,
-                MemoryCoreVersion.version == mem.current_core_version,
-                MemoryCoreVersion.locked.is_(True),
-            )
-        ).scalar_one_or_none()
-    else:
-        core_row = db.execute(
-            select(MemoryCoreVersion).where(
-                MemoryCoreVersion.memory_id == mid,
-                MemoryCoreVersion.locked.is_(False),
-            )
-        ).scalar_one_or_none()
-
-    if core_row:
-        when_start = getattr(core_row.when, 'lower', None)() if getattr(core_row, 'when', None) else None
-        when_end = getattr(core_row.when, 'upper', None)() if getattr(core_row, 'when', None) else None
-        core = CoreOut(
-            version=core_row.version,
-            narrative=core_row.narrative,
-            anchors=list(core_row.anchors or []),
-            people=list(core_row.people or []),
-            when_start=when_start,
-            when_end=when_end,
-            where=core_row.where,
-            locked=bool(core_row.locked),
-            locked_at=core_row.locked_at,
-        )
-
-    # Layers (join artifact info when present)
-    layers_rows = db.execute(
-        select(
-            MemoryLayer.id,
-            MemoryLayer.kind,
-            MemoryLayer.text_content,
-            MemoryLayer.artifact_id,
-            MemoryLayer.meta,
-            MemoryLayer.author_id,
-            MemoryLayer.created_at,
-            Artifact.id,
-            Artifact.mime,
-            Artifact.bytes,
-        )
-        .select_from(MemoryLayer)
-        .join(Memory, Memory.id == MemoryLayer.memory_id)
-        .outerjoin(Artifact, Artifact.id == MemoryLayer.artifact_id)
-        .where(MemoryLayer.memory_id == mid)
-        .order_by(MemoryLayer.created_at.asc())
-    ).all()
-
-    layers: list[LayerOut] = []
-    for r in layers_rows:
-        art = None
-        if r[7]:  # Artifact.id present
-            art = ArtifactMeta(id=r[7], mime=r[8], bytes=r[9])
-        layers.append(
-            LayerOut(
-                id=r[0],
-                kind=r[1],
-                text_content=r[2],
-                artifact_id=r[3],
-                artifact=art,
-                meta=r[4] or {},
-                author_id=r[5],
-                created_at=r[6],
-            )
-        )
-
-    # Participants
-    parts_rows = db.execute(
-        select(
-            Participant.user_id,
-            Participant.role,
-            AppUser.handle,
-            AppUser.display_name,
-        )
-        .select_from(Participant)
-        .join(AppUser, AppUser.id == Participant.user_id)
-        .where(Participant.memory_id == mid)
-    ).all()
-    participants = [
-        ParticipantOut(user_id=r[0], role=r[1], handle=r[2], display_name=r[3]) for r in parts_rows
-    ]
-
-    # Edges summary (counts by relation) and small connections list
-    from sqlalchemy import or_
-    counts_rows = db.execute(
-        select(func.coalesce(func.count(), 0),).select_from(Memory)  # dummy to ensure type
-    )
-    # Proper counts
-    edge_counts = db.execute(
-        text(
-            """
-            select relation, count(*) as c
-            from memory_edge
-            where a_memory_id = :mid or b_memory_id = :mid
-            group by relation
-            """
-        ),
-        {"mid": str(mid)},
-    ).all()
-    counts = {row[0]: row[1] for row in edge_counts}
-
-    connections_rows = db.execute(
-        text(
-            """
-            select case when a_memory_id = :mid then b_memory_id else a_memory_id end as other_id,
-                   relation
-            from memory_edge
-            where a_memory_id = :mid or b_memory_id = :mid
-            order by created_at desc
-            limit 12
-            """
-        ),
-        {"mid": str(mid)},
-    ).all()
-    connections = [{"memory_id": r[0], "relation": r[1]} for r in connections_rows]
-
-    return MemoryDetailResp(
-        id=mem.id,
-        title=mem.title,
-        visibility=mem.visibility,  # type: ignore
-        created_at=mem.created_at,
-        core=core,
-        layers=layers,
-        participants=participants,
-        edges_summary={"counts": counts, "connections": connections},
+    return MemoryDetailResp.model_validate(
+        {
+            "id": row.id,
+            "title": row.title,
+            "visibility": row.visibility,
+            "created_at": row.created_at,
+            "core": row.core,
+            "layers": _with_artifact_urls(row.layers),
+            "participants": row.participants,
+            "edges_summary": {"counts": row.edge_counts, "connections": row.connections},
+        }
     )
 
 
@@ -312,18 +308,18 @@ async def memory_suggestions(
     mid: UUID,
     limit: int = 5,
     user_id: UUID = Depends(get_user_id),
-    db: Session = Depends(db_session),
+    db: AsyncSession = Depends(db_session),
 ):
     # Use vector similarity to suggest related memories; exclude self
     limit = max(1, min(limit, 10))
     # Ensure memory exists
-    mem = db.execute(select(Memory).where(Memory.id == mid)).scalar_one_or_none()
+    mem = (await db.execute(select(Memory).where(Memory.id == mid))).scalar_one_or_none()
     if not mem:
         raise HTTPException(status_code=404, detail="Memory not found")
     if getattr(mem, 'status', 'ACTIVE') == 'DELETED':
         raise HTTPException(status_code=410, detail="Memory deleted")
 
-    rows = db.execute(
+    rows = (await db.execute(
         text(
             """
             select m.id, m.title, m.visibility, m.created_at,
@@ -336,7 +332,7 @@ async def memory_suggestions(
             """
         ),
         {"mid": str(mid), "limit": limit},
-    ).all()
+    )).all()
     return {
         "memory_id": str(mid),
         "suggestions": [
@@ -351,28 +347,28 @@ async def set_core(
     mid: UUID,
     req: SetCoreReq,
     user_id: UUID = Depends(get_user_id),
-    db: Session = Depends(db_session),
+    db: AsyncSession = Depends(db_session),
 ):
     # Ensure memory exists (RLS will restrict visibility). We still 404 if not visible/existent.
-    mem = db.execute(select(Memory).where(Memory.id == mid)).scalar_one_or_none()
+    mem = (await db.execute(select(Memory).where(Memory.id == mid))).scalar_one_or_none()
     if not mem:
         raise HTTPException(status_code=404, detail="Memory not found")
     if getattr(mem, 'status', 'ACTIVE') == 'DELETED':
         raise HTTPException(status_code=410, detail="Memory deleted")
 
     # Check for existing draft
-    draft = db.execute(
+    draft = (await db.execute(
         select(MemoryCoreVersion)
         .where(MemoryCoreVersion.memory_id == mid, MemoryCoreVersion.locked.is_(False))
         .limit(1)
-    ).scalar_one_or_none()
+    )).scalar_one_or_none()
 
     # Latest locked version number
-    latest_locked = db.execute(
+    latest_locked = (await db.execute(
         select(func.max(MemoryCoreVersion.version)).where(
             MemoryCoreVersion.memory_id == mid, MemoryCoreVersion.locked.is_(True)
         )
-    ).scalar_one()
+    )).scalar_one()
     base_version = latest_locked or 0
 
     # Build tstzrange if provided
@@ -382,7 +378,7 @@ async def set_core(
 
     if draft:
         # Update existing draft
-        db.execute(
+        await db.execute(
             update(MemoryCoreVersion)
             .where(MemoryCoreVersion.id == draft.id)
             .values(
@@ -401,7 +397,7 @@ async def set_core(
             raise HTTPException(status_code=409, detail="Core is locked. Pass lift=true to start a new draft version.")
 
         version = base_version + 1
-        db.execute(
+        await db.execute(
             insert(MemoryCoreVersion).values(
                 memory_id=mid,
                 version=version,
@@ -423,42 +419,42 @@ async def set_core(
 async def lock_core(
     mid: UUID,
     user_id: UUID = Depends(get_user_id),
-    db: Session = Depends(db_session),
+    db: AsyncSession = Depends(db_session),
 ):
     # Ensure memory exists and is visible (RLS enforced). If not, 404.
-    mem = db.execute(select(Memory).where(Memory.id == mid)).scalar_one_or_none()
+    mem = (await db.execute(select(Memory).where(Memory.id == mid))).scalar_one_or_none()
     if not mem:
         raise HTTPException(status_code=404, detail="Memory not found")
 
     # Try to lock existing draft
-    draft = db.execute(
+    draft = (await db.execute(
         select(MemoryCoreVersion)
         .where(MemoryCoreVersion.memory_id == mid, MemoryCoreVersion.locked.is_(False))
         .with_for_update()
-    ).scalar_one_or_none()
+    )).scalar_one_or_none()
 
     if draft:
         locked_at = datetime.utcnow()
         # Set locked, update memory pointer
-        db.execute(
+        await db.execute(
             update(MemoryCoreVersion)
             .where(MemoryCoreVersion.id == draft.id)
             .values(locked=True, locked_at=locked_at)
         )
-        db.execute(
+        await db.execute(
             update(Memory).where(Memory.id == mid).values(current_core_version=draft.version)
         )
         # Enqueue indexing
-        db.execute(text("insert into memory_event(memory_id, kind) values (:mid, 'INDEX_MEMORY')"), {"mid": str(mid)})
+        await db.execute(text("insert into memory_event(memory_id, kind) values (:mid, 'INDEX_MEMORY')"), {"mid": str(mid)})
         return LockCoreResp(memory_id=mid, version=draft.version, locked_at=locked_at)
 
     # No draft; maybe it's already locked — return last locked to make this idempotent
-    last_locked = db.execute(
+    last_locked = (await db.execute(
         select(MemoryCoreVersion)
         .where(MemoryCoreVersion.memory_id == mid, MemoryCoreVersion.locked.is_(True))
         .order_by(MemoryCoreVersion.version.desc())
         .limit(1)
-    ).scalar_one_or_none()
+    )).scalar_one_or_none()
     if last_locked:
         return LockCoreResp(memory_id=mid, version=last_locked.version, locked_at=last_locked.locked_at or last_locked.created_at)
 
@@ -472,38 +468,38 @@ async def append_layer(
     req: AppendLayerReq,
     user_id: UUID = Depends(get_user_id),
     idem_key: Optional[str] = Header(default=None, alias="Idempotency-Key"),
-    db: Session = Depends(db_session),
+    db: AsyncSession = Depends(db_session),
 ):
     # Validate memory exists and caller has at least viewer access (RLS select). 404 if not visible.
-    mem = db.execute(select(Memory).where(Memory.id == mid)).scalar_one_or_none()
+    mem = (await db.execute(select(Memory).where(Memory.id == mid))).scalar_one_or_none()
     if not mem:
         raise HTTPException(status_code=404, detail="Memory not found")
 
     # Server-side permission: owner or contributor may append
     is_owner = mem.owner_id == user_id
-    is_contrib = db.execute(
+    is_contrib = (await db.execute(
         select(Participant).where(
             Participant.memory_id == mid,
             Participant.user_id == user_id,
             Participant.role.in_(["OWNER", "CONTRIBUTOR"]),
         )
-    ).first() is not None
+    )).first() is not None
     if not (is_owner or is_contrib):
         raise HTTPException(status_code=403, detail="Not allowed to append layers")
 
     endpoint = f"/v1/memories/{mid}/layers"
     if idem_key:
-        row = db.execute(
+        row = (await db.execute(
             select(IdempotencyKey.resource_id).where(
                 IdempotencyKey.user_id == user_id,
                 IdempotencyKey.endpoint == endpoint,
                 IdempotencyKey.key == idem_key,
             )
-        ).one_or_none()
+        )).one_or_none()
         if row and row[0] is not None:
             return {"layer_id": row[0], "visibility": mem.visibility}
         try:
-            db.execute(
+            await db.execute(
                 insert(IdempotencyKey).values(
                     user_id=user_id,
                     endpoint=endpoint,
@@ -520,7 +516,7 @@ async def append_layer(
     if kind in ("TEXT", "REFLECTION"):
         if not (req.text_content and req.text_content.strip()):
             raise HTTPException(status_code=400, detail="text_content required for TEXT/REFLECTION")
-        db.execute(
+        await db.execute(
             insert(MemoryLayer).values(
                 id=layer_id,
                 memory_id=mid,
@@ -531,16 +527,16 @@ async def append_layer(
             )
         )
         # Enqueue indexing on text content
-        db.execute(text("insert into memory_event(memory_id, kind) values (:mid, 'INDEX_MEMORY')"), {"mid": str(mid)})
+        await db.execute(text("insert into memory_event(memory_id, kind) values (:mid, 'INDEX_MEMORY')"), {"mid": str(mid)})
     elif kind in ("IMAGE", "VIDEO", "AUDIO"):
         if not req.artifact_id:
             raise HTTPException(status_code=400, detail="artifact_id required for media kinds")
-        art = db.execute(
+        art = (await db.execute(
             select(Artifact).where(Artifact.id == req.artifact_id, Artifact.memory_id == mid)
-        ).scalar_one_or_none()
+        )).scalar_one_or_none()
         if not art:
             raise HTTPException(status_code=400, detail="artifact not found for this memory")
-        db.execute(
+        await db.execute(
             insert(MemoryLayer).values(
                 id=layer_id,
                 memory_id=mid,
@@ -551,12 +547,12 @@ async def append_layer(
             )
         )
         # Enqueue indexing (for captions/metadata in non-text layers)
-        db.execute(text("insert into memory_event(memory_id, kind) values (:mid, 'INDEX_MEMORY')"), {"mid": str(mid)})
+        await db.execute(text("insert into memory_event(memory_id, kind) values (:mid, 'INDEX_MEMORY')"), {"mid": str(mid)})
     elif kind == "LINK":
         url = (req.meta or {}).get("url") if isinstance(req.meta, dict) else None
         if not url or not isinstance(url, str):
             raise HTTPException(status_code=400, detail="meta.url required for LINK kind")
-        db.execute(
+        await db.execute(
             insert(MemoryLayer).values(
                 id=layer_id,
                 memory_id=mid,
@@ -566,13 +562,13 @@ async def append_layer(
             )
         )
         # Enqueue indexing (for link metadata)
-        db.execute(text("insert into memory_event(memory_id, kind) values (:mid, 'INDEX_MEMORY')"), {"mid": str(mid)})
+        await db.execute(text("insert into memory_event(memory_id, kind) values (:mid, 'INDEX_MEMORY')"), {"mid": str(mid)})
     else:
         raise HTTPException(status_code=400, detail="unsupported layer kind")
 
     if idem_key:
         try:
-            db.execute(
+            await db.execute(
                 update(IdempotencyKey)
                 .where(
                     IdempotencyKey.user_id == user_id,
@@ -592,31 +588,35 @@ async def set_permissions(
     mid: UUID,
     req: SetPermissionsReq,
     user_id: UUID = Depends(get_user_id),
-    db: Session = Depends(db_session),
+    db: AsyncSession = Depends(db_session),
 ):
     # Owner-only
-    mem = db.execute(select(Memory).where(Memory.id == mid)).scalar_one_or_none()
+    mem = (await db.execute(select(Memory).where(Memory.id == mid))).scalar_one_or_none()
     if not mem:
         raise HTTPException(status_code=404, detail="Memory not found")
     if mem.owner_id != user_id:
         raise HTTPException(status_code=403, detail="Only owner can change permissions")
 
     # Update visibility
-    db.execute(update(Memory).where(Memory.id == mid).values(visibility=req.visibility))
+    await db.execute(update(Memory).where(Memory.id == mid).values(visibility=req.visibility))
 
-    # Upsert participants (ignore OWNER changes)
+    # Upsert participants (ignore OWNER changes); each one's canvas gets the memory
     for p in req.participants or []:
         try:
             uid = UUID(p.get("user_id")) if isinstance(p.get("user_id"), str) else p.get("user_id")
             role = p.get("role")
             if not uid or role not in ("CONTRIBUTOR", "VIEWER"):
                 continue
-            db.execute(
+            await db.execute(
                 text(
                     """
-                    insert into participant (memory_id, user_id, role)
-                    values (:mid, :uid, :role)
-                    on conflict (memory_id, user_id) do update set role = excluded.role
+                    with p as (
+                      insert into participant (memory_id, user_id, role)
+                      values (:mid, :uid, :role)
+                      on conflict (memory_id, user_id) do update set role = excluded.role
+                      returning memory_id, user_id
+                    )
+                    insert into layout_event (user_id, memory_id) select user_id, memory_id from p
                     """
                 ),
                 {"mid": str(mid), "uid": str(uid), "role": role},
@@ -628,17 +628,17 @@ async def set_permissions(
     if req.visibility == "PUBLIC":
         # Ensure slug exists
         slug = _make_slug(mem.title or "memory", str(mid))
-        db.execute(
+        await db.execute(
             text(
                 "insert into public_memory_slug (memory_id, slug) values (:mid, :slug) on conflict (memory_id) do nothing"
             ),
             {"mid": str(mid), "slug": slug},
         )
     else:
-        db.execute(text("delete from public_memory_slug where memory_id = :mid"), {"mid": str(mid)})
+        await db.execute(text("delete from public_memory_slug where memory_id = :mid"), {"mid": str(mid)})
 
     # Count participants
-    count = db.execute(text("select count(*) from participant where memory_id = :mid"), {"mid": str(mid)}).scalar_one()
+    count = (await db.execute(text("select count(*) from participant where memory_id = :mid"), {"mid": str(mid)})).scalar_one()
     return {"updated_at": datetime.utcnow(), "participant_count": int(count)}
 
 
@@ -646,15 +646,15 @@ async def set_permissions(
 async def delete_memory(
     mid: UUID,
     user_id: UUID = Depends(get_user_id),
-    db: Session = Depends(db_session),
+    db: AsyncSession = Depends(db_session),
 ):
-    mem = db.execute(select(Memory).where(Memory.id == mid)).scalar_one_or_none()
+    mem = (await db.execute(select(Memory).where(Memory.id == mid))).scalar_one_or_none()
     if not mem:
         raise HTTPException(status_code=404, detail="Memory not found")
     if mem.owner_id != user_id:
         raise HTTPException(status_code=403, detail="Only owner can delete memory")
-    db.execute(update(Memory).where(Memory.id == mid).values(status='DELETED'))
-    db.execute(text("delete from public_memory_slug where memory_id = :mid"), {"mid": str(mid)})
+    await db.execute(update(Memory).where(Memory.id == mid).values(status='DELETED'))
+    await db.execute(text("delete from public_memory_slug where memory_id = :mid"), {"mid": str(mid)})
     return {"status": "deleted"}
 
 
@@ -666,3 +666,17 @@ def _make_slug(title: str, mid: str) -> str:
     if not s:
         s = "memory"
     return f"{s}-{short}"
+
+
+def _encode_cursor(created_at: datetime, mid: UUID) -> str:
+    raw = json.dumps([created_at.isoformat(), str(mid)]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> tuple[datetime, UUID]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, mid = json.loads(raw)
+        return datetime.fromisoformat(created_at), UUID(mid)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
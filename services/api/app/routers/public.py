@@ -1,6 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy import select, text
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from uuid import UUID
 
 from ..deps import get_user_id, db_session
@@ -12,8 +12,8 @@ router = APIRouter(prefix="/v1/public", tags=["public"])
 
 
 @router.get("/{slug}", response_model=MemoryDetailResp)
-async def get_public_by_slug(slug: str, user_id: UUID = Depends(get_user_id), db: Session = Depends(db_session)):
-    row = db.execute(text("select memory_id from public_memory_slug where slug = :slug"), {"slug": slug}).one_or_none()
+async def get_public_by_slug(slug: str, user_id: UUID = Depends(get_user_id), db: AsyncSession = Depends(db_session)):
+    row = (await db.execute(text("select memory_id from public_memory_slug where slug = :slug"), {"slug": slug})).one_or_none()
     if not row:
         raise HTTPException(status_code=404, detail="Not found")
     mid = row[0]
@@ -1,41 +1,71 @@
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from uuid import UUID
+from typing import Literal
+import logging
 import os
 
+import numpy as np
 from sqlalchemy import text
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from ..models import SearchResp, SearchRespItem, MemoryRef
 from ..deps import get_user_id, db_session
+from ..embeddings.provider import EmbeddingError, get_query_provider
+from ..embeddings.cache import cache_key, normalize_query, query_cache, shared_get, shared_put
 
 router = APIRouter(prefix="/v1/search", tags=["search"])
+logger = logging.getLogger("weave.api")
+
+# Candidates pulled from each index before reranking
+CANDIDATES = int(os.getenv("SEARCH_CANDIDATES", "200"))
+# Vector index built by migration 0010: "ivfflat" or "hnsw"
+VECTOR_INDEX = os.getenv("VECTOR_INDEX", "ivfflat")
+
+# Quality tiers trade ANN recall for latency: ivfflat.probes (of lists = 100),
+# hnsw.ef_search, and how many candidates each index contributes to the rerank
+QUALITY_TIERS = {
+    "fast": {"probes": 1, "ef_search": 40, "candidates": max(1, CANDIDATES // 4)},
+    "balanced": {"probes": 10, "ef_search": 100, "candidates": CANDIDATES},
+    "accurate": {"probes": 40, "ef_search": 200, "candidates": CANDIDATES * 2},
+}
 
 
 def _embed(text_in: str) -> list[float]:
-    dim = int(os.getenv("EMBEDDING_DIM", "1536"))
-    model = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
-    api_key = os.getenv("OPENAI_API_KEY")
-    if not api_key:
-        return [0.0] * dim
+    provider = get_query_provider()
     try:
-        from openai import OpenAI
-
-        client = OpenAI(api_key=api_key)
-        resp = client.embeddings.create(model=model, input=text_in)
-        vec = resp.data[0].embedding
-        if len(vec) != dim:
-            if len(vec) < dim:
-                vec = vec + [0.0] * (dim - len(vec))
-            else:
-                vec = vec[:dim]
+        return provider.embed(text_in)
+    except EmbeddingError as e:
+        # Degrade to lexical-only ranking rather than failing the search
+        logger.warning("Query embedding unavailable: %s", e)
+        return [0.0] * provider.dim
+
+
+async def _query_embedding(db: AsyncSession, q: str) -> np.ndarray:
+    """Embed a search query, consulting the local then shared cache first."""
+    provider = get_query_provider()
+    model, dim = provider.model, provider.dim
+    normalized = normalize_query(q)
+    key = cache_key(normalized, model, dim)
+
+    vec = query_cache.get(key)
+    if vec is not None:
+        return vec
+    vec = await shared_get(db, key)
+    if vec is not None:
+        query_cache.shared_hits += 1
+        query_cache.put(key, vec)
         return vec
-    except Exception:
-        return [0.0] * dim
-
 
-def _vec_literal(v: list[float]) -> str:
-    # pgvector literal: [x1, x2, ...]
-    return "[" + ",".join(f"{x:.6f}" for x in v) + "]"
+    query_cache.misses += 1
+    # OpenAI client is blocking; keep it off the event loop. float32 is what
+    # pgvector stores and binds in binary without a per-request conversion.
+    vec = np.asarray(await run_in_threadpool(_embed, normalized), dtype=np.float32)
+    # Zero vectors are the no-key/error fallback; don't pin them in the cache
+    if vec.any():
+        query_cache.put(key, vec)
+        await shared_put(db, key, model, dim, vec)
+    return vec
 
 
 def _build_reasons(query: str, title: str, vec_sim: float, text_rank: float) -> list[str]:
@@ -88,66 +118,113 @@ def _build_reasons(query: str, title: str, vec_sim: float, text_rank: float) ->
     return reasons
 
 
+# Stage 1 pulls top-K candidates from each index: the ivfflat/hnsw index via
+# ORDER BY embedding <=> q, and the GIN index via tsv @@ q. The query values are
+# read through scalar subqueries (init-plan params) so the planner can use the
+# indexes. Stage 2 scores and reranks only that candidate set.
+_SEARCH_SQL = text(
+    """
+    with q as (
+      select websearch_to_tsquery('english', :q) as qtsv,
+             (:qemb)::vector(1536) as qemb
+    ),
+    ann as (
+      select m.id
+      from memory m
+      where m.embedding is not null
+        and coalesce(m.status, 'ACTIVE') <> 'DELETED'
+      order by m.embedding <=> (select qemb from q)
+      limit :ann_k
+    ),
+    lex as (
+      select m.id
+      from memory m
+      where m.tsv @@ (select qtsv from q)
+        and coalesce(m.status, 'ACTIVE') <> 'DELETED'
+      order by ts_rank_cd(m.tsv, (select qtsv from q)) desc
+      limit :lex_k
+    ),
+    candidates as (
+      select id from ann
+      union
+      select id from lex
+    ),
+    base_scores as (
+      select m.id, m.title, m.visibility, m.created_at,
+             (1 - coalesce(m.embedding <=> q.qemb, 1)) as vec_sim,
+             coalesce(ts_rank_cd(m.tsv, q.qtsv), 0) as text_rank
+      from candidates c
+      join memory m on m.id = c.id
+      cross join q
+    ),
+    -- Neighbours of candidates only. Two equality joins instead of an OR so the
+    -- (a_memory_id, ...) unique index and idx_memory_edge_b are both usable.
+    neighbours as (
+      select bs.id, e.b_memory_id as other_id, e.strength
+      from base_scores bs
+      join memory_edge e on e.a_memory_id = bs.id
+      union all
+      select bs.id, e.a_memory_id as other_id, e.strength
+      from base_scores bs
+      join memory_edge e on e.b_memory_id = bs.id
+    ),
+    edge_boost as (
+      select nb.id,
+             avg((1 - coalesce(n.embedding <=> q.qemb, 1)) * nb.strength) as boost
+      from neighbours nb
+      join memory n on n.id = nb.other_id
+      cross join q
+      where coalesce(n.status, 'ACTIVE') <> 'DELETED'
+      group by nb.id
+    )
+    select bs.id, bs.title, bs.visibility, bs.created_at,
+           (
+             0.55 * bs.vec_sim +
+             0.35 * bs.text_rank +
+             0.10 * coalesce(eb.boost, 0)
+           ) as score,
+           bs.vec_sim,
+           bs.text_rank,
+           ts_headline('english', coalesce(bs.title, ''), q.qtsv, 'MinWords=3, MaxWords=10') as title_hl
+    from base_scores bs
+    left join edge_boost eb on eb.id = bs.id
+    cross join q
+    order by score desc
+    limit :limit
+    """
+)
+
+
+async def _set_ann_quality(db: AsyncSession, tier: dict, ann_k: int) -> None:
+    """Tune the vector index scan for this transaction only (SET LOCAL semantics)."""
+    if VECTOR_INDEX == "hnsw":
+        # An HNSW scan returns at most ef_search rows (server max 1000)
+        name, value = "hnsw.ef_search", min(1000, max(tier["ef_search"], ann_k))
+    else:
+        name, value = "ivfflat.probes", tier["probes"]
+    await db.execute(text("select set_config(:name, :value, true)"), {"name": name, "value": str(value)})
+
+
 @router.get("/associative", response_model=SearchResp)
 async def search_associative(
     q: str,
     limit: int = 20,
+    quality: Literal["fast", "balanced", "accurate"] = "balanced",
     user_id: UUID = Depends(get_user_id),
-    db: Session = Depends(db_session),
+    db: AsyncSession = Depends(db_session),
 ):
     limit = max(1, min(limit, 50))
-    emb = _embed(q)
-    veclit = _vec_literal(emb)
-    rows = db.execute(
-        text(
-            """
-            with q as (
-              select websearch_to_tsquery('english', :q) as qtsv,
-                     (:qemb)::vector(1536) as qemb
-            ),
-            base_scores as (
-              select m.id,
-                     (1 - coalesce(m.embedding <=> q.qemb, 1)) as vec_sim,
-                     coalesce(ts_rank_cd(m.tsv, q.qtsv), 0) as text_rank
-              from memory m
-              cross join q
-              where coalesce(m.status, 'ACTIVE') <> 'DELETED'
-            ),
-            edge_boost as (
-              select m.id,
-                     coalesce(
-                       (select avg(bs.vec_sim * e.strength)
-                        from memory_edge e
-                        join base_scores bs on (
-                          (e.a_memory_id = m.id and bs.id = e.b_memory_id) or
-                          (e.b_memory_id = m.id and bs.id = e.a_memory_id)
-                        )
-                        where (e.a_memory_id = m.id or e.b_memory_id = m.id)
-                       ), 0
-                     ) as boost
-              from memory m
-              where coalesce(m.status, 'ACTIVE') <> 'DELETED'
-            )
-            select m.id, m.title, m.visibility, m.created_at,
-                   (
-                     0.55 * bs.vec_sim +
-                     0.35 * bs.text_rank +
-                     0.10 * eb.boost
-                   ) as score,
-                   bs.vec_sim,
-                   bs.text_rank,
-                   ts_headline('english', coalesce(m.title, ''), q.qtsv, 'MaxWords=10') as title_hl
-            from memory m
-            cross join q
-            join base_scores bs on bs.id = m.id
-            join edge_boost eb on eb.id = m.id
-            where coalesce(m.status, 'ACTIVE') <> 'DELETED'
-            order by score desc
-            limit :limit
-            """
-        ),
-        {"q": q, "qemb": veclit, "limit": limit},
-    ).all()
+    tier = QUALITY_TIERS[quality]
+    candidates = max(tier["candidates"], limit)
+    emb = await _query_embedding(db, q)
+    # Zero vector means no embedding is available; skip the ANN stage (cosine is undefined)
+    ann_k = candidates if emb.any() else 0
+    if ann_k:
+        await _set_ann_quality(db, tier, ann_k)
+    rows = (await db.execute(
+        _SEARCH_SQL,
+        {"q": q, "qemb": emb, "ann_k": ann_k, "lex_k": candidates, "limit": limit},
+    )).all()
 
     results = []
     for r in rows:
@@ -1,7 +1,7 @@
 from fastapi import APIRouter, Depends, HTTPException
 from uuid import UUID
 from sqlalchemy import select, insert
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from ..models import WeaveReq
 from ..deps import get_user_id, db_session
@@ -15,14 +15,14 @@ router = APIRouter(prefix="/v1", tags=["weave"])
 async def create_weave(
     req: WeaveReq,
     user_id: UUID = Depends(get_user_id),
-    db: Session = Depends(db_session),
+    db: AsyncSession = Depends(db_session),
 ):
     if req.a_id == req.b_id:
         raise HTTPException(status_code=400, detail="Cannot weave a memory to itself")
 
     # Ensure both memories exist (and are visible via RLS)
-    a = db.execute(select(Memory).where(Memory.id == req.a_id)).scalar_one_or_none()
-    b = db.execute(select(Memory).where(Memory.id == req.b_id)).scalar_one_or_none()
+    a = (await db.execute(select(Memory).where(Memory.id == req.a_id))).scalar_one_or_none()
+    b = (await db.execute(select(Memory).where(Memory.id == req.b_id))).scalar_one_or_none()
     if not a or not b:
         raise HTTPException(status_code=404, detail="One or both memories not found")
 
@@ -31,7 +31,7 @@ async def create_weave(
 
     # Insert edge (owner-only per RLS insert policy)
     try:
-        row = db.execute(
+        row = (await db.execute(
             text(
                 """
                 insert into memory_edge (id, a_memory_id, b_memory_id, relation, strength, note, created_by)
@@ -41,8 +41,19 @@ async def create_weave(
                 """
             ),
             {"a": str(a_id), "b": str(b_id), "rel": req.relation, "s": req.strength or 0.5, "note": req.note, "uid": str(user_id)},
-        ).one()
+        )).one()
     except Exception as e:
         raise HTTPException(status_code=403, detail="Not allowed to create weave (owner required)")
 
+    # Relayout around both endpoints on every canvas that shows them
+    await db.execute(
+        text(
+            """
+            insert into layout_event (user_id, memory_id)
+            select user_id, memory_id from participant where memory_id in (:a, :b)
+            """
+        ),
+        {"a": str(a_id), "b": str(b_id)},
+    )
+
     return {"edge_id": row[0], "strength": row[1]}
@@ -1,5 +1,10 @@
+import asyncio
 import os
-from typing import Optional, BinaryIO
+import threading
+import time
+from collections import OrderedDict
+from hashlib import sha256
+from typing import AsyncIterator, Optional, BinaryIO
 import boto3
 from botocore.config import Config
 
@@ -7,26 +12,263 @@ from botocore.config import Config
 AWS_REGION = os.getenv("AWS_REGION", "us-east-1")
 AWS_S3_BUCKET = os.getenv("AWS_S3_BUCKET")
 S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL")
+# "path" for MinIO and other endpoints without per-bucket hostnames
+S3_ADDRESSING_STYLE = os.getenv("S3_ADDRESSING_STYLE", "virtual")
+# Multipart part size (S3 minimum is 5 MiB for all but the last part)
+S3_PART_BYTES = max(5 * 1024 * 1024, int(os.getenv("S3_PART_BYTES", str(8 * 1024 * 1024))))
+# Parts uploaded concurrently per upload; memory per upload is about (this + 1) x part size
+S3_UPLOAD_CONCURRENCY = int(os.getenv("S3_UPLOAD_CONCURRENCY", "2"))
+# HTTP connections kept by the shared client; size for concurrent uploads x S3_UPLOAD_CONCURRENCY
+S3_MAX_POOL_CONNECTIONS = int(os.getenv("S3_MAX_POOL_CONNECTIONS", "50"))
+PRESIGN_CACHE_SIZE = int(os.getenv("PRESIGN_CACHE_SIZE", "4096"))
+# A cached URL is signed for this much longer than its TTL bucket and reused for that extra time
+PRESIGN_REUSE_FRACTION = float(os.getenv("PRESIGN_REUSE_FRACTION", "0.25"))
+# SigV4 presigned URLs are valid for at most 7 days
+MAX_PRESIGN_SECONDS = 7 * 24 * 3600
+# Requested TTLs are rounded up to one of these, so nearby TTLs share a cached URL.
+# The top one leaves room for the reuse margin under the 7-day cap; longer TTLs
+# are signed as asked and not cached, since no URL could serve a second request.
+_TTL_BUCKETS = (300, 900, 3600, 6 * 3600, 24 * 3600, 3 * 24 * 3600)
+
+_client = None
+_client_lock = threading.Lock()
 
 
 def get_s3_client():
-    cfg = Config(signature_version="s3v4", s3={"addressing_style": "virtual"})
-    return boto3.client("s3", region_name=AWS_REGION, endpoint_url=S3_ENDPOINT_URL, config=cfg)
+    """Process-wide client: credentials, endpoint resolution and the connection pool are reused."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                cfg = Config(
+                    signature_version="s3v4",
+                    s3={"addressing_style": S3_ADDRESSING_STYLE},
+                    max_pool_connections=S3_MAX_POOL_CONNECTIONS,
+                    retries={"mode": "standard", "max_attempts": 3},
+                    tcp_keepalive=True,
+                )
+                _client = boto3.client("s3", region_name=AWS_REGION, endpoint_url=S3_ENDPOINT_URL, config=cfg)
+    return _client
 
 
-def put_fileobj(key: str, fileobj: BinaryIO, content_type: Optional[str] = None):
+def _require_bucket():
     if not AWS_S3_BUCKET:
         raise RuntimeError("AWS_S3_BUCKET not set")
+
+
+class PresignedUrlCache:
+    """LRU of presigned GET URLs keyed by (storage key, TTL bucket).
+
+    A request for ``ttl`` seconds is served from a URL signed for its bucket
+    plus PRESIGN_REUSE_FRACTION, as long as that URL is still valid for at
+    least ``ttl``; callers therefore never get a link that expires sooner
+    than they asked for. TTLs past the last bucket bypass the cache.
+    """
+
+    def __init__(self, maxsize: int = PRESIGN_CACHE_SIZE, reuse_fraction: float = PRESIGN_REUSE_FRACTION):
+        self.maxsize = maxsize
+        self.reuse_fraction = reuse_fraction
+        self._data: OrderedDict[tuple[str, int], tuple[float, str]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.uncached = 0
+
+    def get_or_sign(self, key: str, ttl: int, sign) -> tuple[str, int]:
+        """URL for ``key`` valid for at least ``ttl`` seconds, and its remaining lifetime."""
+        ttl = max(1, min(ttl, MAX_PRESIGN_SECONDS))
+        bucket = next((b for b in _TTL_BUCKETS if b >= ttl), None)
+        lifetime = min(MAX_PRESIGN_SECONDS, int(bucket * (1 + self.reuse_fraction))) if bucket else ttl
+        if lifetime <= ttl:
+            # Would expire before it could serve another request for ``ttl``
+            with self._lock:
+                self.uncached += 1
+            return sign(key, ttl), ttl
+        now = time.time()
+        with self._lock:
+            item = self._data.get((key, bucket))
+            if item is not None and item[0] - now >= ttl:
+                self._data.move_to_end((key, bucket))
+                self.hits += 1
+                return item[1], int(item[0] - now)
+            self.misses += 1
+        url = sign(key, lifetime)
+        with self._lock:
+            self._data[(key, bucket)] = (now + lifetime, url)
+            self._data.move_to_end((key, bucket))
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+        return url, lifetime
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "uncached": self.uncached,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+url_cache = PresignedUrlCache()
+
+
+def put_fileobj(key: str, fileobj: BinaryIO, content_type: Optional[str] = None):
+    _require_bucket()
     extra = {"ContentType": content_type} if content_type else None
-    client = get_s3_client()
-    client.upload_fileobj(fileobj, AWS_S3_BUCKET, key, ExtraArgs=extra or {})
+    get_s3_client().upload_fileobj(fileobj, AWS_S3_BUCKET, key, ExtraArgs=extra or {})
 
 
-def presign_get_url(key: str, ttl_seconds: int = 86400) -> str:
-    if not AWS_S3_BUCKET:
-        raise RuntimeError("AWS_S3_BUCKET not set")
+async def upload_stream(key: str, chunks: AsyncIterator[bytes], content_type: Optional[str] = None) -> int:
+    """Upload ``chunks`` in a single pass and return the byte count.
+
+    Bodies smaller than one part go up with a single PUT. Larger bodies are
+    sent as a multipart upload, with up to S3_UPLOAD_CONCURRENCY parts in
+    flight while the next one is read. Every boto3 call runs in a worker
+    thread, so the event loop keeps serving other requests. On failure the
+    multipart upload is aborted so no orphaned parts are left billed.
+    """
+    _require_bucket()
     client = get_s3_client()
-    return client.generate_presigned_url(
+    extra = {"ContentType": content_type} if content_type else {}
+    buf = bytearray()
+    total = 0
+    upload_id = None
+    number = 0
+    pending: set[asyncio.Task] = set()
+    parts: dict[int, str] = {}
+
+    async def send(number: int, body: bytes):
+        r = await asyncio.to_thread(
+            client.upload_part, Bucket=AWS_S3_BUCKET, Key=key, UploadId=upload_id, PartNumber=number, Body=body
+        )
+        parts[number] = r["ETag"]
+
+    async def start_part(body: bytes):
+        nonlocal upload_id, number
+        if upload_id is None:
+            r = await asyncio.to_thread(client.create_multipart_upload, Bucket=AWS_S3_BUCKET, Key=key, **extra)
+            upload_id = r["UploadId"]
+        # Back-pressure: don't read further ahead than the parts already in flight
+        while len(pending) >= S3_UPLOAD_CONCURRENCY:
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            pending.difference_update(done)
+            for t in done:
+                t.result()
+        number += 1
+        pending.add(asyncio.create_task(send(number, body)))
+
+    try:
+        async for chunk in chunks:
+            buf += chunk
+            total += len(chunk)
+            if len(buf) >= S3_PART_BYTES:
+                await start_part(bytes(buf[:S3_PART_BYTES]))
+                del buf[:S3_PART_BYTES]
+        if upload_id is None:
+            await asyncio.to_thread(client.put_object, Bucket=AWS_S3_BUCKET, Key=key, Body=bytes(buf), **extra)
+            return total
+        if buf:
+            await start_part(bytes(buf))
+        await asyncio.gather(*pending)
+        await asyncio.to_thread(
+            client.complete_multipart_upload,
+            Bucket=AWS_S3_BUCKET,
+            Key=key,
+            UploadId=upload_id,
+            MultipartUpload={"Parts": [{"PartNumber": n, "ETag": parts[n]} for n in sorted(parts)]},
+        )
+        return total
+    except BaseException:
+        for t in pending:
+            t.cancel()
+        if upload_id is not None:
+            await asyncio.to_thread(client.abort_multipart_upload, Bucket=AWS_S3_BUCKET, Key=key, UploadId=upload_id)
+        raise
+
+
+def create_multipart(key: str, content_type: Optional[str] = None) -> str:
+    _require_bucket()
+    extra = {"ContentType": content_type} if content_type else {}
+    return get_s3_client().create_multipart_upload(Bucket=AWS_S3_BUCKET, Key=key, **extra)["UploadId"]
+
+
+def presign_upload_part(key: str, upload_id: str, part_number: int, ttl_seconds: int) -> str:
+    """URL the client PUTs one part's bytes to; the response's ETag identifies the part."""
+    _require_bucket()
+    return get_s3_client().generate_presigned_url(
+        "upload_part",
+        Params={"Bucket": AWS_S3_BUCKET, "Key": key, "UploadId": upload_id, "PartNumber": part_number},
+        ExpiresIn=ttl_seconds,
+    )
+
+
+def list_parts(key: str, upload_id: str) -> list[dict]:
+    _require_bucket()
+    parts = []
+    for page in get_s3_client().get_paginator("list_parts").paginate(
+        Bucket=AWS_S3_BUCKET, Key=key, UploadId=upload_id
+    ):
+        parts += [{"PartNumber": p["PartNumber"], "ETag": p["ETag"]} for p in page.get("Parts", [])]
+    return parts
+
+
+def complete_multipart(key: str, upload_id: str, parts: list[dict]):
+    _require_bucket()
+    get_s3_client().complete_multipart_upload(
+        Bucket=AWS_S3_BUCKET,
+        Key=key,
+        UploadId=upload_id,
+        MultipartUpload={"Parts": sorted(parts, key=lambda p: p["PartNumber"])},
+    )
+
+
+def abort_multipart(key: str, upload_id: str):
+    _require_bucket()
+    get_s3_client().abort_multipart_upload(Bucket=AWS_S3_BUCKET, Key=key, UploadId=upload_id)
+
+
+def object_size(key: str) -> int:
+    _require_bucket()
+    return get_s3_client().head_object(Bucket=AWS_S3_BUCKET, Key=key)["ContentLength"]
+
+
+def hash_object(key: str, chunk_bytes: int = 1024 * 1024) -> str:
+    """sha256 of a stored object, streamed in chunks (blocking; call from a thread)."""
+    hasher = sha256()
+    body = open_object(key)
+    try:
+        while chunk := body.read(chunk_bytes):
+            hasher.update(chunk)
+    finally:
+        body.close()
+    return hasher.hexdigest()
+
+
+def delete_object(key: str):
+    _require_bucket()
+    get_s3_client().delete_object(Bucket=AWS_S3_BUCKET, Key=key)
+
+
+def _sign_get(key: str, ttl_seconds: int) -> str:
+    return get_s3_client().generate_presigned_url(
         "get_object", Params={"Bucket": AWS_S3_BUCKET, "Key": key}, ExpiresIn=ttl_seconds
     )
 
+
+def presign_get(key: str, ttl_seconds: int = 86400) -> tuple[str, int]:
+    """(url, expires_in) for ``key``; reuses a cached URL that is valid for at least ``ttl_seconds``."""
+    _require_bucket()
+    return url_cache.get_or_sign(key, ttl_seconds, _sign_get)
+
+
+def presign_get_url(key: str, ttl_seconds: int = 86400) -> str:
+    return presign_get(key, ttl_seconds)[0]
+
+
+def open_object(key: str):
+    """Streaming body of ``key``; read it in chunks rather than all at once."""
+    _require_bucket()
+    return get_s3_client().get_object(Bucket=AWS_S3_BUCKET, Key=key)["Body"]
@@ -0,0 +1 @@
+# workers package
@@ -0,0 +1,119 @@
+"""Artifact GC: deletes bucket objects under mem/ that no artifact row (or pending upload) references.
+
+Orphans come from uploads that failed after the transfer, memories that were
+hard-deleted (artifact rows cascade, objects don't) and older code paths that
+stored duplicates. Objects younger than ARTIFACT_GC_GRACE_SECONDS are left
+alone, since an upload that is still committing its row looks the same as an
+orphan. Abandoned multipart uploads and direct-upload sessions past the grace
+period are cleaned up too.
+
+Run from services/api: python -m app.workers.artifact_gc [--once] [--dry-run]
+"""
+
+import argparse
+import os
+import signal
+import threading
+import logging
+from datetime import datetime, timedelta, timezone
+
+from ..storage import s3
+from .indexing import get_conn
+
+logger = logging.getLogger(__name__)
+
+
+INTERVAL_SECONDS = float(os.getenv("ARTIFACT_GC_INTERVAL_SECONDS", "3600"))
+GRACE_SECONDS = float(os.getenv("ARTIFACT_GC_GRACE_SECONDS", str(24 * 3600)))
+PREFIX = "mem/"
+# list_objects_v2 pages and delete_objects batches are both capped at 1000 keys
+BATCH = 1000
+
+
+def _unreferenced(cur, keys: list[str]) -> set[str]:
+    # Completed direct uploads waiting on app.workers.artifact_verify have no artifact row yet
+    cur.execute(
+        """
+        select storage_key from artifact where storage_key = any(%s)
+        union all
+        select storage_key from artifact_upload where storage_key = any(%s) and status in ('UPLOADING', 'VERIFYING')
+        """,
+        (keys, keys),
+    )
+    return set(keys) - {r[0] for r in cur.fetchall()}
+
+
+def sweep(cur, client=None, grace_seconds: float = GRACE_SECONDS, dry_run: bool = False) -> dict:
+    """One pass over the bucket; returns counts of what was scanned and removed."""
+    client = client or s3.get_s3_client()
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=grace_seconds)
+    stats = {"scanned": 0, "deleted": 0, "deleted_bytes": 0, "aborted_uploads": 0, "expired_sessions": 0}
+
+    for page in client.get_paginator("list_objects_v2").paginate(
+        Bucket=s3.AWS_S3_BUCKET, Prefix=PREFIX, PaginationConfig={"PageSize": BATCH}
+    ):
+        objects = {o["Key"]: o for o in page.get("Contents", []) if o["LastModified"] < cutoff}
+        stats["scanned"] += len(page.get("Contents", []))
+        if not objects:
+            continue
+        orphans = sorted(_unreferenced(cur, list(objects)))
+        if orphans and not dry_run:
+            r = client.delete_objects(
+                Bucket=s3.AWS_S3_BUCKET, Delete={"Objects": [{"Key": k} for k in orphans], "Quiet": True}
+            )
+            for err in r.get("Errors", []):
+                logger.warning(f"Could not delete {err['Key']}: {err.get('Message')}")
+            failed = {err["Key"] for err in r.get("Errors", [])}
+            orphans = [k for k in orphans if k not in failed]
+        stats["deleted"] += len(orphans)
+        stats["deleted_bytes"] += sum(objects[k]["Size"] for k in orphans)
+
+    for page in client.get_paginator("list_multipart_uploads").paginate(Bucket=s3.AWS_S3_BUCKET, Prefix=PREFIX):
+        for upload in page.get("Uploads", []):
+            if upload["Initiated"] >= cutoff:
+                continue
+            if not dry_run:
+                client.abort_multipart_upload(Bucket=s3.AWS_S3_BUCKET, Key=upload["Key"], UploadId=upload["UploadId"])
+            stats["aborted_uploads"] += 1
+
+    # Direct-upload sessions never completed (their multipart uploads were aborted
+    # above) or long finished; ones still being verified are left to the worker
+    expired = "from artifact_upload where created_at < %s and status <> 'VERIFYING'"
+    if dry_run:
+        cur.execute(f"select count(*) {expired}", (cutoff,))
+        stats["expired_sessions"] = cur.fetchone()[0]
+    else:
+        cur.execute(f"delete {expired}", (cutoff,))
+        stats["expired_sessions"] = cur.rowcount
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Delete artifact objects with no artifact row")
+    parser.add_argument("--once", action="store_true", help="run one sweep and exit")
+    parser.add_argument("--dry-run", action="store_true", help="report orphans without deleting them")
+    args = parser.parse_args()
+    if not s3.AWS_S3_BUCKET:
+        raise SystemExit("AWS_S3_BUCKET not set")
+
+    logger.info("=== Artifact GC started ===")
+    stop = threading.Event()
+    signal.signal(signal.SIGINT, lambda signum, frame: stop.set())
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+
+    client = s3.get_s3_client()
+    with get_conn(autocommit=True) as conn, conn.cursor() as cur:
+        while not stop.is_set():
+            try:
+                stats = sweep(cur, client, dry_run=args.dry_run)
+                logger.info(f"Artifact GC{' (dry run)' if args.dry_run else ''}: {stats}")
+            except Exception as e:
+                logger.error(f"Artifact GC sweep failed: {e}", exc_info=True)
+            if args.once:
+                break
+            stop.wait(INTERVAL_SECONDS)
+    logger.info("Artifact GC stopped")
+
+
+if __name__ == "__main__":
+    main()
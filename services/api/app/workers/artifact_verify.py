@@ -0,0 +1,133 @@
+"""Artifact verify worker: checks completed direct uploads and creates their artifacts.
+
+POST /v1/artifacts/uploads/{id}/complete assembles the parts in storage and
+marks the session VERIFYING. Checking the sha256 means reading the whole
+object back (up to ARTIFACT_MAX_UPLOAD_BYTES), so it happens here rather than
+in a request holding a pooled connection and a row lock. A match creates the
+artifact (deduplicated like any other upload) and marks the session DONE; a
+mismatch deletes the object and marks it FAILED.
+
+Run from services/api: python -m app.workers.artifact_verify
+"""
+
+import asyncio
+import os
+import signal
+import threading
+import logging
+
+from sqlalchemy import text
+
+from ..db.session import engine, get_db_with_rls
+from ..routers.artifacts import _insert_artifact
+from ..storage.s3 import delete_object, hash_object
+from .indexing import get_conn, wait_for_events
+
+logger = logging.getLogger(__name__)
+
+
+IDLE_TIMEOUT_SECONDS = float(os.getenv("ARTIFACT_VERIFY_IDLE_TIMEOUT_SECONDS", "30"))
+# A claim older than this is assumed orphaned by a crashed worker and retried
+CLAIM_TIMEOUT_SECONDS = float(os.getenv("ARTIFACT_VERIFY_TIMEOUT_SECONDS", "3600"))
+
+_CLAIM_SQL = text(
+    """
+    update artifact_upload set started_at = now()
+    where id = (
+      select id from artifact_upload
+      where status = 'VERIFYING'
+        and (started_at is null or started_at < now() - make_interval(secs => :timeout))
+      order by created_at
+      limit 1
+      for update skip locked
+    )
+    returning id, user_id, memory_id, storage_key, mime, bytes, sha256
+    """
+)
+
+
+async def _fail(upload_id, error: str):
+    async with engine.begin() as conn:
+        await conn.execute(
+            text(
+                """
+                update artifact_upload set status = 'FAILED', error = :error, finished_at = now()
+                where id = :id and status = 'VERIFYING'
+                """
+            ),
+            {"id": upload_id, "error": error[:1000]},
+        )
+
+
+async def verify(up) -> str:
+    """Hash the stored object and create the artifact; returns the final status."""
+    digest = await asyncio.to_thread(hash_object, up.storage_key)
+    if digest != up.sha256:
+        await asyncio.to_thread(delete_object, up.storage_key)
+        await _fail(up.id, "Uploaded content sha256 does not match the declared file")
+        return "FAILED"
+    async for db in get_db_with_rls(str(up.user_id)):
+        art = await _insert_artifact(
+            db,
+            memory_id=up.memory_id,
+            owner_id=up.user_id,
+            mime=up.mime,
+            storage_key=up.storage_key,
+            sha256=up.sha256,
+            bytes=up.bytes,
+        )
+        await db.execute(
+            text(
+                """
+                update artifact_upload set status = 'DONE', artifact_id = :aid, error = null, finished_at = now()
+                where id = :id
+                """
+            ),
+            {"id": up.id, "aid": art.id},
+        )
+    return "DONE"
+
+
+async def process_one() -> bool:
+    """Claim and verify one upload; returns False when there is nothing to do."""
+    async with engine.begin() as conn:
+        up = (await conn.execute(_CLAIM_SQL, {"timeout": CLAIM_TIMEOUT_SECONDS})).first()
+    if not up:
+        return False
+    logger.info(f"Verifying upload {up.id} ({up.bytes} bytes) for user {up.user_id}")
+    try:
+        status = await verify(up)
+    except Exception as e:
+        logger.error(f"Verifying upload {up.id} failed: {e}", exc_info=True)
+        # HTTPException from the shared artifact helpers carries its message in detail
+        await _fail(up.id, str(getattr(e, "detail", e)))
+        return True
+    logger.info(f"Upload {up.id}: {status}")
+    return True
+
+
+async def run(stop: threading.Event):
+    with get_conn(autocommit=True) as listen_conn:
+        listen_conn.execute("listen artifact_upload")
+        while not stop.is_set():
+            processed = False
+            try:
+                processed = await process_one()
+            except Exception as e:
+                logger.error(f"Error claiming upload: {e}", exc_info=True)
+            if not processed:
+                await asyncio.to_thread(wait_for_events, listen_conn, stop, IDLE_TIMEOUT_SECONDS)
+    await engine.dispose()
+
+
+def main():
+    logger.info("=== Artifact verify worker started ===")
+    stop = threading.Event()
+    signal.signal(signal.SIGINT, lambda signum, frame: stop.set())
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+    asyncio.run(run(stop))
+    logger.info("Artifact verify worker stopped")
+
+
+if __name__ == "__main__":
+    main()
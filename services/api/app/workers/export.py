@@ -0,0 +1,198 @@
+"""Export worker: builds queued export_job files and uploads them to S3.
+
+Large accounts export through POST /v1/export/jobs instead of a long-lived
+HTTP response. Each job streams the same NDJSON/ZIP as GET /v1/export into a
+temporary file (constant memory, however big the account), uploads it under
+exports/<user>/<job>.<format>, and the API hands out a presigned link.
+
+A running job's started_at is refreshed every EXPORT_HEARTBEAT_SECONDS, so a
+job is only re-claimed once its worker has stopped beating for
+EXPORT_JOB_TIMEOUT_SECONDS (crashed), never while it is still being built.
+Every EXPORT_EXPIRE_INTERVAL_SECONDS the worker also deletes files under
+exports/ and finished job rows older than EXPORT_TTL_SECONDS.
+
+Run from services/api: python -m app.workers.export
+"""
+
+import asyncio
+import os
+import signal
+import tempfile
+import threading
+import time
+import logging
+from contextlib import asynccontextmanager, suppress
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import text
+
+from ..db.session import engine, get_db_with_rls
+from ..routers.export import CONTENT_TYPES, TTL_SECONDS, export_stream
+from ..storage import s3
+from ..storage.s3 import put_fileobj
+from .indexing import get_conn, wait_for_events
+
+logger = logging.getLogger(__name__)
+
+
+IDLE_TIMEOUT_SECONDS = float(os.getenv("EXPORT_IDLE_TIMEOUT_SECONDS", "30"))
+# A RUNNING job whose heartbeat is older than this is assumed orphaned by a
+# crashed worker and retried
+JOB_TIMEOUT_SECONDS = float(os.getenv("EXPORT_JOB_TIMEOUT_SECONDS", "300"))
+HEARTBEAT_SECONDS = float(os.getenv("EXPORT_HEARTBEAT_SECONDS", "60"))
+EXPIRE_INTERVAL_SECONDS = float(os.getenv("EXPORT_EXPIRE_INTERVAL_SECONDS", "3600"))
+PREFIX = "exports/"
+
+_CLAIM_SQL = text(
+    """
+    update export_job set status = 'RUNNING', started_at = now()
+    where id = (
+      select id from export_job
+      where status = 'PENDING'
+         or (status = 'RUNNING' and started_at < now() - make_interval(secs => :timeout))
+      order by created_at
+      limit 1
+      for update skip locked
+    )
+    returning id, user_id, format
+    """
+)
+
+
+@asynccontextmanager
+async def heartbeat(job_id):
+    """Keep ``job_id``'s claim fresh while the block runs."""
+
+    async def beat():
+        while True:
+            await asyncio.sleep(HEARTBEAT_SECONDS)
+            try:
+                async with engine.begin() as conn:
+                    await conn.execute(
+                        text("update export_job set started_at = now() where id = :id and status = 'RUNNING'"),
+                        {"id": job_id},
+                    )
+            except Exception as e:
+                logger.warning(f"Heartbeat for export {job_id} failed: {e}")
+
+    task = asyncio.create_task(beat())
+    try:
+        yield
+    finally:
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
+
+
+def expire(cur, client=None, ttl_seconds: float = TTL_SECONDS) -> dict:
+    """Delete export files and finished job rows older than ``ttl_seconds``.
+
+    Files go by their own age rather than through job rows, so ones whose row
+    is already gone (or never got written) are removed too.
+    """
+    client = client or s3.get_s3_client()
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=ttl_seconds)
+    stats = {"objects": 0, "jobs": 0}
+    for page in client.get_paginator("list_objects_v2").paginate(Bucket=s3.AWS_S3_BUCKET, Prefix=PREFIX):
+        old = [o["Key"] for o in page.get("Contents", []) if o["LastModified"] < cutoff]
+        if not old:
+            continue
+        r = client.delete_objects(Bucket=s3.AWS_S3_BUCKET, Delete={"Objects": [{"Key": k} for k in old], "Quiet": True})
+        for err in r.get("Errors", []):
+            logger.warning(f"Could not delete {err['Key']}: {err.get('Message')}")
+        stats["objects"] += len(old) - len(r.get("Errors", []))
+    cur.execute("delete from export_job where status in ('DONE', 'FAILED') and finished_at < %s", (cutoff,))
+    stats["jobs"] = cur.rowcount
+    return stats
+
+
+def _expire_once() -> dict:
+    with get_conn(autocommit=True) as conn, conn.cursor() as cur:
+        return expire(cur)
+
+
+async def build_export(job_id, user_id, format: str) -> tuple[str, int]:
+    """Write the export to a temp file and upload it; returns (storage_key, bytes)."""
+    key = f"exports/{user_id}/{job_id}.{format}"
+    with tempfile.TemporaryFile() as tmp:
+        async for db in get_db_with_rls(str(user_id)):
+            async for chunk in export_stream(db, user_id, format):
+                tmp.write(chunk)
+        size = tmp.tell()
+        tmp.seek(0)
+        await asyncio.to_thread(put_fileobj, key, tmp, CONTENT_TYPES[format])
+    return key, size
+
+
+async def process_one() -> bool:
+    """Claim and run one job; returns False when the queue is empty."""
+    async with engine.begin() as conn:
+        job = (await conn.execute(_CLAIM_SQL, {"timeout": JOB_TIMEOUT_SECONDS})).first()
+    if not job:
+        return False
+    job_id, user_id, format = job
+    logger.info(f"Building {format} export {job_id} for user {user_id}")
+    try:
+        async with heartbeat(job_id):
+            key, size = await build_export(job_id, user_id, format)
+    except Exception as e:
+        logger.error(f"Export {job_id} failed: {e}", exc_info=True)
+        async with engine.begin() as conn:
+            await conn.execute(
+                text(
+                    """
+                    update export_job set status = 'FAILED', error = :error, finished_at = now()
+                    where id = :id and status = 'RUNNING'
+                    """
+                ),
+                {"id": job_id, "error": str(e)[:1000]},
+            )
+        return True
+    async with engine.begin() as conn:
+        await conn.execute(
+            text(
+                """
+                update export_job set status = 'DONE', storage_key = :key, bytes = :bytes, error = null,
+                  finished_at = now()
+                where id = :id and status = 'RUNNING'
+                """
+            ),
+            {"id": job_id, "key": key, "bytes": size},
+        )
+    logger.info(f"Export {job_id} done: {size} bytes")
+    return True
+
+
+async def run(stop: threading.Event):
+    with get_conn(autocommit=True) as listen_conn:
+        listen_conn.execute("listen export_job")
+        expired_at = 0.0
+        while not stop.is_set():
+            if time.monotonic() - expired_at >= EXPIRE_INTERVAL_SECONDS:
+                expired_at = time.monotonic()
+                try:
+                    stats = await asyncio.to_thread(_expire_once)
+                    logger.info(f"Expired exports: {stats}")
+                except Exception as e:
+                    logger.error(f"Error expiring exports: {e}", exc_info=True)
+            processed = False
+            try:
+                processed = await process_one()
+            except Exception as e:
+                logger.error(f"Error claiming export job: {e}", exc_info=True)
+            if not processed:
+                await asyncio.to_thread(wait_for_events, listen_conn, stop, IDLE_TIMEOUT_SECONDS)
+    await engine.dispose()
+
+
+def main():
+    logger.info("=== Export worker started ===")
+    stop = threading.Event()
+    signal.signal(signal.SIGINT, lambda signum, frame: stop.set())
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+    asyncio.run(run(stop))
+    logger.info("Export worker stopped")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,63 +1,54 @@
 """Indexing worker: consumes memory_event and refreshes memory.tsv + memory.embedding.
 Uses OpenAI embeddings if OPENAI_API_KEY is set; falls back to zeros.
+
+Run from services/api: python -m app.workers.indexing
 """
 
 import os
 import time
+import signal
 import psycopg
 import logging
+import numpy as np
+import multiprocessing as mp
 import sys
+from hashlib import sha256
+
+from pgvector.psycopg import register_vector
+
+from ..embeddings.provider import BATCH_SIZE, get_provider
 
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    format='%(asctime)s - %(processName)s - %(name)s - %(levelname)s - %(message)s',
     handlers=[logging.StreamHandler(sys.stdout)]
 )
 logger = logging.getLogger(__name__)
 
-EMBEDDING_DIM = int(os.getenv("EMBEDDING_DIM", "1536"))
-MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
 
+# Fallback poll interval if a notification is ever missed
+IDLE_TIMEOUT_SECONDS = float(os.getenv("INDEXING_IDLE_TIMEOUT_SECONDS", "30"))
+# Concurrent consumers, each with its own connections and queue partition
+WORKERS = max(1, int(os.getenv("INDEXING_WORKERS", "4")))
+STATS_INTERVAL_SECONDS = float(os.getenv("INDEXING_STATS_INTERVAL_SECONDS", "60"))
+SHUTDOWN_TIMEOUT_SECONDS = float(os.getenv("INDEXING_SHUTDOWN_TIMEOUT_SECONDS", "30"))
 
-def get_conn():
+# Per-process counters: memories re-embedded, skipped because the document was
+# unchanged, and dead-lettered because the provider rejected the document
+STATS = {"embedded": 0, "skipped": 0, "failed": 0}
+
+
+def get_conn(autocommit: bool = False):
+    """Connection with the pgvector adapters registered (embeddings are sent in binary)."""
     dsn = os.environ.get("DATABASE_URL")
     if not dsn:
         raise RuntimeError("DATABASE_URL not set")
-    return psycopg.connect(dsn)
-
-
-def embed(text: str) -> list[float]:
-    """Generate embedding vector for text using OpenAI API.
-
-    Args:
-        text: Text to embed
-
-    Returns:
-        List of floats representing the embedding vector (dimension: EMBEDDING_DIM)
-    """
-    api_key = os.getenv("OPENAI_API_KEY")
-    if not api_key:
-        logger.warning("OPENAI_API_KEY not set, using zero vector for embedding")
-        return [0.0] * EMBEDDING_DIM
-    try:
-        from openai import OpenAI
-
-        client = OpenAI(api_key=api_key)
-        resp = client.embeddings.create(model=MODEL, input=text)
-        vec = resp.data[0].embedding
-        # Ensure dimension matches
-        if len(vec) != EMBEDDING_DIM:
-            logger.warning(f"Embedding dimension mismatch: got {len(vec)}, expected {EMBEDDING_DIM}")
-            # Pad/trim as needed (shouldn't happen if model dims match)
-            if len(vec) < EMBEDDING_DIM:
-                vec = vec + [0.0] * (EMBEDDING_DIM - len(vec))
-            else:
-                vec = vec[:EMBEDDING_DIM]
-        return vec
-    except Exception as e:
-        logger.error(f"Error generating embedding: {e}")
-        return [0.0] * EMBEDDING_DIM
+    # Type lookup in autocommit so the connection isn't left inside a transaction
+    conn = psycopg.connect(dsn, autocommit=True)
+    register_vector(conn)
+    conn.autocommit = autocommit
+    return conn
 
 
 def build_document(cur, memory_id: str) -> str:
@@ -91,42 +82,158 @@ def build_document(cur, memory_id: str) -> str:
     return row[0] if row and row[0] else ""
 
 
-def process_one(cur) -> bool:
-    """Process a single indexing event from the queue.
+def process_batch(cur, limit: int = BATCH_SIZE, partition: tuple[int, int] = (0, 1)) -> int:
+    """Claim up to ``limit`` indexing events and rebuild each affected memory once.
+
+    Every pending event for a claimed memory is consumed together, so a memory
+    edited many times between runs is embedded a single time. A memory whose
+    document the provider rejects gets its full-text index only and leaves one
+    failed event behind (``failed_at``/``last_error``), which is never claimed;
+    the rest of the batch commits as usual.
 
     Args:
         cur: Database cursor
+        limit: Maximum number of events to claim
+        partition: (index, count) -- only memories hashing to ``index`` are
+            claimed, so no two pool workers ever rebuild the same memory
 
     Returns:
-        True if an event was processed, False if queue was empty
+        Number of events consumed (0 if the queue was empty)
     """
-    # Fetch one event (oldest)
-    cur.execute("select id, memory_id from memory_event order by id asc limit 1 for update skip locked")
-    evt = cur.fetchone()
-    if not evt:
-        return False
-    eid, mid = evt
-    logger.info(f"Processing indexing event {eid} for memory {mid}")
+    index, count = partition
+    # Claim the oldest events in our partition; concurrent workers skip rows we hold
+    cur.execute(
+        """
+        select distinct memory_id from (
+            select memory_id from memory_event
+            where failed_at is null and mod(hashtext(memory_id::text) & 2147483647, %s) = %s
+            order by id asc limit %s for update skip locked
+        ) claimed
+        """,
+        (count, index, limit),
+    )
+    mids = [r[0] for r in cur.fetchall()]
+    if not mids:
+        return 0
+
+    # Coalesce: take every other pending event for the same memories. Claiming
+    # before building documents means each consumed event's change is visible.
+    cur.execute(
+        """
+        delete from memory_event where id in (
+            select id from memory_event where memory_id = any(%s) for update skip locked
+        )
+        """,
+        (mids,),
+    )
+    n_events = cur.rowcount
+    logger.info(f"Processing {n_events} indexing events for {len(mids)} memories")
 
-    doc = build_document(cur, mid)
-    logger.debug(f"Built document for memory {mid}, length: {len(doc)} chars")
+    provider = get_provider()
+    cur.execute("select id, doc_hash, embedding_model from memory where id = any(%s)", (mids,))
+    indexed = {r[0]: (r[1], r[2]) for r in cur.fetchall()}
 
-    vec = embed(doc)
-    logger.debug(f"Generated embedding for memory {mid}, dimension: {len(vec)}")
+    # Only memories whose document or embedding model changed need a rebuild
+    changed = []
+    for mid in mids:
+        doc = build_document(cur, mid)
+        doc_hash = sha256(doc.encode()).hexdigest()
+        if indexed.get(mid) == (doc_hash, provider.signature):
+            continue
+        changed.append((mid, doc, doc_hash))
+    skipped = len(mids) - len(changed)
 
-    cur.execute(
-        "update memory set tsv = to_tsvector('english', %s), embedding = %s where id = %s",
-        (doc, vec, mid),
+    # Raises EmbeddingError when the provider is failing; the caller rolls back so
+    # events are retried. Rejected documents don't fail the batch.
+    rejected: dict[int, str] = {}
+    vecs = provider.embed_many([doc for _, doc, _ in changed], rejected=rejected)
+    for n, ((mid, doc, doc_hash), vec) in enumerate(zip(changed, vecs)):
+        if n in rejected:
+            logger.warning(f"Embedding rejected for memory {mid}; indexing full text only: {rejected[n]}")
+            cur.execute("update memory set tsv = to_tsvector('english', %s) where id = %s", (doc, mid))
+            cur.execute(
+                """
+                insert into memory_event (memory_id, kind, failed_at, last_error)
+                values (%s, 'INDEX_MEMORY', now(), %s)
+                """,
+                (mid, rejected[n][:1000]),
+            )
+            continue
+        cur.execute(
+            """
+            update memory
+            set tsv = to_tsvector('english', %s), embedding = %b, doc_hash = %s, embedding_model = %s
+            where id = %s
+            """,
+            (doc, np.asarray(vec, dtype=np.float32), doc_hash, provider.signature, mid),
+        )
+        logger.debug(f"Indexed memory {mid}, document length: {len(doc)} chars")
+    STATS["embedded"] += len(changed) - len(rejected)
+    STATS["skipped"] += skipped
+    STATS["failed"] += len(rejected)
+    logger.info(
+        f"Completed indexing for {len(mids)} memories "
+        f"({len(changed) - len(rejected)} embedded, {skipped} unchanged skipped, {len(rejected)} rejected, "
+        f"{n_events - len(mids)} duplicate events coalesced)"
     )
-    cur.execute("delete from memory_event where id = %s", (eid,))
-    logger.info(f"Completed indexing for memory {mid}")
-    return True
+    return n_events
+
+
+def wait_for_events(listen_conn, stop=None, timeout: float = IDLE_TIMEOUT_SECONDS) -> None:
+    """Block until memory_event is notified, ``stop`` is set, or ``timeout`` elapses."""
+    deadline = time.monotonic() + timeout
+    while not (stop and stop.is_set()):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return
+        # Short slices so a shutdown request is noticed promptly
+        for _ in listen_conn.notifies(timeout=min(remaining, 1.0), stop_after=1):
+            return
+
+
+def run_worker(index: int, count: int, stop, counters, skips) -> None:
+    """Pool member: owns its connections and the ``index`` partition of the queue."""
+    # The parent coordinates shutdown through ``stop``
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+
+    with get_conn() as conn, get_conn(autocommit=True) as listen_conn:
+        # Notifications queue on this idle connection while we work, so none are lost
+        listen_conn.execute("listen memory_event")
+        logger.info(f"Worker {index}/{count} connected; listening on memory_event")
+        with conn.cursor() as cur:
+            while not stop.is_set():
+                processed = 0
+                skipped_before = STATS["skipped"]
+                try:
+                    processed = process_batch(cur, partition=(index, count))
+                    conn.commit()
+                except Exception as e:
+                    logger.error(f"Worker {index} error processing events: {e}", exc_info=True)
+                    conn.rollback()
+                if processed:
+                    with counters.get_lock():
+                        counters[index] += processed
+                        skips[index] += STATS["skipped"] - skipped_before
+                else:
+                    wait_for_events(listen_conn, stop)
+    logger.info(f"Worker {index} stopped")
+
+
+def _spawn(index: int, count: int, stop, counters, skips) -> mp.Process:
+    proc = mp.Process(target=run_worker, args=(index, count, stop, counters, skips), name=f"indexing-{index}")
+    proc.start()
+    return proc
 
 
 def main():
-    """Main worker loop - processes indexing events from the queue."""
+    """Run a pool of INDEXING_WORKERS consumers until SIGINT/SIGTERM."""
     logger.info("=== Indexing worker started ===")
-    logger.info(f"Configuration: MODEL={MODEL}, EMBEDDING_DIM={EMBEDDING_DIM}")
+    provider = get_provider()
+    logger.info(
+        f"Configuration: MODEL={provider.model}, EMBEDDING_DIM={provider.dim}, "
+        f"BATCH_SIZE={provider.batch_size}, WORKERS={WORKERS}"
+    )
 
     api_key = os.getenv("OPENAI_API_KEY")
     if api_key:
@@ -134,24 +241,44 @@ def main():
     else:
         logger.warning("OpenAI API key NOT configured - using zero vectors for embeddings")
 
-    with get_conn() as conn:
-        logger.info("Database connection established")
-        with conn.cursor() as cur:
-            event_count = 0
-            while True:
-                processed = False
-                try:
-                    conn.execute("begin")
-                    processed = process_one(cur)
-                    conn.commit()
-                    if processed:
-                        event_count += 1
-                        logger.info(f"Total events processed in this session: {event_count}")
-                except Exception as e:
-                    logger.error(f"Error processing event: {e}", exc_info=True)
-                    conn.rollback()
-                if not processed:
-                    time.sleep(2)
+    stop = mp.Event()
+    counters = mp.Array("q", WORKERS)
+    skips = mp.Array("q", WORKERS)
+    # Signal handlers only record the request; setting ``stop`` from a handler
+    # could deadlock on the Event's internal lock
+    signals: list[int] = []
+    signal.signal(signal.SIGINT, lambda signum, frame: signals.append(signum))
+    signal.signal(signal.SIGTERM, lambda signum, frame: signals.append(signum))
+
+    procs = [_spawn(i, WORKERS, stop, counters, skips) for i in range(WORKERS)]
+    last = [0] * WORKERS
+    last_at = time.monotonic()
+    while not signals:
+        time.sleep(0.5)
+        for i, proc in enumerate(procs):
+            if not proc.is_alive():
+                logger.warning(f"Worker {i} exited with code {proc.exitcode}; restarting")
+                procs[i] = _spawn(i, WORKERS, stop, counters, skips)
+        now = time.monotonic()
+        elapsed = now - last_at
+        if elapsed >= STATS_INTERVAL_SECONDS:
+            current = list(counters)
+            rates = ", ".join(f"w{i}={(c - p) / elapsed:.2f}/s" for i, (c, p) in enumerate(zip(current, last)))
+            logger.info(
+                f"Throughput over {elapsed:.0f}s: {rates}; total events={sum(current)}, "
+                f"unchanged documents skipped={sum(skips)}"
+            )
+            last, last_at = current, now
+
+    logger.info(f"Received signal {signals[0]}; draining workers")
+    stop.set()
+    for proc in procs:
+        # In-flight batches finish and commit; notifies() waits are at most ~1s
+        proc.join(timeout=SHUTDOWN_TIMEOUT_SECONDS)
+        if proc.is_alive():
+            logger.warning(f"{proc.name} did not stop in time; terminating")
+            proc.terminate()
+    logger.info(f"Indexing worker stopped; events processed per worker: {list(counters)}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,224 @@
+"""Layout worker: consumes layout_event and keeps memory_layout (per-user canvas positions) current.
+
+A user's graph is the memories they participate in plus the edges between
+them. The first event for a user lays out the whole graph; later events only
+move the region within LAYOUT_REGION_HOPS of the changed memories, so existing
+cards stay where the user last saw them.
+
+Run from services/api: python -m app.workers.layout
+"""
+
+import os
+import signal
+import threading
+import time
+import logging
+from collections import defaultdict
+from hashlib import sha256
+
+import numpy as np
+
+from .indexing import get_conn, wait_for_events
+
+logger = logging.getLogger(__name__)
+
+
+IDLE_TIMEOUT_SECONDS = float(os.getenv("LAYOUT_IDLE_TIMEOUT_SECONDS", "30"))
+# Users handled per batch; all pending events for a claimed user are coalesced
+BATCH_USERS = int(os.getenv("LAYOUT_BATCH_USERS", "20"))
+# Newest memories per user that get positions (the canvas shows at most 500)
+MAX_NODES = int(os.getenv("LAYOUT_MAX_NODES", "1000"))
+REGION_HOPS = int(os.getenv("LAYOUT_REGION_HOPS", "2"))
+FULL_ITERATIONS = 200
+INCREMENTAL_ITERATIONS = 60
+# Preferred edge length in canvas units (cards are 160x80)
+EDGE_LENGTH = 220.0
+
+
+def force_layout(
+    pos: np.ndarray,
+    edges: np.ndarray,
+    weights: np.ndarray,
+    movable: np.ndarray,
+    iterations: int,
+    temperature: float,
+) -> np.ndarray:
+    """Fruchterman-Reingold: all nodes repel, edges attract, only ``movable`` rows move.
+
+    ``pos`` is (n, 2), ``edges`` is (e, 2) node indices, ``movable`` is a bool mask.
+    Cost per iteration is O(movable x n + e), so incremental updates stay cheap.
+    """
+    pos = pos.astype(np.float32, copy=True)
+    moving = np.flatnonzero(movable)
+    if not len(moving):
+        return pos
+    k2 = EDGE_LENGTH ** 2
+    for step in range(iterations):
+        # x and y as separate (moving, n) planes: ~5x faster than an (m, n, 2) tensor
+        dx = pos[moving, 0, None] - pos[None, :, 0]
+        dy = pos[moving, 1, None] - pos[None, :, 1]
+        scale = k2 / np.maximum(dx * dx + dy * dy, 1e-2)
+        disp = np.stack([(dx * scale).sum(axis=1), (dy * scale).sum(axis=1)], axis=1)
+
+        force = np.zeros_like(pos)
+        if len(edges):
+            d = pos[edges[:, 0]] - pos[edges[:, 1]]
+            dist = np.maximum(np.linalg.norm(d, axis=1), 1e-2)
+            pull = d * (dist * weights / EDGE_LENGTH)[:, None]
+            np.add.at(force, edges[:, 0], -pull)
+            np.add.at(force, edges[:, 1], pull)
+        disp += force[moving]
+
+        # Cooling schedule: cap each move by a linearly falling temperature
+        t = temperature * (1 - step / iterations)
+        length = np.maximum(np.linalg.norm(disp, axis=1), 1e-9)
+        pos[moving] += disp * (np.minimum(length, t) / length)[:, None]
+    return pos
+
+
+def _user_graph(cur, user_id) -> tuple[list, list[tuple]]:
+    cur.execute(
+        """
+        select m.id from memory m
+        join participant p on p.memory_id = m.id and p.user_id = %s
+        where coalesce(m.status, 'ACTIVE') <> 'DELETED'
+        order by m.created_at desc
+        limit %s
+        """,
+        (user_id, MAX_NODES),
+    )
+    ids = [r[0] for r in cur.fetchall()]
+    cur.execute(
+        """
+        select a_memory_id, b_memory_id, max(strength) from memory_edge
+        where a_memory_id = any(%s) and b_memory_id = any(%s)
+        group by a_memory_id, b_memory_id
+        """,
+        (ids, ids),
+    )
+    return ids, cur.fetchall()
+
+
+def _region(adjacency: dict, start: set, hops: int) -> set:
+    seen, frontier = set(start), set(start)
+    for _ in range(hops):
+        frontier = {n for f in frontier for n in adjacency[f]} - seen
+        seen |= frontier
+    return seen
+
+
+def layout_user(cur, user_id, changed: set) -> int:
+    """Refresh ``user_id``'s positions around ``changed`` memories; returns nodes moved."""
+    ids, edge_rows = _user_graph(cur, user_id)
+    if not ids:
+        cur.execute("delete from memory_layout where user_id = %s", (user_id,))
+        return 0
+    index = {mid: i for i, mid in enumerate(ids)}
+    edges = np.array([(index[a], index[b]) for a, b, _ in edge_rows], dtype=np.int64).reshape(-1, 2)
+    weights = np.array([s for _, _, s in edge_rows], dtype=np.float32)
+    adjacency = defaultdict(set)
+    for a, b in edges.tolist():
+        adjacency[a].add(b)
+        adjacency[b].add(a)
+
+    cur.execute("select memory_id, x, y from memory_layout where user_id = %s", (user_id,))
+    known = {r[0]: (r[1], r[2]) for r in cur.fetchall() if r[0] in index}
+    # Seeded per user so a full layout is reproducible
+    rng = np.random.default_rng(int.from_bytes(sha256(str(user_id).encode()).digest()[:8], "little"))
+    spread = EDGE_LENGTH * np.sqrt(len(ids))
+    pos = np.zeros((len(ids), 2))
+    placed = np.zeros(len(ids), dtype=bool)
+    for mid, xy in known.items():
+        pos[index[mid]] = xy
+        placed[index[mid]] = True
+
+    if not placed.any():
+        pos = rng.uniform(-spread / 2, spread / 2, size=pos.shape)
+        movable = np.ones(len(ids), dtype=bool)
+        iterations, temperature = FULL_ITERATIONS, spread / 4
+    else:
+        start = {index[m] for m in changed if m in index} | set(np.flatnonzero(~placed).tolist())
+        region = _region(adjacency, start, REGION_HOPS)
+        movable = np.zeros(len(ids), dtype=bool)
+        movable[list(region)] = True
+        # New cards start next to their already-placed neighbours, else at the edge of the graph
+        centre, radius = pos[placed].mean(axis=0), np.abs(pos[placed]).max() + EDGE_LENGTH
+        for i in np.flatnonzero(~placed):
+            near = [n for n in adjacency[i] if placed[n]]
+            base = pos[near].mean(axis=0) if near else centre + rng.normal(size=2) * radius / 2
+            pos[i] = base + rng.normal(size=2) * EDGE_LENGTH / 4
+        iterations, temperature = INCREMENTAL_ITERATIONS, EDGE_LENGTH
+
+    pos = force_layout(pos, edges, weights, movable, iterations, temperature)
+    moved = np.flatnonzero(movable)
+    cur.executemany(
+        """
+        insert into memory_layout (user_id, memory_id, x, y) values (%s, %s, %s, %s)
+        on conflict (user_id, memory_id) do update set x = excluded.x, y = excluded.y, updated_at = now()
+        """,
+        [(user_id, ids[i], float(pos[i, 0]), float(pos[i, 1])) for i in moved],
+    )
+    # Memories that left the graph (deleted, no longer shared, past MAX_NODES)
+    cur.execute("delete from memory_layout where user_id = %s and memory_id <> all(%s)", (user_id, ids))
+    return len(moved)
+
+
+def process_batch(cur, limit: int = BATCH_USERS) -> int:
+    """Claim every pending event for up to ``limit`` users and relayout them; returns events consumed."""
+    cur.execute(
+        """
+        select distinct user_id from (
+          select user_id from layout_event order by id limit %s for update skip locked
+        ) e
+        """,
+        (limit * 10,),
+    )
+    users = [r[0] for r in cur.fetchall()][:limit]
+    if not users:
+        return 0
+    cur.execute(
+        """
+        delete from layout_event where id in (
+          select id from layout_event where user_id = any(%s) for update skip locked
+        )
+        returning user_id, memory_id
+        """,
+        (users,),
+    )
+    changed = defaultdict(set)
+    rows = cur.fetchall()
+    for uid, mid in rows:
+        changed[uid].add(mid)
+    for uid, mids in changed.items():
+        start = time.perf_counter()
+        moved = layout_user(cur, uid, mids)
+        logger.info(
+            f"Laid out {moved} nodes for user {uid} ({len(mids)} changed) in {(time.perf_counter() - start) * 1000:.0f}ms"
+        )
+    return len(rows)
+
+
+def main():
+    logger.info("=== Layout worker started ===")
+    stop = threading.Event()
+    signal.signal(signal.SIGINT, lambda signum, frame: stop.set())
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+
+    with get_conn() as conn, get_conn(autocommit=True) as listen_conn:
+        listen_conn.execute("listen layout_event")
+        with conn.cursor() as cur:
+            while not stop.is_set():
+                processed = 0
+                try:
+                    processed = process_batch(cur)
+                    conn.commit()
+                except Exception as e:
+                    logger.error(f"Error processing layout events: {e}", exc_info=True)
+                    conn.rollback()
+                if not processed:
+                    wait_for_events(listen_conn, stop, timeout=IDLE_TIMEOUT_SECONDS)
+    logger.info("Layout worker stopped")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,8 @@
+# Benchmark scripts (run against a live API / database, not collected by pytest)
+
+import re
+
+
+def psycopg_sql(sql: str) -> str:
+    """Rewrite SQLAlchemy ``:name`` binds as psycopg ``%(name)s`` (leaves ``::`` casts alone)."""
+    return re.sub(r"(?<![:\w]):([a-z_]+)", r"%(\1)s", sql)
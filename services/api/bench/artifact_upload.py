@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Artifact upload benchmark: throughput and event-loop lag under concurrent uploads.
+
+Runs N concurrent uploads inside one event loop, next to a probe task that
+sleeps 5 ms in a loop and records how late it wakes up (the delay any other
+request on that worker would see):
+
+- legacy:  what /v1/artifacts/upload used to do; hash pass over the spooled
+           file, seek back, then blocking boto3 upload_fileobj on the loop
+- current: storage.s3.upload_stream; hash while streaming, multipart parts
+           uploaded from worker threads
+
+Targets MinIO (or any S3) with --endpoint, otherwise starts a local moto server.
+
+    python -m bench.artifact_upload --size-mb 32 --concurrency 8
+    python -m bench.artifact_upload --endpoint http://localhost:9000 --bucket weave-bench
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from hashlib import sha256
+
+import numpy as np
+
+PROBE_INTERVAL_S = 0.005
+READ_BYTES = 1024 * 1024
+
+
+def _start_moto() -> tuple[subprocess.Popen, str]:
+    # Its own process, so the fake S3 doesn't compete with the loop under test for the GIL
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "moto.server", "-p", str(port)], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    for _ in range(100):
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.1).close()
+            break
+        except OSError:
+            time.sleep(0.1)
+    return proc, f"http://127.0.0.1:{port}"
+
+
+def _spooled(data: bytes):
+    from starlette.datastructures import UploadFile
+
+    # Same spooling as Starlette's form parser: anything over 1 MB is on disk
+    f = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+    f.write(data)
+    f.seek(0)
+    return UploadFile(file=f, filename="bench.bin", headers={"content-type": "application/octet-stream"})
+
+
+async def legacy_upload(s3, key: str, upload) -> str:
+    hasher = sha256()
+    while chunk := await upload.read(READ_BYTES):
+        hasher.update(chunk)
+    await upload.seek(0)
+    s3.put_fileobj(key, upload.file, content_type=upload.content_type)
+    return hasher.hexdigest()
+
+
+async def current_upload(s3, key: str, upload) -> str:
+    hasher = sha256()
+
+    async def chunks():
+        while chunk := await upload.read(READ_BYTES):
+            hasher.update(chunk)
+            yield chunk
+
+    await s3.upload_stream(key, chunks(), content_type=upload.content_type)
+    return hasher.hexdigest()
+
+
+async def _round(s3, fn, payloads: list[bytes]) -> tuple[float, list[float]]:
+    lags: list[float] = []
+    done = asyncio.Event()
+
+    async def probe():
+        while not done.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(PROBE_INTERVAL_S)
+            lags.append((time.perf_counter() - start - PROBE_INTERVAL_S) * 1000)
+
+    uploads = [_spooled(p) for p in payloads]
+    probe_task = asyncio.create_task(probe())
+    await asyncio.sleep(0)
+    start = time.perf_counter()
+    digests = await asyncio.gather(*(fn(s3, f"bench/{fn.__name__}/{i}", u) for i, u in enumerate(uploads)))
+    elapsed = time.perf_counter() - start
+    done.set()
+    await probe_task
+    assert digests == [sha256(p).hexdigest() for p in payloads]
+    return elapsed, lags
+
+
+def _run(s3, fn, payloads: list[bytes], rounds: int) -> dict:
+    elapsed, lags = [], []
+    for _ in range(rounds):
+        e, lag = asyncio.run(_round(s3, fn, payloads))
+        elapsed.append(e)
+        lags.extend(lag)
+    mb = sum(len(p) for p in payloads) / 1e6
+    return {
+        "seconds_p50": round(float(np.median(elapsed)), 2),
+        "mb_per_s": round(mb / float(np.median(elapsed)), 1),
+        "loop_lag_ms": {
+            "p50": round(float(np.percentile(lags, 50)), 1),
+            "p99": round(float(np.percentile(lags, 99)), 1),
+            "max": round(float(np.max(lags)), 1),
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Artifact upload throughput / event-loop lag benchmark")
+    parser.add_argument("--endpoint", help="S3 endpoint, e.g. MinIO at http://localhost:9000 (default: local moto)")
+    parser.add_argument("--bucket", default="weave-bench")
+    parser.add_argument("--size-mb", type=float, default=32)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--out", help="write the JSON report to this file")
+    args = parser.parse_args()
+
+    server = None
+    if not args.endpoint:
+        server, args.endpoint = _start_moto()
+        os.environ.setdefault("AWS_ACCESS_KEY_ID", "bench")
+        os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "bench")
+    # storage.s3 reads its settings at import time
+    os.environ["S3_ENDPOINT_URL"] = args.endpoint
+    os.environ["AWS_S3_BUCKET"] = args.bucket
+    from app.storage import s3
+
+    try:
+        client = s3.get_s3_client()
+        try:
+            client.create_bucket(Bucket=args.bucket)
+        except (client.exceptions.BucketAlreadyOwnedByYou, client.exceptions.BucketAlreadyExists):
+            pass
+        rng = np.random.default_rng(0)
+        payloads = [rng.bytes(int(args.size_mb * 1024 * 1024)) for _ in range(args.concurrency)]
+        report = {
+            "endpoint": "moto" if server else args.endpoint,
+            "size_mb": args.size_mb,
+            "concurrency": args.concurrency,
+            "part_mb": s3.S3_PART_BYTES / 1024 / 1024,
+            "part_concurrency": s3.S3_UPLOAD_CONCURRENCY,
+            "legacy": _run(s3, legacy_upload, payloads, args.rounds),
+            "current": _run(s3, current_upload, payloads, args.rounds),
+        }
+    finally:
+        if server:
+            server.terminate()
+    print(json.dumps(report, indent=2))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
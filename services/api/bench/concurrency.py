@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Concurrent throughput benchmark for the Weave API.
+
+Drives a mix of DB-backed requests (list, detail, search) at a fixed
+concurrency and, in parallel, probes /v1/health. With a blocking DB driver
+the health probe queues behind every in-flight query; on the async path it
+should stay near its idle latency.
+
+Run it against the same database before and after a change, with the server's
+rate limiter off (every request comes from one caller):
+
+    RATE_LIMIT_ENABLED=0 uvicorn app.main:app --port 8000
+    python -m bench.concurrency --base-url http://localhost:8000 --concurrency 32 --requests 2000
+
+Throughput and latency count successful responses only. Any failed request
+(429s included) makes the run exit non-zero, since its numbers are not
+comparable.
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+from collections import Counter
+from uuid import uuid4
+
+import httpx
+
+
+def _pct(values: list[float], p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    idx = min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))
+    return values[idx]
+
+
+async def _seed(client: httpx.AsyncClient, n: int) -> list[str]:
+    ids = []
+    for i in range(n):
+        r = await client.post(
+            "/v1/memories",
+            json={"title": f"bench memory {i}", "visibility": "PRIVATE", "seed_text": f"benchmark seed text {i}"},
+        )
+        r.raise_for_status()
+        ids.append(r.json()["id"])
+    return ids
+
+
+async def _worker(client: httpx.AsyncClient, queue: asyncio.Queue, latencies: list[float], errors: list[int]):
+    while True:
+        path = await queue.get()
+        if path is None:
+            queue.task_done()
+            return
+        start = time.perf_counter()
+        try:
+            r = await client.get(path)
+        except httpx.HTTPError:
+            errors.append(0)
+        else:
+            if r.status_code >= 400:
+                errors.append(r.status_code)
+            else:
+                # Rejections return fast; timing them would flatter the latency numbers
+                latencies.append((time.perf_counter() - start) * 1000)
+        queue.task_done()
+
+
+async def _probe_health(client: httpx.AsyncClient, stop: asyncio.Event, latencies: list[float], errors: list[int]):
+    while not stop.is_set():
+        start = time.perf_counter()
+        try:
+            r = await client.get("/v1/health")
+            if r.status_code >= 400:
+                errors.append(r.status_code)
+        except httpx.HTTPError:
+            errors.append(0)
+        latencies.append((time.perf_counter() - start) * 1000)
+        await asyncio.sleep(0.05)
+
+
+MIX = {
+    "list": lambda mid: "/v1/memories?limit=50",
+    "detail": lambda mid: f"/v1/memories/{mid}",
+    "search": lambda mid: "/v1/search/associative?q=benchmark",
+}
+
+
+async def run(base_url: str, concurrency: int, total: int, seed: int, mix: tuple[str, ...] = tuple(MIX)) -> dict:
+    headers = {"X-Debug-User": str(uuid4())}
+    limits = httpx.Limits(max_connections=concurrency + 2, max_keepalive_connections=concurrency + 2)
+    async with httpx.AsyncClient(base_url=base_url, headers=headers, limits=limits, timeout=60) as client:
+        ids = await _seed(client, seed)
+        paths = []
+        for i in range(total):
+            mid = ids[i % len(ids)]
+            paths.append(MIX[mix[i % len(mix)]](mid))
+
+        queue: asyncio.Queue = asyncio.Queue()
+        for p in paths:
+            queue.put_nowait(p)
+        for _ in range(concurrency):
+            queue.put_nowait(None)
+
+        latencies: list[float] = []
+        errors: list[int] = []
+        health: list[float] = []
+        health_errors: list[int] = []
+        stop = asyncio.Event()
+
+        started = time.perf_counter()
+        probe = asyncio.create_task(_probe_health(client, stop, health, health_errors))
+        await asyncio.gather(*[_worker(client, queue, latencies, errors) for _ in range(concurrency)])
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await probe
+
+    return {
+        "concurrency": concurrency,
+        "mix": list(mix),
+        "requests": total,
+        "ok": len(latencies),
+        "errors": len(errors),
+        # 0 = connection error / timeout
+        "errors_by_status": {str(k): v for k, v in sorted(Counter(errors).items())},
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "latency_ms": {
+            "p50": round(_pct(latencies, 50), 1),
+            "p95": round(_pct(latencies, 95), 1),
+            "p99": round(_pct(latencies, 99), 1),
+            "mean": round(statistics.fmean(latencies), 1) if latencies else 0.0,
+        },
+        "health_under_load_ms": {
+            "p50": round(_pct(health, 50), 1),
+            "p95": round(_pct(health, 95), 1),
+            "max": round(max(health), 1) if health else 0.0,
+            "errors": len(health_errors),
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Weave API concurrent throughput benchmark")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=20, help="memories to create before the run")
+    parser.add_argument("--mix", default=",".join(MIX), help="comma-separated request kinds, cycled in order")
+    parser.add_argument("--out", help="write the JSON report to this file")
+    args = parser.parse_args()
+    mix = tuple(m for m in args.mix.split(",") if m)
+    if not mix or any(m not in MIX for m in mix):
+        parser.error(f"--mix takes {', '.join(MIX)}")
+
+    report = asyncio.run(run(args.base_url.rstrip("/"), args.concurrency, args.requests, args.seed, mix))
+    print(json.dumps(report, indent=2))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+    if report["health_under_load_ms"]["errors"]:
+        print(f"WARNING: {report['health_under_load_ms']['errors']} /v1/health probes failed", file=sys.stderr)
+    if report["errors"]:
+        print(
+            f"WARNING: {report['errors']} of {report['requests']} requests failed {report['errors_by_status']}; "
+            "throughput is not comparable. If these are 429s, start the server with RATE_LIMIT_ENABLED=0.",
+            file=sys.stderr,
+        )
+    if report["errors"] or report["health_under_load_ms"]["errors"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
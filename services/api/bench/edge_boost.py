@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Edge-boost benchmark: legacy full-table search SQL vs the current candidate-only SQL.
+
+Seeds a scratch database (migrations applied, ideally empty) with random
+memories and edges, then times both queries for a fixed set of random query
+vectors.
+
+    python -m bench.edge_boost --dsn postgresql://localhost/weave_bench --memories 20000 --edges 100000
+"""
+
+import argparse
+import json
+import random
+import statistics
+import time
+
+import numpy as np
+import psycopg
+from pgvector.psycopg import register_vector
+
+from app.routers.search import CANDIDATES, _SEARCH_SQL
+from bench import psycopg_sql
+
+
+BENCH_USER = "00000000-0000-0000-0000-00000000b0b0"
+
+# search_associative before candidate generation: scores every memory and runs a
+# correlated, OR-joined edge subquery per memory
+LEGACY_SQL = """
+with q as (
+  select websearch_to_tsquery('english', %(q)s) as qtsv,
+         (%(qemb)s)::vector(1536) as qemb
+),
+base_scores as (
+  select m.id,
+         (1 - coalesce(m.embedding <=> q.qemb, 1)) as vec_sim,
+         coalesce(ts_rank_cd(m.tsv, q.qtsv), 0) as text_rank
+  from memory m
+  cross join q
+  where coalesce(m.status, 'ACTIVE') <> 'DELETED'
+),
+edge_boost as (
+  select m.id,
+         coalesce(
+           (select avg(bs.vec_sim * e.strength)
+            from memory_edge e
+            join base_scores bs on (
+              (e.a_memory_id = m.id and bs.id = e.b_memory_id) or
+              (e.b_memory_id = m.id and bs.id = e.a_memory_id)
+            )
+            where (e.a_memory_id = m.id or e.b_memory_id = m.id)
+           ), 0
+         ) as boost
+  from memory m
+  where coalesce(m.status, 'ACTIVE') <> 'DELETED'
+)
+select m.id, (0.55 * bs.vec_sim + 0.35 * bs.text_rank + 0.10 * eb.boost) as score
+from memory m
+join base_scores bs on bs.id = m.id
+join edge_boost eb on eb.id = m.id
+where coalesce(m.status, 'ACTIVE') <> 'DELETED'
+order by score desc
+limit %(limit)s
+"""
+
+
+CURRENT_SQL = psycopg_sql(_SEARCH_SQL.text)
+
+
+def seed(conn, memories: int, edges: int) -> None:
+    words = ["lake", "beach", "city", "forest", "party", "wedding", "concert", "road", "trip", "snow"]
+    with conn.cursor() as cur:
+        cur.execute(
+            "insert into app_user (id, handle) values (%s, 'edge-bench') on conflict do nothing", (BENCH_USER,)
+        )
+        cur.execute(
+            """
+            insert into memory (id, owner_id, visibility, title, embedding, tsv)
+            select gen_random_uuid(), %(uid)s, 'PRIVATE', t.title,
+                   (select array_agg(random() - 0.5)::vector(1536) from generate_series(1, 1536) where g > 0),
+                   to_tsvector('english', t.title)
+            from generate_series(1, %(n)s) g
+            cross join lateral (
+              select 'memory ' || g || ' ' || (%(words)s::text[])[1 + g %% 10] || ' '
+                     || (%(words)s::text[])[1 + (g / 10) %% 10] as title
+            ) t
+            """,
+            {"uid": BENCH_USER, "n": memories, "words": words},
+        )
+        cur.execute(
+            """
+            with ids as (select id, row_number() over () as rn from memory),
+                 n as (select count(*) as c from ids),
+                 pairs as (
+                   select 1 + floor(random() * n.c)::int as x, 1 + floor(random() * n.c)::int as y
+                   from generate_series(1, %(e)s), n
+                 )
+            insert into memory_edge (id, a_memory_id, b_memory_id, relation, strength, created_by)
+            select gen_random_uuid(), least(a.id, b.id), greatest(a.id, b.id), 'THEME', random(), %(uid)s
+            from pairs p
+            join ids a on a.rn = p.x
+            join ids b on b.rn = p.y
+            where a.id <> b.id
+            on conflict do nothing
+            """,
+            {"uid": BENCH_USER, "e": edges},
+        )
+        # ivfflat lists are trained at build time; rebuild after bulk loads
+        cur.execute("select to_regclass('idx_memory_embed') is not null")
+        if cur.fetchone()[0]:
+            cur.execute("reindex index idx_memory_embed")
+        cur.execute("analyze memory")
+        cur.execute("analyze memory_edge")
+    conn.commit()
+
+
+def _time(conn, sql: str, params: dict, runs: int, timeout_s: float) -> list[float]:
+    """Wall time per run in ms; a run that hits ``timeout_s`` is recorded as the timeout."""
+    out = []
+    with conn.cursor() as cur:
+        cur.execute(f"set statement_timeout = {int(timeout_s * 1000)}")
+        for _ in range(runs):
+            start = time.perf_counter()
+            try:
+                cur.execute(sql, params)
+                cur.fetchall()
+            except psycopg.errors.QueryCanceled:
+                conn.rollback()
+                out.append(timeout_s * 1000)
+                break
+            out.append((time.perf_counter() - start) * 1000)
+    conn.rollback()
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Search edge-boost benchmark (legacy vs candidate-only)")
+    parser.add_argument("--dsn", required=True)
+    parser.add_argument("--memories", type=int, default=20000)
+    parser.add_argument("--edges", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=5)
+    parser.add_argument("--runs", type=int, default=3, help="timed runs per query")
+    parser.add_argument("--timeout", type=float, default=120.0, help="per-query statement_timeout (s)")
+    parser.add_argument("--skip-seed", action="store_true")
+    parser.add_argument("--out", help="write the JSON report to this file")
+    args = parser.parse_args()
+
+    with psycopg.connect(args.dsn) as conn:
+        register_vector(conn)
+        if not args.skip_seed:
+            start = time.perf_counter()
+            seed(conn, args.memories, args.edges)
+            print(f"seeded {args.memories} memories / ~{args.edges} edges in {time.perf_counter() - start:.1f}s")
+        with conn.cursor() as cur:
+            cur.execute("select count(*) from memory")
+            n_mem = cur.fetchone()[0]
+            cur.execute("select count(*) from memory_edge")
+            n_edges = cur.fetchone()[0]
+
+        rng = random.Random(7)
+        report = {"memories": n_mem, "edges": n_edges, "legacy_ms": [], "current_ms": []}
+        for _ in range(args.queries):
+            vec = np.array([rng.random() - 0.5 for _ in range(1536)], dtype=np.float32)
+            base = {"q": rng.choice(["lake", "beach trip", "city concert"]), "qemb": vec, "limit": 20}
+            current = dict(base, ann_k=CANDIDATES, lex_k=CANDIDATES)
+            report["legacy_ms"] += _time(conn, LEGACY_SQL, base, args.runs, args.timeout)
+            report["current_ms"] += _time(conn, CURRENT_SQL, current, args.runs, args.timeout)
+
+    for k in ("legacy_ms", "current_ms"):
+        vals = report[k]
+        report[k] = {"p50": round(statistics.median(vals), 1), "max": round(max(vals), 1)}
+    report["timeout_ms"] = args.timeout * 1000
+    print(json.dumps(report, indent=2))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1 @@
+# Search relevance + latency benchmark: synthetic corpus, deterministic embedder, JSON report
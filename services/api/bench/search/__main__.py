@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Search relevance and latency benchmark for /v1/search/associative.
+
+Seeds a synthetic corpus (see corpus.py) into a scratch database, then runs a
+fixed query set through the real endpoint in-process, once per quality tier.
+Only the query embedding is swapped for the deterministic local embedder; SQL,
+RLS and FastAPI are the production path. Per tier it reports p50/p95/p99
+latency and recall@K against brute-force ground truth: the same scoring SQL
+with every memory as a candidate and index scans disabled.
+
+    python -m bench.search --dsn postgresql://localhost/weave_bench --memories 10000
+    python -m bench.search --dsn ... --memories 100000 --out bench-100k.json
+
+Diff reports between commits; ``target.met`` checks the README's search p95.
+Ground truth scores every memory and its edges, so it grows linearly with the
+corpus (~3 s/query at 30k memories locally); at 1M use --truth-queries to
+score recall on a subset of the query set.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import subprocess
+import time
+
+import numpy as np
+import psycopg
+from pgvector.psycopg import register_vector
+
+from bench import psycopg_sql
+
+from .corpus import BENCH_USER, Corpus, default_topics, seed
+from .embedder import HashEmbedder
+
+
+TARGET_P95_MS = 2000.0  # README: "search <2s p95"
+TIERS = ("fast", "balanced", "accurate")
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def ground_truth(conn, sql: str, queries: list[str], embedder: HashEmbedder, k: int) -> list[list[str]]:
+    """Exact top-``k`` per query: every memory is a candidate, no approximate index involved."""
+    with conn.cursor() as cur:
+        cur.execute("select count(*) from memory")
+        everything = cur.fetchone()[0]
+        out = []
+        for q in queries:
+            cur.execute("select set_config('app.user_id', %s, true)", (str(BENCH_USER),))
+            cur.execute("set local enable_indexscan = off")
+            cur.execute("set local enable_bitmapscan = off")
+            cur.execute(sql, {"q": q, "qemb": embedder.embed(q), "ann_k": everything, "lex_k": everything, "limit": k})
+            out.append([str(r[0]) for r in cur.fetchall()])
+            conn.rollback()
+    return out
+
+
+async def run_tiers(queries: list[str], embedder: HashEmbedder, k: int, tiers, warmup: int) -> dict:
+    import httpx
+
+    from app.db.session import engine
+    from app.main import app
+    from app.middleware import rate_limit
+    from app.routers import search as search_router
+
+    async def local_embedding(db, q):
+        return embedder.embed(q)
+
+    # Everything but the embedding provider stays on the production path. Every
+    # query comes from one caller; the default budget (burst / search cost) is a
+    # few dozen requests, and the limiter isn't what's being measured. Both are
+    # put back afterwards, since callers (tests) share the imported app.
+    saved = search_router._query_embedding, rate_limit.limiter
+    search_router._query_embedding = local_embedding
+    rate_limit.limiter = None
+    headers = {"X-Debug-User": str(BENCH_USER)}
+    results: dict = {}
+    transport = httpx.ASGITransport(app=app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", headers=headers) as client:
+            for tier in tiers:
+                for q in queries[:warmup]:
+                    r = await client.get("/v1/search/associative", params={"q": q, "limit": k, "quality": tier})
+                    r.raise_for_status()
+                latencies, ids = [], []
+                for q in queries:
+                    start = time.perf_counter()
+                    r = await client.get("/v1/search/associative", params={"q": q, "limit": k, "quality": tier})
+                    latencies.append((time.perf_counter() - start) * 1000)
+                    r.raise_for_status()
+                    ids.append([x["memory"]["id"] for x in r.json()["results"]])
+                results[tier] = {"latencies": latencies, "ids": ids}
+    finally:
+        search_router._query_embedding, rate_limit.limiter = saved
+    await engine.dispose()
+    return results
+
+
+def _latency(values: list[float]) -> dict:
+    return {
+        "p50": round(float(np.percentile(values, 50)), 1),
+        "p95": round(float(np.percentile(values, 95)), 1),
+        "p99": round(float(np.percentile(values, 99)), 1),
+        "mean": round(float(np.mean(values)), 1),
+    }
+
+
+def _recall(got: list[list[str]], truth: list[list[str]], k: int) -> float:
+    scores = [len(set(g[:k]) & set(t)) / len(t) for g, t in zip(got, truth) if t]
+    return round(float(np.mean(scores)), 4) if scores else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Weave search relevance + latency benchmark")
+    parser.add_argument("--dsn", default=os.getenv("DATABASE_URL"), help="scratch database (migrations applied)")
+    parser.add_argument("--memories", type=int, default=10000, help="corpus size, e.g. 10000 / 100000 / 1000000")
+    parser.add_argument("--topics", type=int, help="default: memories / 250")
+    parser.add_argument("--edges-per-memory", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--k", type=int, default=10, help="recall@K and results per query (max 50)")
+    parser.add_argument("--tiers", default=",".join(TIERS), help="comma-separated quality tiers")
+    parser.add_argument("--truth-queries", type=int, help="score recall on the first N queries (default: all)")
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--reseed", action="store_true", help="reload the corpus even if it is unchanged")
+    parser.add_argument("--out", help="write the JSON report to this file")
+    args = parser.parse_args()
+    if not args.dsn:
+        parser.error("--dsn or DATABASE_URL is required")
+
+    # The app reads DATABASE_URL at import time
+    os.environ["DATABASE_URL"] = args.dsn
+    # Per-request access logs would swamp the report
+    logging.getLogger("weave.api").setLevel(logging.WARNING)
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    from app.routers.search import VECTOR_INDEX, _SEARCH_SQL
+
+    k = max(1, min(args.k, 50))
+    tiers = [t for t in args.tiers.split(",") if t]
+    corpus = Corpus(args.memories, args.topics or default_topics(args.memories), args.edges_per_memory, args.seed)
+    embedder = HashEmbedder(seed=args.seed)
+    queries = corpus.queries(args.queries)
+
+    with psycopg.connect(args.dsn) as conn:
+        register_vector(conn)
+        seed(conn, corpus, embedder, reseed=args.reseed)
+        with conn.cursor() as cur:
+            cur.execute("select count(*) from memory")
+            total = cur.fetchone()[0]
+            cur.execute("select count(*) from memory_edge")
+            edges = cur.fetchone()[0]
+        start = time.perf_counter()
+        truth_queries = queries[:args.truth_queries] if args.truth_queries else queries
+        truth = ground_truth(conn, psycopg_sql(_SEARCH_SQL.text), truth_queries, embedder, k)
+        truth_s = time.perf_counter() - start
+
+    runs = asyncio.run(run_tiers(queries, embedder, k, tiers, min(args.warmup, len(queries))))
+    report = {
+        "commit": _git_commit(),
+        "corpus": {"spec": corpus.spec, "memories_in_db": total, "edges_in_db": edges},
+        "vector_index": VECTOR_INDEX,
+        "queries": len(queries),
+        "truth_queries": len(truth),
+        "k": k,
+        "ground_truth_s": round(truth_s, 1),
+        "tiers": {
+            tier: {"latency_ms": _latency(r["latencies"]), f"recall_at_{k}": _recall(r["ids"], truth, k)}
+            for tier, r in runs.items()
+        },
+    }
+    worst = max((t["latency_ms"]["p95"] for t in report["tiers"].values()), default=0.0)
+    report["target"] = {"p95_ms": TARGET_P95_MS, "worst_p95_ms": worst, "met": worst < TARGET_P95_MS}
+    print(json.dumps(report, indent=2))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
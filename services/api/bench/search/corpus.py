@@ -0,0 +1,161 @@
+"""Synthetic corpus for the search benchmark.
+
+Memories are grouped into topics, each with its own small vocabulary, plus a
+shared vocabulary of common words. Text, edges and ids are all derived from
+``seed``, so the same arguments always produce the same corpus and query set.
+The corpus belongs to one bench user and is replaced when the spec changes.
+"""
+
+import time
+import uuid
+
+import numpy as np
+
+from .embedder import HashEmbedder
+
+
+BENCH_USER = uuid.UUID("00000000-0000-0000-0000-0000000be7c4")
+RELATIONS = ("SAME_PERSON", "SAME_EVENT", "THEME", "EMOTION", "TIME_NEAR")
+WORDS_PER_TOPIC = 12
+COMMON_WORDS = 200
+
+_CONSONANTS = "bdfgklmnprstvz"
+_VOWELS = "aeiou"
+
+
+def default_topics(memories: int) -> int:
+    # ~250 memories per topic keeps each query's relevant set well above K
+    return max(8, memories // 250)
+
+
+def _word(rng: np.random.Generator) -> str:
+    syllables = rng.integers(2, 4)
+    return "".join(_CONSONANTS[rng.integers(len(_CONSONANTS))] + _VOWELS[rng.integers(len(_VOWELS))]
+                   for _ in range(syllables)) + _CONSONANTS[rng.integers(len(_CONSONANTS))]
+
+
+class Corpus:
+    """Vocabulary, documents, edges and queries for one (memories, topics, edges, seed) spec."""
+
+    def __init__(self, memories: int, topics: int, edges_per_memory: int = 2, seed: int = 0):
+        self.memories = memories
+        self.topics = topics
+        self.edges_per_memory = edges_per_memory
+        self.seed = seed
+        rng = np.random.default_rng(seed)
+        vocab: list[str] = []
+        seen: set[str] = set()
+        while len(vocab) < topics * WORDS_PER_TOPIC + COMMON_WORDS:
+            w = _word(rng)
+            if w not in seen:
+                seen.add(w)
+                vocab.append(w)
+        self.common = vocab[:COMMON_WORDS]
+        self.topic_words = [
+            vocab[COMMON_WORDS + t * WORDS_PER_TOPIC:COMMON_WORDS + (t + 1) * WORDS_PER_TOPIC] for t in range(topics)
+        ]
+
+    @property
+    def spec(self) -> str:
+        return f"memories={self.memories} topics={self.topics} edges={self.edges_per_memory} seed={self.seed}"
+
+    def _topic_of(self, i: int) -> int:
+        return i % self.topics
+
+    def _id(self, i: int) -> uuid.UUID:
+        return uuid.uuid5(BENCH_USER, f"{self.seed}:{i}")
+
+    def document(self, i: int) -> tuple[uuid.UUID, str, str]:
+        """(id, title, body) of memory ``i``."""
+        rng = np.random.default_rng((self.seed, 0, i))
+        words = self.topic_words[self._topic_of(i)]
+        title = [words[j] for j in rng.integers(len(words), size=2)] + [self.common[rng.integers(COMMON_WORDS)]]
+        body = [words[j] for j in rng.integers(len(words), size=4)]
+        body += [self.common[j] for j in rng.integers(COMMON_WORDS, size=2)]
+        return self._id(i), " ".join(title), " ".join(body)
+
+    def edges(self):
+        """Yield (a_id, b_id, relation, strength); most edges stay within a topic."""
+        rng = np.random.default_rng((self.seed, 1))
+        seen: set[int] = set()
+        for i in range(self.memories):
+            for _ in range(self.edges_per_memory):
+                if rng.random() < 0.8:
+                    # Another memory of the same topic (same residue mod topics)
+                    j = int(rng.integers(self.memories // self.topics + 1)) * self.topics + self._topic_of(i)
+                else:
+                    j = int(rng.integers(self.memories))
+                a, b = min(i, j), max(i, j)
+                if a == b or b >= self.memories or a * self.memories + b in seen:
+                    continue
+                seen.add(a * self.memories + b)
+                yield (self._id(a), self._id(b), RELATIONS[rng.integers(len(RELATIONS))],
+                       round(float(rng.uniform(0.2, 1.0)), 3))
+
+    def queries(self, n: int) -> list[str]:
+        """Fixed query set: two words of one topic, sometimes with a common word."""
+        rng = np.random.default_rng((self.seed, 2))
+        out = []
+        for _ in range(n):
+            words = self.topic_words[rng.integers(self.topics)]
+            q = [words[j] for j in rng.choice(len(words), size=2, replace=False)]
+            if rng.random() < 0.5:
+                q.append(self.common[rng.integers(COMMON_WORDS)])
+            out.append(" ".join(q))
+        return out
+
+
+def seed(conn, corpus: Corpus, embedder: HashEmbedder, reseed: bool = False, batch: int = 5000) -> bool:
+    """Load ``corpus`` for BENCH_USER unless an identical one is already there. Returns True if seeded."""
+    with conn.cursor() as cur:
+        cur.execute("select display_name from app_user where id = %s", (BENCH_USER,))
+        row = cur.fetchone()
+        cur.execute("select count(*) from memory where owner_id = %s", (BENCH_USER,))
+        existing = cur.fetchone()[0]
+        if not reseed and row and row[0] == corpus.spec and existing == corpus.memories:
+            return False
+
+        start = time.perf_counter()
+        cur.execute("delete from memory where owner_id = %s", (BENCH_USER,))
+        cur.execute(
+            """
+            insert into app_user (id, handle, display_name) values (%s, 'search-bench', %s)
+            on conflict (id) do update set display_name = excluded.display_name
+            """,
+            (BENCH_USER, corpus.spec),
+        )
+        cur.execute(
+            "create temp table bench_memory (id uuid, title text, body text, embedding vector(1536)) on commit drop"
+        )
+        for lo in range(0, corpus.memories, batch):
+            with cur.copy("copy bench_memory from stdin with (format binary)") as copy:
+                copy.set_types(["uuid", "text", "text", "vector"])
+                for i in range(lo, min(lo + batch, corpus.memories)):
+                    mid, title, body = corpus.document(i)
+                    copy.write_row((mid, title, body, embedder.embed(f"{title} {body}")))
+            print(f"  memories {min(lo + batch, corpus.memories)}/{corpus.memories}", flush=True)
+        cur.execute(
+            """
+            insert into memory (id, owner_id, visibility, title, embedding, tsv)
+            select id, %s, 'PRIVATE', title, embedding, to_tsvector('english', title || ' ' || body)
+            from bench_memory
+            """,
+            (BENCH_USER,),
+        )
+        with cur.copy(
+            "copy memory_edge (id, a_memory_id, b_memory_id, relation, strength, created_by) from stdin with (format binary)"
+        ) as copy:
+            copy.set_types(["uuid", "uuid", "uuid", "text", "float4", "uuid"])
+            for n, (a, b, relation, strength) in enumerate(corpus.edges()):
+                copy.write_row((uuid.uuid5(a, f"{b}:{n}"), a, b, relation, strength, BENCH_USER))
+        # ivfflat lists are trained at build time; rebuild after a bulk load
+        cur.execute("select to_regclass('idx_memory_embed') is not null")
+        if cur.fetchone()[0]:
+            cur.execute("reindex index idx_memory_embed")
+    conn.commit()
+    with conn.cursor() as cur:
+        cur.execute("analyze memory")
+        cur.execute("analyze memory_edge")
+    conn.commit()
+    print(f"seeded {corpus.spec} in {time.perf_counter() - start:.1f}s", flush=True)
+    return True
@@ -0,0 +1,37 @@
+"""Deterministic local embedder.
+
+Each token maps to a fixed pseudo-random direction (seeded from its hash), and
+a text embeds to the normalized sum of its token vectors. Texts that share
+words land close together, so ANN recall and hybrid ranking behave like they
+would on real embeddings, with no network and identical vectors on every run.
+"""
+
+import re
+from functools import lru_cache
+from hashlib import sha256
+
+import numpy as np
+
+
+DIM = 1536
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+class HashEmbedder:
+    def __init__(self, dim: int = DIM, seed: int = 0):
+        self.dim = dim
+        self.seed = seed
+        # ~6 KB per cached token vector
+        self._token = lru_cache(maxsize=16384)(self._token_vector)
+
+    def _token_vector(self, token: str) -> np.ndarray:
+        digest = sha256(f"{self.seed}\x00{token}".encode()).digest()
+        rng = np.random.default_rng(int.from_bytes(digest[:8], "little"))
+        return rng.standard_normal(self.dim).astype(np.float32)
+
+    def embed(self, text: str) -> np.ndarray:
+        vec = np.zeros(self.dim, dtype=np.float32)
+        for token in _TOKEN.findall(text.casefold()):
+            vec += self._token(token)
+        norm = float(np.linalg.norm(vec))
+        return vec / norm if norm else vec
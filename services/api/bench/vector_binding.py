@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Query-embedding binding microbenchmark: text literal vs binary pgvector codec.
+
+Measures, per request, the client-side serialization of one embedding and a
+round trip that makes Postgres accept it as ``vector(1536)``, on both drivers
+the API uses (asyncpg for the app, psycopg for the indexing worker):
+
+- text:   "[x1,x2,...]" formatted with %.6f and cast with ::vector(1536)
+- binary: float32 NumPy array through the pgvector adapters
+
+    python -m bench.vector_binding --dsn postgresql://localhost/weave --iterations 2000
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+import asyncpg
+import numpy as np
+import psycopg
+from pgvector.asyncpg import register_vector as register_vector_async
+from pgvector.psycopg import register_vector
+from pgvector.utils import to_db_binary
+
+DIM = 1536
+# Forces the server to materialise the parsed vector, not just receive it
+SQL = "select vector_dims(($1)::vector(1536))"
+
+
+def _vec_literal(v) -> str:
+    # What search used to send: pgvector text literal, [x1, x2, ...]
+    return "[" + ",".join(f"{x:.6f}" for x in v) + "]"
+
+
+def _per_op_us(fn, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def _median_us(fn, iterations: int) -> float:
+    times = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times) * 1e6
+
+
+def _serialize(vec: np.ndarray, iterations: int) -> dict:
+    as_list = vec.tolist()
+    return {
+        "text_literal_us": round(_per_op_us(lambda: _vec_literal(as_list), iterations), 1),
+        "binary_us": round(_per_op_us(lambda: to_db_binary(vec), iterations), 1),
+        "text_bytes": len(_vec_literal(as_list)),
+        "binary_bytes": len(to_db_binary(vec)),
+    }
+
+
+def _psycopg(dsn: str, vec: np.ndarray, iterations: int) -> dict:
+    with psycopg.connect(dsn, autocommit=True) as conn:
+        register_vector(conn)
+        cur = conn.cursor()
+        text_sql, binary_sql = SQL.replace("$1", "%s"), SQL.replace("$1", "%b")
+
+        def text_rt():
+            # Per request the literal is rebuilt from the embedding, as search did
+            cur.execute(text_sql, (_vec_literal(vec.tolist()),))
+            cur.fetchone()
+
+        def binary_rt():
+            cur.execute(binary_sql, (vec,))
+            cur.fetchone()
+
+        return {
+            "text_roundtrip_us": round(_median_us(text_rt, iterations), 1),
+            "binary_roundtrip_us": round(_median_us(binary_rt, iterations), 1),
+        }
+
+
+async def _asyncpg(dsn: str, vec: np.ndarray, iterations: int) -> dict:
+    plain = await asyncpg.connect(dsn)
+    coded = await asyncpg.connect(dsn)
+    try:
+        await register_vector_async(coded)
+        text_stmt = await plain.prepare(SQL.replace("($1)", "($1::text)"))
+        binary_stmt = await coded.prepare(SQL)
+        text_times, binary_times = [], []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            await text_stmt.fetchval(_vec_literal(vec.tolist()))
+            text_times.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            await binary_stmt.fetchval(vec)
+            binary_times.append(time.perf_counter() - start)
+        return {
+            "text_roundtrip_us": round(statistics.median(text_times) * 1e6, 1),
+            "binary_roundtrip_us": round(statistics.median(binary_times) * 1e6, 1),
+        }
+    finally:
+        await plain.close()
+        await coded.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="pgvector text vs binary binding microbenchmark")
+    parser.add_argument("--dsn", required=True)
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--out", help="write the JSON report to this file")
+    args = parser.parse_args()
+
+    vec = np.random.default_rng(7).standard_normal(DIM).astype(np.float32)
+    report = {
+        "dim": DIM,
+        "iterations": args.iterations,
+        "serialize": _serialize(vec, args.iterations),
+        "psycopg": _psycopg(args.dsn, vec, args.iterations),
+        "asyncpg": asyncio.run(_asyncpg(args.dsn, vec, args.iterations)),
+    }
+    print(json.dumps(report, indent=2))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
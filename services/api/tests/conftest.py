@@ -0,0 +1,27 @@
+from contextlib import contextmanager
+
+import pytest
+
+from services.api.app.db.instrument import count_queries, normalize_sql
+from services.api.app.middleware import rate_limit
+
+
+@pytest.fixture(autouse=True)
+def no_rate_limit(monkeypatch):
+    """Every TestClient request comes from one address; limiter tests install their own."""
+    monkeypatch.setattr(rate_limit, 'limiter', None)
+
+
+@pytest.fixture
+def max_queries():
+    """``with max_queries(n): client.get(...)`` fails if the block runs more than n SQL statements."""
+
+    @contextmanager
+    def check(limit: int):
+        with count_queries() as stats:
+            yield stats
+        if stats.count > limit:
+            ran = "\n".join(f"  {n}x {normalize_sql(s)[:200]}" for s, n in stats.statements.most_common())
+            pytest.fail(f"{stats.count} queries, expected at most {limit}:\n{ran}")
+
+    return check
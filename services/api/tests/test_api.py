@@ -1,7 +1,19 @@
-import os
+import asyncio
+import io
+import json
 import uuid
+import zipfile
+
+import boto3
 from fastapi.testclient import TestClient
+from moto import mock_aws
+from sqlalchemy import text
+
+from services.api.app.db.session import engine
 from services.api.app.main import app
+from services.api.app.storage import s3 as s3_mod
+from services.api.app.workers import export as export_worker
+from services.api.app.workers import indexing
 
 
 def _dbg_user():
@@ -17,28 +29,243 @@ def test_health():
 
 def test_create_memory_flow(monkeypatch):
     # Requires DATABASE_URL pointing to test Postgres (CI provides)
-    client = TestClient(app)
-    headers = {'X-Debug-User': _dbg_user()}
-    r = client.post('/v1/memories', json={'title': 'Test', 'visibility': 'PRIVATE'}, headers=headers)
-    assert r.status_code == 200
-    mid = r.json()['id']
+    with TestClient(app) as client:
+        headers = {'X-Debug-User': _dbg_user()}
+        r = client.post('/v1/memories', json={'title': 'Test', 'visibility': 'PRIVATE'}, headers=headers)
+        assert r.status_code == 200
+        mid = r.json()['id']
 
-    # Set core draft
-    r = client.put(f'/v1/memories/{mid}/core', json={'narrative': 'Hello', 'anchors': [], 'people': []}, headers=headers)
-    assert r.status_code == 200
+        # Set core draft
+        r = client.put(f'/v1/memories/{mid}/core', json={'narrative': 'Hello', 'anchors': [], 'people': []}, headers=headers)
+        assert r.status_code == 200
 
-    # Lock core
-    r = client.post(f'/v1/memories/{mid}/lock', headers=headers)
-    assert r.status_code == 200
-    assert 'version' in r.json()
+        # Lock core
+        r = client.post(f'/v1/memories/{mid}/lock', headers=headers)
+        assert r.status_code == 200
+        assert 'version' in r.json()
 
-    # Append text layer
-    r = client.post(f'/v1/memories/{mid}/layers', json={'kind': 'TEXT', 'text_content': 'layer'}, headers=headers)
-    assert r.status_code == 200
+        # Append text layer
+        r = client.post(f'/v1/memories/{mid}/layers', json={'kind': 'TEXT', 'text_content': 'layer'}, headers=headers)
+        assert r.status_code == 200
 
-    # Get memory detail
-    r = client.get(f'/v1/memories/{mid}', headers=headers)
-    assert r.status_code == 200
-    data = r.json()
-    assert data['id'] == mid
-    assert len(data['layers']) >= 1
+        # Get memory detail
+        r = client.get(f'/v1/memories/{mid}', headers=headers)
+        assert r.status_code == 200
+        data = r.json()
+        assert data['id'] == mid
+        assert len(data['layers']) >= 1
+        assert data['core']['narrative'] == 'Hello'
+        assert data['core']['locked'] is True
+        assert [p['role'] for p in data['participants']] == ['OWNER']
+
+
+def test_memory_detail_edges_summary():
+    with TestClient(app) as client:
+        headers = {'X-Debug-User': str(uuid.uuid4())}
+        a = client.post('/v1/memories', json={'title': 'A', 'visibility': 'PRIVATE'}, headers=headers).json()['id']
+        b = client.post('/v1/memories', json={'title': 'B', 'visibility': 'PRIVATE'}, headers=headers).json()['id']
+        r = client.post('/v1/weaves', json={'a_id': a, 'b_id': b, 'relation': 'THEME'}, headers=headers)
+        assert r.status_code == 200
+
+        r = client.get(f'/v1/memories/{a}', headers=headers)
+        assert r.status_code == 200
+        data = r.json()
+        assert data['core'] is None
+        assert data['layers'] == []
+        assert data['edges_summary']['counts'] == {'THEME': 1}
+        assert data['edges_summary']['connections'] == [{'memory_id': b, 'relation': 'THEME'}]
+
+
+def test_list_memories_keyset_pagination():
+    with TestClient(app) as client:
+        headers = {'X-Debug-User': str(uuid.uuid4())}
+        created = []
+        for i in range(5):
+            r = client.post('/v1/memories', json={'title': f'Page {i}', 'visibility': 'PRIVATE'}, headers=headers)
+            assert r.status_code == 200
+            created.append(r.json()['id'])
+        client.put(f'/v1/memories/{created[0]}/core', json={'narrative': 'First'}, headers=headers)
+
+        seen = []
+        cores = {}
+        cursor = None
+        while True:
+            params = {'limit': 2}
+            if cursor:
+                params['cursor'] = cursor
+            r = client.get('/v1/memories', params=params, headers=headers)
+            assert r.status_code == 200
+            data = r.json()
+            seen.extend(m['id'] for m in data['memories'])
+            cores.update({m['id']: m['core'] for m in data['memories']})
+            cursor = data['next_cursor']
+            if not cursor:
+                break
+
+        assert seen == list(reversed(created))
+        assert cores[created[0]] == {'narrative': 'First', 'locked': False}
+        assert cores[created[1]] is None
+        r = client.get('/v1/memories', params={'cursor': 'not-a-cursor'}, headers=headers)
+        assert r.status_code == 400
+
+
+def test_search_finds_lexical_candidate():
+    from services.api.app.workers import indexing
+
+    word = f'zq{uuid.uuid4().hex[:10]}'
+    with TestClient(app) as client:
+        headers = {'X-Debug-User': str(uuid.uuid4())}
+        r = client.post('/v1/memories', json={'title': f'Trip {word}', 'seed_text': 'roller coasters'}, headers=headers)
+        mid = r.json()['id']
+        other = client.post('/v1/memories', json={'title': 'Unrelated'}, headers=headers).json()['id']
+        # Edges on candidates go through the edge-boost join
+        client.post('/v1/weaves', json={'a_id': mid, 'b_id': other, 'relation': 'THEME'}, headers=headers)
+        with indexing.get_conn() as conn, conn.cursor() as cur:
+            while indexing.process_batch(cur, limit=1000):
+                conn.commit()
+
+        r = client.get('/v1/search/associative', params={'q': word}, headers=headers)
+        assert r.status_code == 200
+        results = r.json()['results']
+        assert [x['memory']['id'] for x in results] == [mid]
+
+
+def test_search_quality_tiers(monkeypatch):
+    from services.api.app.embeddings.cache import QueryEmbeddingCache
+    from services.api.app.routers import search as search_router
+
+    # Non-zero query vector so the ANN stage (and its index knob) runs
+    monkeypatch.setattr(search_router, '_embed', lambda text_in: [0.5] * 1536)
+    monkeypatch.setattr(search_router, 'query_cache', QueryEmbeddingCache())
+    with TestClient(app) as client:
+        headers = {'X-Debug-User': str(uuid.uuid4())}
+        for index in ('ivfflat', 'hnsw'):
+            monkeypatch.setattr(search_router, 'VECTOR_INDEX', index)
+            for quality in ('fast', 'balanced', 'accurate'):
+                r = client.get('/v1/search/associative', params={'q': 'tiers', 'quality': quality}, headers=headers)
+                assert r.status_code == 200, (index, quality, r.text)
+        r = client.get('/v1/search/associative', params={'q': 'tiers', 'quality': 'exhaustive'}, headers=headers)
+        assert r.status_code == 422
+
+
+def test_graph_neighbourhood_restricts_edges_to_returned_nodes():
+    with TestClient(app) as client:
+        headers = {'X-Debug-User': str(uuid.uuid4())}
+        chain = [client.post('/v1/memories', json={'title': f'Hop {i}'}, headers=headers).json()['id'] for i in range(4)]
+        for a, b in zip(chain, chain[1:]):
+            r = client.post('/v1/weaves', json={'a_id': a, 'b_id': b, 'relation': 'THEME'}, headers=headers)
+            assert r.status_code == 200
+
+        r = client.get('/v1/graph', params={'center': chain[0], 'hops': 2}, headers=headers)
+        assert r.status_code == 200
+        data = r.json()
+        assert [n['id'] for n in data['nodes']] == chain[:3]
+        assert {frozenset((e['a'], e['b'])) for e in data['edges']} == {
+            frozenset(chain[0:2]), frozenset(chain[1:3]),
+        }
+
+        r = client.get('/v1/graph', params={'center': str(uuid.uuid4())}, headers=headers)
+        assert r.status_code == 404
+
+
+def test_export_streams_ndjson_and_zip():
+    with TestClient(app) as client:
+        headers = {'X-Debug-User': str(uuid.uuid4())}
+        ids = []
+        for title in ('First', 'Second'):
+            mid = client.post('/v1/memories', json={'title': title, 'visibility': 'PRIVATE'}, headers=headers).json()['id']
+            client.put(f'/v1/memories/{mid}/core', json={'narrative': title.lower(), 'anchors': [], 'people': []}, headers=headers)
+            client.post(f'/v1/memories/{mid}/layers', json={'kind': 'TEXT', 'text_content': 'layer'}, headers=headers)
+            ids.append(mid)
+
+        # The default is still the original single JSON document
+        r = client.get('/v1/export', headers=headers)
+        assert r.status_code == 200 and r.headers['content-type'].startswith('application/json')
+        assert [m['id'] for m in r.json()['memories']] == ids
+
+        r = client.get('/v1/export', params={'format': 'ndjson'}, headers=headers)
+        assert r.status_code == 200
+        assert r.headers['content-type'].startswith('application/x-ndjson')
+        lines = [json.loads(line) for line in r.text.splitlines()]
+        assert [m['id'] for m in lines] == ids
+        assert lines[0]['cores'][0]['narrative'] == 'first'
+        assert lines[1]['layers'][0]['text_content'] == 'layer'
+        assert lines[0]['artifacts'] == []
+
+        r = client.get('/v1/export', params={'format': 'zip'}, headers=headers)
+        assert r.status_code == 200
+        with zipfile.ZipFile(io.BytesIO(r.content)) as zf:
+            assert zf.namelist() == ['memories.ndjson']
+            assert [json.loads(line)['id'] for line in zf.read('memories.ndjson').splitlines()] == ids
+
+
+def test_export_job_is_reused_while_open():
+    with TestClient(app) as client:
+        headers = {'X-Debug-User': str(uuid.uuid4())}
+        client.post('/v1/memories', json={'title': 'Job', 'visibility': 'PRIVATE'}, headers=headers)
+        r = client.post('/v1/export/jobs', headers=headers)
+        assert r.status_code == 202
+        job = r.json()
+        assert job['status'] == 'PENDING' and job['format'] == 'zip' and job['url'] is None
+        assert client.post('/v1/export/jobs', headers=headers).json()['id'] == job['id']
+
+        r = client.get(f"/v1/export/jobs/{job['id']}", headers=headers)
+        assert r.status_code == 200 and r.json()['status'] == 'PENDING'
+        r = client.get(f"/v1/export/jobs/{job['id']}", headers={'X-Debug-User': str(uuid.uuid4())})
+        assert r.status_code == 404
+
+
+def _job_row(cur, uid, status, finished_days_ago=None, started_secs_ago=0):
+    jid = uuid.uuid4()
+    cur.execute(
+        """
+        insert into export_job (id, user_id, format, status, started_at, finished_at)
+        values (%s, %s, 'zip', %s, now() - make_interval(secs => %s), now() - make_interval(days => %s))
+        """,
+        (jid, uid, status, started_secs_ago, finished_days_ago or 0),
+    )
+    return jid
+
+
+def test_export_heartbeat_keeps_running_job_claimed(monkeypatch):
+    monkeypatch.setattr(export_worker, 'HEARTBEAT_SECONDS', 0.05)
+    uid = uuid.uuid4()
+    with indexing.get_conn(autocommit=True) as conn, conn.cursor() as cur:
+        cur.execute("insert into app_user (id, handle) values (%s, %s)", (uid, f'exp-{uid.hex[:8]}'))
+        # Claimed long ago but still being built
+        job = _job_row(cur, uid, 'RUNNING', started_secs_ago=2 * export_worker.JOB_TIMEOUT_SECONDS)
+
+    async def run():
+        async with export_worker.heartbeat(job):
+            await asyncio.sleep(0.2)
+        async with engine.connect() as conn:
+            age = (await conn.execute(
+                text("select extract(epoch from now() - started_at) from export_job where id = :id"), {"id": job}
+            )).scalar_one()
+        await engine.dispose()
+        return age
+
+    assert asyncio.run(run()) < export_worker.JOB_TIMEOUT_SECONDS
+
+
+def test_export_worker_expires_old_files_and_jobs(monkeypatch):
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'test')
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'test')
+    monkeypatch.setattr(s3_mod, 'AWS_S3_BUCKET', 'weave-export-test')
+    uid = uuid.uuid4()
+    with mock_aws(), indexing.get_conn(autocommit=True) as conn, conn.cursor() as cur:
+        bucket = boto3.client('s3', region_name=s3_mod.AWS_REGION)
+        bucket.create_bucket(Bucket='weave-export-test')
+        for key in (f'exports/{uid}/a.zip', 'mem/x/kept.txt'):
+            bucket.put_object(Bucket='weave-export-test', Key=key, Body=b'x')
+        cur.execute("insert into app_user (id, handle) values (%s, %s)", (uid, f'exp-{uid.hex[:8]}'))
+        _job_row(cur, uid, 'DONE', finished_days_ago=8)
+        new = _job_row(cur, uid, 'DONE')
+
+        assert export_worker.expire(cur, bucket, ttl_seconds=7 * 86400) == {'objects': 0, 'jobs': 1}
+        cur.execute("select id from export_job where user_id = %s", (uid,))
+        assert [r[0] for r in cur.fetchall()] == [new]
+        # Files go by their own age, whatever the rows say
+        assert export_worker.expire(cur, bucket, ttl_seconds=-60) == {'objects': 1, 'jobs': 1}
+        keys = [o['Key'] for o in bucket.list_objects_v2(Bucket='weave-export-test')['Contents']]
+    assert keys == ['mem/x/kept.txt']
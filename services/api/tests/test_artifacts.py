@@ -0,0 +1,313 @@
+import asyncio
+import hashlib
+import os
+import uuid
+
+import boto3
+import pytest
+import requests
+from fastapi.testclient import TestClient
+from moto import mock_aws
+
+from services.api.app.main import app
+from services.api.app.routers import artifacts as artifacts_router
+from services.api.app.storage import s3 as s3_mod
+from services.api.app.workers import artifact_gc, artifact_verify, indexing
+
+
+BUCKET = 'weave-test'
+
+
+@pytest.fixture
+def bucket(monkeypatch):
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'test')
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'test')
+    monkeypatch.setattr(s3_mod, 'AWS_S3_BUCKET', BUCKET)
+    monkeypatch.setattr(s3_mod, 'S3_ENDPOINT_URL', None)
+    monkeypatch.setattr(s3_mod, 'S3_PART_BYTES', 5 * 1024 * 1024)
+    # Fresh shared client (built inside the mock) and URL cache for each test
+    monkeypatch.setattr(s3_mod, '_client', None)
+    monkeypatch.setattr(s3_mod, 'url_cache', s3_mod.PresignedUrlCache())
+    with mock_aws():
+        client = boto3.client('s3', region_name=s3_mod.AWS_REGION)
+        client.create_bucket(Bucket=BUCKET)
+        yield client
+
+
+def test_upload_streams_multipart_and_hashes_in_one_pass(bucket):
+    body = os.urandom(11 * 1024 * 1024 + 123)
+    with TestClient(app) as client:
+        headers = {'X-Debug-User': str(uuid.uuid4())}
+        mid = client.post('/v1/memories', json={'title': 'Photo', 'visibility': 'PRIVATE'}, headers=headers).json()['id']
+        r = client.post(
+            '/v1/artifacts/upload',
+            params={'memory_id': mid},
+            files={'file': ('big.bin', body, 'application/octet-stream')},
+            headers=headers,
+        )
+        assert r.status_code == 200
+        assert r.json()['bytes'] == len(body)
+
+    (obj,) = bucket.list_objects_v2(Bucket=BUCKET, Prefix=f'mem/{mid}/')['Contents']
+    assert obj['Key'].endswith('_big.bin')
+    # Multipart ETags are "<md5 of part md5s>-<part count>"
+    assert obj['ETag'].strip('"').endswith('-3')
+    stored = bucket.get_object(Bucket=BUCKET, Key=obj['Key'])['Body'].read()
+    assert hashlib.sha256(stored).hexdigest() == hashlib.sha256(body).hexdigest()
+
+
+def _keys(bucket):
+    return [o['Key'] for o in bucket.list_objects_v2(Bucket=BUCKET).get('Contents', [])]
+
+
+def test_duplicate_upload_keeps_one_object_and_known_hash_skips_transfer(bucket, monkeypatch):
+    body = b'same photo bytes'
+    digest = hashlib.sha256(body).hexdigest()
+    with TestClient(app) as client:
+        headers = {'X-Debug-User': str(uuid.uuid4())}
+        mid = client.post('/v1/memories', json={'title': 'Dup', 'visibility': 'PRIVATE'}, headers=headers).json()['id']
+        other = client.post('/v1/memories', json={'title': 'Other', 'visibility': 'PRIVATE'}, headers=headers).json()['id']
+        r = client.get('/v1/artifacts/lookup', params={'memory_id': mid, 'sha256': digest}, headers=headers)
+        assert r.status_code == 404
+
+        def upload(memory_id, **params):
+            return client.post(
+                '/v1/artifacts/upload',
+                params={'memory_id': memory_id, **params},
+                files={'file': ('a.jpg', body, 'image/jpeg')},
+                headers=headers,
+            )
+
+        first = upload(mid).json()
+        # Unhinted duplicate: uploaded, detected by hash, and its object removed again
+        assert upload(mid).json()['artifact_id'] == first['artifact_id']
+        assert len(_keys(bucket)) == 1
+        assert upload(other).status_code == 409
+        assert len(_keys(bucket)) == 1
+
+        r = client.get('/v1/artifacts/lookup', params={'memory_id': mid, 'sha256': digest.upper()}, headers=headers)
+        assert r.status_code == 200 and r.json()['artifact_id'] == first['artifact_id']
+
+        async def no_transfer(*args, **kwargs):
+            raise AssertionError('known hash must not be uploaded')
+
+        with monkeypatch.context() as m:
+            m.setattr(artifacts_router, 'upload_stream', no_transfer)
+            assert upload(mid, sha256=digest).json()['artifact_id'] == first['artifact_id']
+
+        r = upload(mid, sha256='0' * 64)
+        assert r.status_code == 400
+        assert len(_keys(bucket)) == 1
+
+
+def test_artifact_gc_deletes_only_unreferenced_objects(bucket):
+    with TestClient(app) as client:
+        headers = {'X-Debug-User': str(uuid.uuid4())}
+        mid = client.post('/v1/memories', json={'title': 'GC', 'visibility': 'PRIVATE'}, headers=headers).json()['id']
+        r = client.post(
+            '/v1/artifacts/upload',
+            params={'memory_id': mid},
+            files={'file': ('kept.txt', uuid.uuid4().bytes, 'text/plain')},
+            headers=headers,
+        )
+        assert r.status_code == 200
+    (kept,) = _keys(bucket)
+    bucket.put_object(Bucket=BUCKET, Key=f'mem/{mid}/orphan.txt', Body=b'x' * 10)
+    bucket.put_object(Bucket=BUCKET, Key='exports/not-an-artifact.zip', Body=b'zip')
+
+    with indexing.get_conn(autocommit=True) as conn, conn.cursor() as cur:
+        # Everything is brand new, so the default grace period protects it all
+        assert artifact_gc.sweep(cur, bucket)['deleted'] == 0
+        bucket.create_multipart_upload(Bucket=BUCKET, Key=f'mem/{mid}/abandoned.bin')
+        stats = artifact_gc.sweep(cur, bucket, grace_seconds=-60, dry_run=True)
+        assert stats['deleted'] == 1 and len(_keys(bucket)) == 3
+        stats = artifact_gc.sweep(cur, bucket, grace_seconds=-60)
+    assert stats['deleted'] == 1 and stats['deleted_bytes'] == 10 and stats['aborted_uploads'] == 1
+    assert sorted(_keys(bucket)) == sorted([kept, 'exports/not-an-artifact.zip'])
+    assert bucket.list_multipart_uploads(Bucket=BUCKET).get('Uploads', []) == []
+
+
+def _direct_upload(client, headers, mid, body, **overrides):
+    init = {
+        'memory_id': mid,
+        'filename': 'clip.mp4',
+        'content_type': 'video/mp4',
+        'bytes': len(body),
+        'sha256': hashlib.sha256(body).hexdigest(),
+        **overrides,
+    }
+    r = client.post('/v1/artifacts/uploads', json=init, headers=headers)
+    assert r.status_code == 200
+    up = r.json()
+    size = up.get('part_bytes')
+    for part in up['parts']:
+        n = part['part_number']
+        # Straight to storage, as a browser would; the API never sees these bytes
+        assert requests.put(part['url'], data=body[(n - 1) * size:n * size]).status_code == 200
+    return up
+
+
+def _run_verify_worker(client) -> int:
+    """Drain the verify queue on the app's event loop (the pooled connections belong to it)."""
+
+    async def drain():
+        n = 0
+        while await artifact_verify.process_one():
+            n += 1
+        return n
+
+    return client.portal.call(drain)
+
+
+def test_direct_upload_verifies_and_creates_artifact(bucket):
+    body = os.urandom(11 * 1024 * 1024)
+    with TestClient(app) as client:
+        headers = {'X-Debug-User': str(uuid.uuid4())}
+        mid = client.post('/v1/memories', json={'title': 'Video', 'visibility': 'PRIVATE'}, headers=headers).json()['id']
+        up = _direct_upload(client, headers, mid, body)
+        assert len(up['parts']) == 2 and up['artifact'] is None
+        url = f"/v1/artifacts/uploads/{up['upload_id']}"
+        r = client.post(f'{url}/complete', headers=headers)
+        # Hashing is the worker's job; the request only assembles the parts
+        assert r.status_code == 202 and r.json()['status'] == 'VERIFYING'
+        assert client.get(url, headers=headers).json()['status'] == 'VERIFYING'
+        # A retried complete just reports the state
+        assert client.post(f'{url}/complete', headers=headers).json()['status'] == 'VERIFYING'
+        assert client.delete(url, headers=headers).status_code == 409
+
+        assert _run_verify_worker(client) >= 1
+        r = client.get(url, headers=headers).json()
+        assert r['status'] == 'DONE' and r['error'] is None
+        art = r['artifact']
+        assert art['bytes'] == len(body) and art['mime'] == 'video/mp4'
+        assert client.post(f'{url}/complete', headers=headers).json()['artifact'] == art
+
+        # Same content again: answered at initiate time, nothing to upload
+        again = client.post('/v1/artifacts/uploads', json={
+            'memory_id': mid, 'filename': 'copy.mp4', 'bytes': len(body), 'sha256': hashlib.sha256(body).hexdigest(),
+        }, headers=headers).json()
+        assert again['upload_id'] is None and again['artifact']['artifact_id'] == art['artifact_id']
+    (obj,) = bucket.list_objects_v2(Bucket=BUCKET)['Contents']
+    assert obj['Size'] == len(body)
+
+
+def test_direct_upload_rejects_content_that_does_not_match(bucket):
+    with TestClient(app) as client:
+        headers = {'X-Debug-User': str(uuid.uuid4())}
+        mid = client.post('/v1/memories', json={'title': 'Bad', 'visibility': 'PRIVATE'}, headers=headers).json()['id']
+        up = _direct_upload(client, headers, mid, b'actual bytes', sha256=hashlib.sha256(b'claimed').hexdigest())
+        url = f"/v1/artifacts/uploads/{up['upload_id']}"
+        assert client.post(f'{url}/complete', headers=headers).status_code == 202
+        assert _run_verify_worker(client) >= 1
+        r = client.get(url, headers=headers).json()
+        assert r['status'] == 'FAILED' and 'sha256' in r['error'] and r['artifact'] is None
+
+        up = _direct_upload(client, headers, mid, b'short', bytes=6)
+        r = client.post(f"/v1/artifacts/uploads/{up['upload_id']}/complete", headers=headers)
+        assert r.status_code == 400 and 'size' in r.json()['detail']
+        assert client.get(f"/v1/artifacts/uploads/{up['upload_id']}", headers=headers).json()['status'] == 'FAILED'
+
+        up = _direct_upload(client, headers, mid, b'abandoned')
+        assert client.delete(f"/v1/artifacts/uploads/{up['upload_id']}", headers=headers).json() == {'ok': True}
+        assert client.post(f"/v1/artifacts/uploads/{up['upload_id']}/complete", headers=headers).status_code == 404
+    assert 'Contents' not in bucket.list_objects_v2(Bucket=BUCKET)
+    assert bucket.list_multipart_uploads(Bucket=BUCKET).get('Uploads', []) == []
+
+
+def test_artifact_gc_keeps_uploads_waiting_for_verification(bucket):
+    with TestClient(app) as client:
+        headers = {'X-Debug-User': str(uuid.uuid4())}
+        mid = client.post('/v1/memories', json={'title': 'Slow', 'visibility': 'PRIVATE'}, headers=headers).json()['id']
+        up = _direct_upload(client, headers, mid, b'not hashed yet')
+        url = f"/v1/artifacts/uploads/{up['upload_id']}"
+        assert client.post(f'{url}/complete', headers=headers).status_code == 202
+
+        with indexing.get_conn(autocommit=True) as conn, conn.cursor() as cur:
+            stats = artifact_gc.sweep(cur, bucket, grace_seconds=-60)
+        assert stats['deleted'] == 0 and len(_keys(bucket)) == 1
+        assert client.get(url, headers=headers).json()['status'] == 'VERIFYING'
+
+        assert _run_verify_worker(client) >= 1
+        assert client.get(url, headers=headers).json()['status'] == 'DONE'
+
+
+def test_upload_stream_small_body_is_a_single_put(bucket):
+    async def chunks():
+        yield b'hello '
+        yield b'world'
+
+    assert asyncio.run(s3_mod.upload_stream('small.txt', chunks(), content_type='text/plain')) == 11
+    obj = bucket.get_object(Bucket=BUCKET, Key='small.txt')
+    assert obj['Body'].read() == b'hello world'
+    assert obj['ContentType'] == 'text/plain'
+
+
+def test_upload_stream_aborts_multipart_on_error(bucket):
+    async def chunks():
+        yield os.urandom(6 * 1024 * 1024)
+        raise ConnectionResetError('client went away')
+
+    with pytest.raises(ConnectionResetError):
+        asyncio.run(s3_mod.upload_stream('broken.bin', chunks()))
+    assert bucket.list_multipart_uploads(Bucket=BUCKET).get('Uploads', []) == []
+    assert 'Contents' not in bucket.list_objects_v2(Bucket=BUCKET)
+
+
+def test_presigned_urls_are_reused_until_close_to_expiry(monkeypatch):
+    signed = []
+
+    def sign(key, ttl):
+        signed.append((key, ttl))
+        return f'https://s3/{key}?ttl={ttl}&n={len(signed)}'
+
+    now = [1_000_000.0]
+    monkeypatch.setattr(s3_mod.time, 'time', lambda: now[0])
+    cache = s3_mod.PresignedUrlCache(reuse_fraction=0.25)
+
+    url, expires_in = cache.get_or_sign('mem/a', 3600, sign)
+    assert signed == [('mem/a', 4500)] and expires_in == 4500
+    # Same bucket (<= 1h) and still valid for what was asked: no new signature
+    assert cache.get_or_sign('mem/a', 3000, sign)[0] == url
+    now[0] += 800
+    assert cache.get_or_sign('mem/a', 3600, sign) == (url, 3700)
+    # Less than the requested TTL left: re-sign
+    now[0] += 200
+    assert cache.get_or_sign('mem/a', 3600, sign)[0] != url
+    assert len(signed) == 2
+    # Different key or TTL bucket never shares a URL
+    cache.get_or_sign('mem/b', 3600, sign)
+    cache.get_or_sign('mem/a', 86400, sign)
+    assert len(signed) == 4
+    assert cache.stats()['hits'] == 2
+
+    # Long TTLs: the top bucket still leaves reuse headroom under the 7-day cap ...
+    url, expires_in = cache.get_or_sign('mem/a', 2 * 86400, sign)
+    assert expires_in > 3 * 86400 and cache.get_or_sign('mem/a', 2 * 86400, sign)[0] == url
+    # ... and past it URLs are signed as asked without churning the cache
+    size = cache.stats()['size']
+    assert cache.get_or_sign('mem/a', 7 * 86400, sign)[1] == 7 * 86400
+    assert cache.stats()['size'] == size and cache.stats()['uncached'] == 1
+
+
+def test_memory_detail_includes_cached_artifact_urls(bucket):
+    with TestClient(app) as client:
+        headers = {'X-Debug-User': str(uuid.uuid4())}
+        mid = client.post('/v1/memories', json={'title': 'Media', 'visibility': 'PRIVATE'}, headers=headers).json()['id']
+        art = client.post(
+            '/v1/artifacts/upload',
+            params={'memory_id': mid},
+            files={'file': ('p.png', b'png bytes', 'image/png')},
+            headers=headers,
+        ).json()
+        r = client.post(
+            f'/v1/memories/{mid}/layers', json={'kind': 'IMAGE', 'artifact_id': art['artifact_id']}, headers=headers
+        )
+        assert r.status_code == 200
+
+        urls = []
+        for _ in range(2):
+            (layer,) = client.get(f'/v1/memories/{mid}', headers=headers).json()['layers']
+            assert 'storage_key' not in layer['artifact']
+            urls.append(layer['artifact']['url'])
+        assert urls[0] == urls[1] == art['url']
+        assert s3_mod.url_cache.stats()['misses'] == 1
@@ -0,0 +1,131 @@
+import asyncio
+import threading
+import time
+import uuid
+
+import jwt
+import pytest
+from fastapi import HTTPException
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jwt.algorithms import RSAAlgorithm
+
+from services.api.app import deps
+from services.api.app.auth import jwt as jwt_auth
+from services.api.app.auth.jwt import JwksRefresher, VerifiedTokenCache, verify_bearer
+
+ISSUER = 'https://auth.test/'
+JWKS_URL = 'https://auth.test/jwks.json'
+
+
+def _keypair(kid):
+    private = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    jwk = RSAAlgorithm.to_jwk(private.public_key(), as_dict=True) | {'kid': kid, 'alg': 'RS256', 'use': 'sig'}
+    return private, jwk
+
+
+def _token(private, kid, sub, exp_in=300):
+    now = int(time.time())
+    claims = {'sub': str(sub), 'iss': ISSUER, 'aud': 'weave', 'iat': now, 'exp': now + exp_in}
+    return 'Bearer ' + jwt.encode(claims, private, algorithm='RS256', headers={'kid': kid})
+
+
+@pytest.fixture
+def idp(monkeypatch):
+    monkeypatch.setenv('JWT_AUDIENCE', 'weave')
+    monkeypatch.setenv('JWT_ISSUER', ISSUER)
+    monkeypatch.setenv('JWT_JWKS_URL', JWKS_URL)
+    keys = {'keys': []}
+    fetched = []
+
+    def fetch(url):
+        fetched.append(url)
+        return keys
+
+    refresher = JwksRefresher(JWKS_URL, fetch=fetch)
+    # No background thread in tests; refresh() is called explicitly
+    monkeypatch.setattr(refresher, 'start', lambda: None)
+    monkeypatch.setattr(jwt_auth, '_refresher', refresher)
+    monkeypatch.setattr(jwt_auth, 'claims_cache', VerifiedTokenCache(max_entries=2))
+    return refresher, keys, fetched
+
+
+def test_verified_tokens_are_cached_until_exp(idp, monkeypatch):
+    refresher, keys, _ = idp
+    private, jwk = _keypair('k1')
+    keys['keys'].append(jwk)
+    refresher.refresh()
+    sub = uuid.uuid4()
+    token = _token(private, 'k1', sub)
+
+    assert verify_bearer(token) == sub
+    decodes = []
+    monkeypatch.setattr(jwt_auth.jwt, 'decode', lambda *a, **kw: decodes.append(1))
+    assert verify_bearer(token) == sub
+    assert decodes == []
+    assert jwt_auth.claims_cache.stats() == {'size': 1, 'hits': 1, 'misses': 1}
+
+    # Cached entries end at the token's own exp
+    monkeypatch.setattr(jwt_auth.time, 'time', lambda: time.time_ns() / 1e9 + 3600)
+    assert verify_bearer(token) is None
+
+
+def test_unknown_kid_is_rejected_without_fetching_inline(idp):
+    refresher, keys, fetched = idp
+    private, jwk = _keypair('new')
+    sub = uuid.uuid4()
+    token = _token(private, 'new', sub)
+
+    assert verify_bearer(token) is None
+    assert fetched == [] and refresher._wake.is_set()
+    # The refresher picks the rotated key up in the background
+    keys['keys'].append(jwk)
+    refresher.refresh()
+    assert verify_bearer(token) == sub
+
+
+def test_bad_signature_is_not_cached(idp):
+    refresher, keys, _ = idp
+    _, jwk = _keypair('k1')
+    other, _ = _keypair('k1')
+    keys['keys'].append(jwk)
+    refresher.refresh()
+    token = _token(other, 'k1', uuid.uuid4())
+    assert verify_bearer(token) is None
+    assert verify_bearer(token) is None
+    assert jwt_auth.claims_cache.stats()['size'] == 0
+
+
+def test_failed_refresh_keeps_current_keys(idp):
+    refresher, keys, _ = idp
+    private, jwk = _keypair('k1')
+    keys['keys'].append(jwk)
+    refresher.refresh()
+    refresher.fetch = lambda url: (_ for _ in ()).throw(OSError('IdP down'))
+    refresher.refresh()
+    assert refresher.stats() == {'keys': 1, 'fetches': 2, 'errors': 1}
+    sub = uuid.uuid4()
+    assert verify_bearer(_token(private, 'k1', sub)) == sub
+
+
+def test_request_auth_waits_for_rotated_key(idp):
+    refresher, keys, fetched = idp
+    private, jwk = _keypair('rotated')
+    sub = uuid.uuid4()
+    token = _token(private, 'rotated', sub)
+
+    def idp_publishes_key():
+        time.sleep(0.1)
+        keys['keys'].append(jwk)
+        refresher.refresh()
+
+    threading.Thread(target=idp_publishes_key).start()
+    assert asyncio.run(deps.get_user_id(authorization=token, x_debug_user=None)) == sub
+    assert len(fetched) == 1
+
+
+def test_unverifiable_token_is_401_not_an_anonymous_user(idp, monkeypatch):
+    monkeypatch.setattr(deps, 'JWKS_MISS_WAIT_SECONDS', 0.05)
+    private, _ = _keypair('never-published')
+    with pytest.raises(HTTPException) as e:
+        asyncio.run(deps.get_user_id(authorization=_token(private, 'never-published', uuid.uuid4()), x_debug_user=None))
+    assert e.value.status_code == 401
@@ -0,0 +1,25 @@
+import asyncio
+from pathlib import Path
+
+# The bench harnesses import the app as top-level ``app`` from services/api
+API_DIR = Path(__file__).resolve().parents[1]
+
+
+def test_search_bench_runs_past_the_rate_limit_budget(monkeypatch):
+    monkeypatch.syspath_prepend(str(API_DIR))
+    from app.middleware import rate_limit
+    from app.routers import search as search_router
+    from bench.search.__main__ import run_tiers
+    from bench.search.embedder import HashEmbedder
+
+    # More searches than one caller's default budget allows
+    limiter = rate_limit.TokenBucketLimiter(rate_limit.MemoryBackend())
+    n = int(limiter.capacity / limiter.cost('/v1/search/associative')) + 5
+    queries = [f'bench query {i}' for i in range(n)]
+
+    query_embedding = search_router._query_embedding
+    monkeypatch.setattr(rate_limit, 'limiter', limiter)
+    runs = asyncio.run(run_tiers(queries, HashEmbedder(), 5, ['fast'], warmup=2))
+    assert len(runs['fast']['latencies']) == n
+    # Nothing it patched leaks into later tests
+    assert search_router._query_embedding is query_embedding and rate_limit.limiter is limiter
@@ -0,0 +1,54 @@
+import uuid
+
+from fastapi.testclient import TestClient
+from services.api.app.main import app
+from services.api.app.embeddings import cache as cache_mod
+from services.api.app.embeddings.cache import QueryEmbeddingCache, cache_key, normalize_query
+from services.api.app.routers import search as search_router
+
+
+def test_lru_evicts_oldest_and_expires(monkeypatch):
+    c = QueryEmbeddingCache(maxsize=2, ttl_seconds=10)
+    c.put('a', [1.0])
+    c.put('b', [2.0])
+    assert c.get('a') == [1.0]  # 'a' becomes most recent
+    c.put('c', [3.0])
+    assert c.get('b') is None
+    assert c.get('a') == [1.0]
+    assert c.evictions == 1
+
+    now = cache_mod.time.monotonic()
+    monkeypatch.setattr(cache_mod.time, 'monotonic', lambda: now + 11)
+    assert c.get('a') is None
+
+
+def test_key_normalizes_query_and_includes_model():
+    assert normalize_query('  Cedar   POINT ') == 'cedar point'
+    k = cache_key('cedar point', 'm1', 1536)
+    assert k == cache_key(normalize_query('Cedar Point'), 'm1', 1536)
+    assert k != cache_key('cedar point', 'm2', 1536)
+    assert k != cache_key('cedar point', 'm1', 768)
+
+
+def test_search_reuses_cached_query_embedding(monkeypatch):
+    calls = []
+
+    def fake_embed(text_in):
+        calls.append(text_in)
+        return [0.5] * 1536
+
+    monkeypatch.setattr(search_router, '_embed', fake_embed)
+    monkeypatch.setattr(search_router, 'query_cache', QueryEmbeddingCache())
+    q = f'cache probe {uuid.uuid4()}'
+    with TestClient(app) as client:
+        headers = {'X-Debug-User': str(uuid.uuid4())}
+        assert client.get('/v1/search/associative', params={'q': q}, headers=headers).status_code == 200
+        assert client.get('/v1/search/associative', params={'q': q.upper()}, headers=headers).status_code == 200
+        assert len(calls) == 1
+        assert search_router.query_cache.local_hits == 1
+
+        # Fresh process-local tier: served from the shared table
+        monkeypatch.setattr(search_router, 'query_cache', QueryEmbeddingCache())
+        assert client.get('/v1/search/associative', params={'q': q}, headers=headers).status_code == 200
+        assert len(calls) == 1
+        assert search_router.query_cache.shared_hits == 1
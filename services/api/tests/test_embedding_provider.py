@@ -0,0 +1,100 @@
+from types import SimpleNamespace
+
+import httpx
+import openai
+import pytest
+
+from services.api.app.embeddings import provider as provider_mod
+from services.api.app.embeddings.provider import (
+    CircuitBreaker,
+    EmbeddingError,
+    EmbeddingProvider,
+    EmbeddingRejected,
+)
+
+REQUEST = httpx.Request('POST', 'https://api.openai.com/v1/embeddings')
+
+
+class FakeEmbeddings:
+    def __init__(self, failures=0, reject=None):
+        self.failures = failures
+        self.reject = reject
+        self.calls = []
+
+    def create(self, model, input):
+        self.calls.append(list(input))
+        if self.failures:
+            self.failures -= 1
+            raise openai.APIConnectionError(request=REQUEST)
+        if self.reject and any(self.reject in t for t in input):
+            raise openai.BadRequestError(
+                'maximum context length exceeded', response=httpx.Response(400, request=REQUEST), body=None
+            )
+        data = [SimpleNamespace(index=i, embedding=[float(len(t))] * 4) for i, t in enumerate(input)]
+        return SimpleNamespace(data=list(reversed(data)))
+
+
+def _provider(fake, **kw):
+    return EmbeddingProvider(api_key='sk-test', dim=4, client=SimpleNamespace(embeddings=fake), **kw)
+
+
+def test_embed_many_batches_inputs_and_keeps_order():
+    fake = FakeEmbeddings()
+    p = _provider(fake, batch_size=2)
+    vecs = p.embed_many(['a', 'bb', '  ', 'ccc'])
+    assert fake.calls == [['a', 'bb'], ['ccc']]
+    assert [v[0] for v in vecs] == [1.0, 2.0, 0.0, 3.0]
+
+
+def test_retries_then_opens_breaker(monkeypatch):
+    monkeypatch.setattr(provider_mod.time, 'sleep', lambda s: None)
+    fake = FakeEmbeddings(failures=1)
+    p = _provider(fake, max_retries=2, breaker=CircuitBreaker(threshold=1, cooldown=60))
+    assert p.embed('x') == [1.0] * 4
+    assert len(fake.calls) == 2
+
+    fake.failures = 10
+    with pytest.raises(EmbeddingError):
+        p.embed('x')
+    assert p.breaker.state == 'open'
+    calls = len(fake.calls)
+    with pytest.raises(EmbeddingError):
+        p.embed('x')
+    assert len(fake.calls) == calls  # short-circuited
+
+
+def test_no_api_key_returns_zero_vectors():
+    p = EmbeddingProvider(api_key=None, dim=3)
+    assert p.embed_many(['a', 'b']) == [[0.0] * 3, [0.0] * 3]
+
+
+def test_rejected_input_is_isolated_and_does_not_trip_breaker():
+    fake = FakeEmbeddings(reject='poison')
+    p = _provider(fake, batch_size=3, breaker=CircuitBreaker(threshold=1, cooldown=60))
+    rejected = {}
+    vecs = p.embed_many(['a', 'poison', 'ccc'], rejected=rejected)
+    # The batch fails, then each input is sent alone
+    assert fake.calls == [['a', 'poison', 'ccc'], ['a'], ['poison'], ['ccc']]
+    assert [v[0] for v in vecs] == [1.0, 0.0, 3.0]
+    assert list(rejected) == [1] and 'maximum context length' in rejected[1]
+    assert p.breaker.state == 'closed'
+
+    with pytest.raises(EmbeddingRejected):
+        p.embed('poison')
+    assert p.breaker.state == 'closed'
+
+
+def test_inputs_are_truncated_to_the_model_limit(monkeypatch):
+    monkeypatch.setattr(provider_mod, 'MAX_INPUT_CHARS', 5)
+    fake = FakeEmbeddings()
+    assert _provider(fake).embed('x' * 100) == [5.0] * 4
+    assert fake.calls == [['x' * 5]]
+
+
+def test_query_provider_fails_fast(monkeypatch):
+    monkeypatch.setattr(provider_mod, '_query_provider', None)
+    q = provider_mod.get_query_provider()
+    assert q is provider_mod.get_query_provider() and q is not provider_mod.get_provider()
+    assert q.max_retries == provider_mod.QUERY_MAX_RETRIES <= 1
+    assert q.timeout == provider_mod.QUERY_TIMEOUT_SECONDS < provider_mod.TIMEOUT_SECONDS
+    assert q.breaker is not provider_mod.get_provider().breaker
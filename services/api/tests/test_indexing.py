@@ -0,0 +1,131 @@
+import uuid
+from types import SimpleNamespace
+
+import httpx
+import openai
+
+from services.api.app.embeddings.provider import EMBEDDING_DIM, EmbeddingProvider
+from services.api.app.workers import indexing
+
+
+def test_process_batch_coalesces_events_per_memory():
+    # Requires DATABASE_URL pointing to test Postgres (CI provides)
+    with indexing.get_conn() as conn, conn.cursor() as cur:
+        uid, mid = uuid.uuid4(), uuid.uuid4()
+        cur.execute("insert into app_user (id, handle) values (%s, %s)", (uid, f'idx-{uid.hex[:8]}'))
+        cur.execute(
+            "insert into memory (id, owner_id, visibility, title) values (%s, %s, 'PRIVATE', 'Coalesce me')",
+            (mid, uid),
+        )
+        for _ in range(4):
+            cur.execute("insert into memory_event (memory_id, kind) values (%s, 'INDEX_MEMORY')", (mid,))
+        conn.commit()
+
+        consumed = 0
+        while True:
+            n = indexing.process_batch(cur, limit=1000)
+            conn.commit()
+            if not n:
+                break
+            consumed += n
+
+        assert consumed >= 4
+        cur.execute("select count(*) from memory_event where memory_id = %s", (mid,))
+        assert cur.fetchone()[0] == 0
+        cur.execute("select tsv is not null, embedding is not null from memory where id = %s", (mid,))
+        assert cur.fetchone() == (True, True)
+
+
+def test_process_batch_only_claims_own_partition():
+    with indexing.get_conn() as conn, conn.cursor() as cur:
+        uid, mid = uuid.uuid4(), uuid.uuid4()
+        cur.execute("insert into app_user (id, handle) values (%s, %s)", (uid, f'idx-{uid.hex[:8]}'))
+        cur.execute("insert into memory (id, owner_id, visibility) values (%s, %s, 'PRIVATE')", (mid, uid))
+        cur.execute("insert into memory_event (memory_id, kind) values (%s, 'INDEX_MEMORY')", (mid,))
+        cur.execute("select mod(hashtext(%s::text) & 2147483647, 2)", (str(mid),))
+        owner = cur.fetchone()[0]
+        conn.commit()
+
+        while indexing.process_batch(cur, limit=1000, partition=(1 - owner, 2)):
+            conn.commit()
+        conn.commit()
+        cur.execute("select count(*) from memory_event where memory_id = %s", (mid,))
+        assert cur.fetchone()[0] == 1
+
+        while indexing.process_batch(cur, limit=1000, partition=(owner, 2)):
+            conn.commit()
+        conn.commit()
+        cur.execute("select count(*) from memory_event where memory_id = %s", (mid,))
+        assert cur.fetchone()[0] == 0
+
+
+def test_process_batch_skips_unchanged_document(monkeypatch):
+    with indexing.get_conn() as conn, conn.cursor() as cur:
+        uid, mid = uuid.uuid4(), uuid.uuid4()
+        cur.execute("insert into app_user (id, handle) values (%s, %s)", (uid, f'idx-{uid.hex[:8]}'))
+        cur.execute("insert into memory (id, owner_id, visibility, title) values (%s, %s, 'PRIVATE', 'Hash me')", (mid, uid))
+        cur.execute("insert into memory_event (memory_id, kind) values (%s, 'INDEX_MEMORY')", (mid,))
+        conn.commit()
+        while indexing.process_batch(cur, limit=1000):
+            conn.commit()
+        conn.commit()
+        cur.execute("select doc_hash is not null, embedding_model from memory where id = %s", (mid,))
+        assert cur.fetchone() == (True, indexing.get_provider().signature)
+
+        embedded = []
+        real_embed_many = indexing.get_provider().embed_many
+        monkeypatch.setattr(
+            indexing.get_provider(), 'embed_many', lambda docs, **kw: embedded.extend(docs) or real_embed_many(docs, **kw)
+        )
+        skipped_before = indexing.STATS['skipped']
+        cur.execute("insert into memory_event (memory_id, kind) values (%s, 'INDEX_MEMORY')", (mid,))
+        conn.commit()
+        while indexing.process_batch(cur, limit=1000):
+            conn.commit()
+        conn.commit()
+        assert 'Hash me' not in ' '.join(embedded)
+        assert indexing.STATS['skipped'] > skipped_before
+
+
+class _RejectingEmbeddings:
+    """Embeds everything except documents containing ``marker``, which get a 400."""
+
+    def __init__(self, marker):
+        self.marker = marker
+
+    def create(self, model, input):
+        if any(self.marker in t for t in input):
+            request = httpx.Request('POST', 'https://api.openai.com/v1/embeddings')
+            raise openai.BadRequestError('too long', response=httpx.Response(400, request=request), body=None)
+        return SimpleNamespace(data=[SimpleNamespace(index=i, embedding=[1.0] * EMBEDDING_DIM) for i in range(len(input))])
+
+
+def test_process_batch_dead_letters_rejected_document(monkeypatch):
+    marker = uuid.uuid4().hex
+    provider = EmbeddingProvider(api_key='sk-test', client=SimpleNamespace(embeddings=_RejectingEmbeddings(marker)))
+    monkeypatch.setattr(indexing, 'get_provider', lambda: provider)
+    with indexing.get_conn() as conn, conn.cursor() as cur:
+        uid, bad, good = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+        cur.execute("insert into app_user (id, handle) values (%s, %s)", (uid, f'idx-{uid.hex[:8]}'))
+        cur.execute(
+            "insert into memory (id, owner_id, visibility, title) values (%s, %s, 'PRIVATE', %s), (%s, %s, 'PRIVATE', 'Fine')",
+            (bad, uid, f'Poison {marker}', good, uid),
+        )
+        cur.execute(
+            "insert into memory_event (memory_id, kind) values (%s, 'INDEX_MEMORY'), (%s, 'INDEX_MEMORY')", (bad, good)
+        )
+        conn.commit()
+
+        while indexing.process_batch(cur, limit=1000):
+            conn.commit()
+        conn.commit()
+        # The good memory commits; the bad one keeps a failed event that is never claimed again
+        cur.execute("select embedding_model from memory where id = %s", (good,))
+        assert cur.fetchone()[0] == provider.signature
+        cur.execute("select tsv is not null, embedding_model from memory where id = %s", (bad,))
+        assert cur.fetchone() == (True, None)
+        cur.execute("select failed_at is not null, last_error from memory_event where memory_id = %s", (bad,))
+        (failed, error), = cur.fetchall()
+        assert failed and 'too long' in error
+        assert indexing.process_batch(cur, limit=1000) == 0
+        conn.rollback()
@@ -0,0 +1,72 @@
+import uuid
+
+import numpy as np
+from fastapi.testclient import TestClient
+
+from services.api.app.main import app
+from services.api.app.workers import indexing, layout
+
+
+def test_force_layout_pulls_edges_together_and_keeps_fixed_nodes():
+    pos = np.array([[0.0, 0.0], [2000.0, 0.0], [5.0, 5.0]])
+    edges = np.array([[0, 1]])
+    movable = np.array([False, True, True])
+    out = layout.force_layout(pos, edges, np.array([1.0]), movable, iterations=200, temperature=500)
+    assert (out[0] == pos[0]).all()
+    # Connected node is pulled in, the unconnected one is pushed off the fixed node
+    assert np.linalg.norm(out[1] - out[0]) < 1000
+    assert np.linalg.norm(out[2] - out[0]) > 50
+
+
+def _drain():
+    with indexing.get_conn() as conn, conn.cursor() as cur:
+        while layout.process_batch(cur):
+            conn.commit()
+        conn.commit()
+
+
+def test_graph_returns_cached_positions_and_relayout_is_local():
+    with TestClient(app) as client:
+        headers = {'X-Debug-User': str(uuid.uuid4())}
+        chain = [client.post('/v1/memories', json={'title': f'Layout {i}'}, headers=headers).json()['id'] for i in range(5)]
+        for a, b in zip(chain, chain[1:]):
+            client.post('/v1/weaves', json={'a_id': a, 'b_id': b, 'relation': 'THEME'}, headers=headers)
+        _drain()
+
+        nodes = {n['id']: n for n in client.get('/v1/graph', headers=headers).json()['nodes']}
+        assert all(nodes[m]['x'] is not None and nodes[m]['y'] is not None for m in chain)
+
+        # A new memory woven to the head of the chain only moves cards within two hops of it
+        new = client.post('/v1/memories', json={'title': 'Layout new'}, headers=headers).json()['id']
+        client.post('/v1/weaves', json={'a_id': new, 'b_id': chain[0], 'relation': 'THEME'}, headers=headers)
+        _drain()
+
+        after = {n['id']: n for n in client.get('/v1/graph', headers=headers).json()['nodes']}
+        assert after[new]['x'] is not None
+        for far in chain[3:]:
+            assert (after[far]['x'], after[far]['y']) == (nodes[far]['x'], nodes[far]['y'])
+
+
+def test_shared_memory_is_placed_on_new_participants_canvas():
+    with TestClient(app) as client:
+        owner = {'X-Debug-User': str(uuid.uuid4())}
+        invitee, added = str(uuid.uuid4()), str(uuid.uuid4())
+        for uid in (invitee, added):
+            # Both need an account to be participants
+            client.post('/v1/memories', json={'title': 'Own'}, headers={'X-Debug-User': uid})
+        mid = client.post('/v1/memories', json={'title': 'Shared'}, headers=owner).json()['id']
+        _drain()
+
+        token = client.post('/v1/invites', params={'memory_id': mid, 'role': 'VIEWER'}, headers=owner).json()['invite_id']
+        assert client.post(f'/v1/invites/{token}/accept', headers={'X-Debug-User': invitee}).status_code == 200
+        r = client.post(
+            f'/v1/memories/{mid}/permissions',
+            json={'visibility': 'SHARED', 'participants': [{'user_id': added, 'role': 'CONTRIBUTOR'}]},
+            headers=owner,
+        )
+        assert r.status_code == 200
+        _drain()
+
+        for uid in (invitee, added):
+            nodes = {n['id']: n for n in client.get('/v1/graph', headers={'X-Debug-User': uid}).json()['nodes']}
+            assert nodes[mid]['x'] is not None and nodes[mid]['y'] is not None
@@ -0,0 +1,49 @@
+import uuid
+
+from fastapi.testclient import TestClient
+
+from services.api.app import main, metrics
+from services.api.app.main import app
+from services.api.app.metrics import Histogram
+
+
+def test_histogram_renders_cumulative_buckets():
+    h = Histogram('t_seconds', 'test', ('route',), buckets=(0.1, 1))
+    for v in (0.05, 0.5, 0.5, 3):
+        h.observe('/a', value=v)
+    lines = h.collect()
+    assert 't_seconds_bucket{route="/a",le="0.1"} 1' in lines
+    assert 't_seconds_bucket{route="/a",le="1"} 3' in lines
+    assert 't_seconds_bucket{route="/a",le="+Inf"} 4' in lines
+    assert 't_seconds_sum{route="/a"} 4.05' in lines
+    assert 't_seconds_count{route="/a"} 4' in lines
+
+
+def test_requests_are_labelled_by_route_template():
+    route = '/v1/memories/{mid}'
+    before = metrics.http_requests.value('GET', route, 404)
+    count_before = metrics.http_latency.count('GET', route)
+    with TestClient(app) as client:
+        headers = {'X-Debug-User': str(uuid.uuid4())}
+        for _ in range(2):
+            assert client.get(f'/v1/memories/{uuid.uuid4()}', headers=headers).status_code == 404
+        client.get('/no/such/path', headers=headers)
+        r = client.get('/metrics')
+    assert r.status_code == 200
+    assert r.headers['content-type'].startswith('text/plain')
+    assert metrics.http_requests.value('GET', route, 404) == before + 2
+    assert metrics.http_latency.count('GET', route) == count_before + 2
+    body = r.text
+    assert '# TYPE weave_http_request_duration_seconds histogram' in body
+    assert f'weave_http_requests_total{{method="GET",route="{route}",status="404"}}' in body
+    assert 'route="unmatched"' in body
+    assert '/v1/memories/' + '0' not in body
+    # The scrape itself is still in flight while it renders
+    assert 'weave_http_requests_in_flight{method="GET"} 1' in body
+
+
+def test_metrics_token(monkeypatch):
+    monkeypatch.setattr(main, 'METRICS_TOKEN', 'secret')
+    with TestClient(app) as client:
+        assert client.get('/metrics').status_code == 401
+        assert client.get('/metrics', headers={'Authorization': 'Bearer secret'}).status_code == 200
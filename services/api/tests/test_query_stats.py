@@ -0,0 +1,68 @@
+import asyncio
+import uuid
+
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+
+from services.api.app.db import instrument
+from services.api.app.db.instrument import QueryStats, count_queries, normalize_sql
+from services.api.app.db.session import engine, get_db_with_rls
+from services.api.app.main import app
+
+
+def test_normalize_sql():
+    sql = "select x::text from t\n where a in (1, 2, 3) and b = 'it''s' and c = $1 limit 10"
+    assert normalize_sql(sql) == 'select x::text from t where a in (...) and b = ? and c = ? limit ?'
+
+
+def test_repeated_statements_are_flagged():
+    stats = QueryStats()
+    for _ in range(12):
+        stats.add('select * from memory_layer where memory_id = $1', 0.001)
+    stats.add('select 1', 0.001)
+    assert stats.repeated(threshold=10) == [('select * from memory_layer where memory_id = $1', 12)]
+
+
+def test_list_and_detail_query_budget(max_queries):
+    with TestClient(app) as client:
+        headers = {'X-Debug-User': str(uuid.uuid4())}
+        for i in range(5):
+            mid = client.post('/v1/memories', json={'title': f'm{i}', 'visibility': 'PRIVATE'}, headers=headers).json()['id']
+            client.put(f'/v1/memories/{mid}/core', json={'narrative': f'n{i}', 'anchors': [], 'people': []}, headers=headers)
+        # One statement for the whole page, however many memories it has
+        with max_queries(1):
+            r = client.get('/v1/memories', headers=headers)
+        assert len(r.json()['memories']) == 5
+        with max_queries(1):
+            client.get('/v1/export', headers=headers)
+
+
+def test_debug_headers_report_request_queries(monkeypatch):
+    monkeypatch.setattr(instrument, 'QUERY_HEADERS', True)
+    with TestClient(app) as client:
+        r = client.get('/v1/memories', headers={'X-Debug-User': str(uuid.uuid4())})
+        assert r.headers['x-db-queries'] == '1'
+        assert float(r.headers['x-db-time-ms']) > 0
+        metrics_text = client.get('/metrics').text
+    assert 'weave_http_request_db_queries_bucket{route="/v1/memories",le="1"}' in metrics_text
+    for gauge in ('weave_db_pool_size', 'weave_db_pool_checked_out', 'weave_db_pool_overflow'):
+        assert f'\n{gauge} ' in metrics_text
+    assert 'weave_db_pool_wait_seconds_count ' in metrics_text
+
+
+def test_rls_user_rides_on_begin():
+    async def run():
+        uid = str(uuid.uuid4())
+        with count_queries() as stats:
+            async for db in get_db_with_rls(uid):
+                seen = (await db.execute(text("select current_setting('app.user_id', true)"))).scalar_one()
+        # Not carried into the next transaction on the same connection
+        async with engine.connect() as conn:
+            after = (await conn.execute(text("select current_setting('app.user_id', true)"))).scalar_one()
+        await engine.dispose()
+        return uid, seen, stats.count, after
+
+    uid, seen, count, after = asyncio.run(run())
+    assert seen == uid
+    assert count == 1
+    assert not after
@@ -0,0 +1,93 @@
+import asyncio
+import uuid
+
+from fastapi.testclient import TestClient
+
+from services.api.app.main import app
+from services.api.app.middleware import rate_limit
+from services.api.app.middleware.rate_limit import MemoryBackend, PostgresBackend, TokenBucketLimiter, parse_costs
+
+
+def test_token_bucket_refills_and_charges_route_costs():
+    now = [0.0]
+    backend = MemoryBackend(clock=lambda: now[0])
+    limiter = TokenBucketLimiter(backend, per_minute=60, burst=10, costs=parse_costs('/v1/health=0,/v1/search=5'))
+
+    def check(path):
+        return asyncio.run(limiter.check('user:a', path))
+
+    assert check('/v1/search/associative') == (True, 5)
+    assert check('/v1/search/associative') == (True, 0)
+    allowed, retry_after = check('/v1/search/associative')
+    assert not allowed and retry_after == 5
+    # Free routes never touch the bucket
+    assert check('/v1/health')[0]
+    now[0] += 1
+    assert check('/v1/memories') == (True, 0)
+    now[0] += 60
+    assert check('/v1/memories') == (True, 9)
+
+
+def test_memory_backend_evicts_idle_and_excess_keys():
+    now = [0.0]
+    backend = MemoryBackend(max_keys=3, clock=lambda: now[0])
+    for i in range(5):
+        asyncio.run(backend.take(f'k{i}', 1, capacity=10, rate=1))
+    assert len(backend) == 3
+    # Every bucket has refilled after 10s idle, so new traffic sweeps them out
+    now[0] += 11
+    for i in range(5, 7):
+        asyncio.run(backend.take(f'k{i}', 1, capacity=10, rate=1))
+    assert len(backend) == 2
+
+
+def test_postgres_backend_shares_one_bucket():
+    key = f'test:{uuid.uuid4()}'
+
+    async def run():
+        backend = PostgresBackend()
+        results = [await backend.take(key, 4, capacity=10, rate=0.001) for _ in range(3)]
+        await backend.engine.dispose()
+        return results
+
+    (ok1, left1), (ok2, left2), (ok3, retry) = asyncio.run(run())
+    assert ok1 and ok2 and not ok3
+    assert round(left1) == 6 and round(left2) == 2
+    assert retry > 1000
+
+
+def test_middleware_returns_429_with_retry_after(monkeypatch):
+    limiter = TokenBucketLimiter(MemoryBackend(), per_minute=60, burst=2, costs=[])
+    monkeypatch.setattr(rate_limit, 'limiter', limiter)
+    with TestClient(app) as client:
+        assert client.get('/v1/health').status_code == 200
+        assert client.get('/v1/health').status_code == 200
+        r = client.get('/v1/health')
+        assert r.status_code == 429
+        assert r.json() == {'detail': 'Rate limit exceeded'}
+        assert int(r.headers['retry-after']) >= 1
+
+
+def test_rotating_debug_user_does_not_reset_budget(monkeypatch):
+    backend = MemoryBackend()
+    monkeypatch.setattr(rate_limit, 'limiter', TokenBucketLimiter(backend, per_minute=60, burst=3, costs=[]))
+    with TestClient(app) as client:
+        statuses = [
+            client.get('/v1/health', headers={'X-Debug-User': str(uuid.uuid4())}).status_code for _ in range(6)
+        ]
+    assert statuses == [200, 200, 200, 429, 429, 429]
+    # Junk headers don't create buckets either
+    assert len(backend) == 1
+
+
+def test_debug_user_keys_only_when_trusted(monkeypatch):
+    class Req:
+        def __init__(self, debug_user):
+            self.headers = {'x-debug-user': debug_user}
+            self.client = type('Client', (), {'host': '10.0.0.1'})
+
+    uid = str(uuid.uuid4())
+    assert rate_limit.client_key(Req(uid)) == 'ip:10.0.0.1'
+    monkeypatch.setattr(rate_limit, 'TRUST_DEBUG_USER', True)
+    assert rate_limit.client_key(Req(uid)) == f'user:{uid}'
+    assert rate_limit.client_key(Req('not-a-uuid')) == 'ip:10.0.0.1'